@@ -1,5 +1,124 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
 import uvicorn
 
 
+def _serve(args: argparse.Namespace) -> None:
+    if args.prod:
+        from src.launcher import run_production
+
+        run_production(args.host, args.port, args.workers, args.memory_report_every)
+        return
+    uvicorn.run("src.main:app", host=args.host, port=args.port, reload=True)
+
+
+def _bulk(args: argparse.Namespace) -> None:
+    from src.core.logging import setup_logging
+    from src.services.bulk import BulkRunner
+    from src.services.pool import SpiderPool
+
+    setup_logging()
+    runner = BulkRunner(
+        args.input,
+        Path(args.output),
+        concurrency=args.concurrency,
+        checkpoint_every=args.checkpoint_every,
+        progress_every=args.progress_every,
+    )
+    pool = SpiderPool(args.concurrency, interactive=False)
+    try:
+        checkpoint = runner.run(pool)
+    except KeyboardInterrupt:
+        sys.stderr.write("bulk: interrupted, rerun the same command to resume\n")
+        raise SystemExit(130)
+    finally:
+        pool.close()
+    if checkpoint.done == 0:
+        sys.stderr.write("bulk: nothing to do\n")
+
+
+def _worker(args: argparse.Namespace) -> None:
+    import signal
+    import threading
+
+    from src.core.config import JOB_DB
+    from src.core.logging import setup_logging
+    from src.services.jobs import JobRunner, JobStore
+    from src.services.pool import SpiderPool
+
+    setup_logging()
+    store = JobStore(JOB_DB)
+    pool = SpiderPool(args.concurrency, interactive=False)
+    runner = JobRunner(store, pool, args.concurrency)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    runner.start()
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # In-flight items finish; anything still leased afterwards is redelivered elsewhere.
+        runner.stop()
+        pool.close()
+        store.close()
+
+
+def _submit(args: argparse.Namespace) -> None:
+    from src.core.config import JOB_DB
+    from src.services.jobs import JobStore, parse_phone_csv
+
+    handle = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8-sig")
+    with handle:
+        phones = parse_phone_csv(handle.read())
+    if not phones:
+        sys.stderr.write("submit: no phones found\n")
+        raise SystemExit(1)
+    store = JobStore(JOB_DB)
+    try:
+        job = store.create(phones)
+    finally:
+        store.close()
+    print(job.id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="captcha-spider service and tools")
+    sub = parser.add_subparsers(dest="command")
+
+    serve = sub.add_parser("serve", help="run the API with uvicorn (default)")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--prod", action="store_true", help="pre-fork workers, no reload, model preloaded")
+    serve.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    serve.add_argument("--memory-report-every", type=float, default=60.0, help="seconds, 0 disables")
+    serve.set_defaults(func=_serve)
+
+    bulk = sub.add_parser("bulk", help="query a phone list from a file or stdin into JSONL")
+    bulk.add_argument("input", help="input file with one phone per line, or - for stdin")
+    bulk.add_argument("-o", "--output", required=True, help="JSONL output file (appended)")
+    bulk.add_argument("-c", "--concurrency", type=int, default=4)
+    bulk.add_argument("--checkpoint-every", type=float, default=5.0, help="seconds between checkpoints")
+    bulk.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    bulk.set_defaults(func=_bulk)
+
+    worker = sub.add_parser("worker", help="work queued jobs from JOB_DB without serving the API")
+    worker.add_argument("-c", "--concurrency", type=int, default=4)
+    worker.set_defaults(func=_worker)
+
+    submit = sub.add_parser("submit", help="queue a phone list (CSV or one per line) as a job in JOB_DB")
+    submit.add_argument("input", help="input file, or - for stdin")
+    submit.set_defaults(func=_submit)
+
+    args = parser.parse_args()
+    if args.command is None:
+        args = parser.parse_args(["serve"])
+    args.func(args)
+
+
 if __name__ == "__main__":
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8000, reload=True)
+    main()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from starlette.requests import Request
+
+from .config import (
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_ACTIVE,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_WAIT_MS,
+    SPIDER_POOL_SIZE,
+)
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+# How often a queued request checks whether its client is still connected.
+_DISCONNECT_POLL = 0.25
+
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, reason: str, status_code: int, retry_after: float) -> None:
+        super().__init__(f"overloaded:{reason}")
+        self.reason = reason
+        self.error = f"overloaded:{reason}"
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    # Bounded admission in front of the query routes: at most `limit` requests run,
+    # at most `max_queue` wait (FIFO) for up to `max_wait` seconds, the rest are shed.
+    # Runs on the event loop, so the counters need no lock.
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT_MS / 1000.0,
+        enabled: bool = ADMISSION_ENABLED,
+    ) -> None:
+        self.enabled = enabled
+        self._limit = max(1, limit)
+        self._max_queue = max(0, max_queue)
+        self._max_wait = max(0.0, max_wait)
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time = 1.0
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self, request: Request, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(request, self._max_wait if max_wait is None else min(self._max_wait, max_wait))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            # Smoothed service time feeds the Retry-After estimate.
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - started)
+            self._release()
+
+    async def _acquire(self, request: Request, max_wait: float) -> None:
+        if self._active < self._limit and not self._waiters:
+            self._active += 1
+            self._admit(0.0)
+            return
+        if len(self._waiters) >= self._max_queue:
+            self._shed("queue_full", 429)
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        started = loop.time()
+        try:
+            while True:
+                remaining = max_wait - (loop.time() - started)
+                if remaining <= 0:
+                    self._shed("queue_timeout", 503)
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), timeout=min(remaining, _DISCONNECT_POLL))
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        self._shed("disconnected", 499)
+                    continue
+                self._admit(loop.time() - started)
+                return
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as this request gave up; pass it on.
+                self._release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            self._publish()
+
+    def _admit(self, waited: float) -> None:
+        METRICS.inc("admission.admitted")
+        METRICS.observe("admission.wait_s", waited)
+        self._publish()
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest live waiter so it cannot be stolen.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._publish()
+                return
+        self._active -= 1
+        self._publish()
+
+    def _shed(self, reason: str, status_code: int) -> None:
+        METRICS.inc(f"admission.shed.{reason}")
+        retry_after = self.retry_after()
+        _LOGGER.warning(
+            "admission_shed: reason=%s active=%s queued=%s retry_after=%s",
+            reason,
+            self._active,
+            len(self._waiters),
+            retry_after,
+        )
+        raise AdmissionRejected(reason, status_code, retry_after)
+
+    def retry_after(self) -> int:
+        # Time for the current queue to drain at the recent service rate.
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(backlog * self._service_time / self._limit))
+
+    def _publish(self) -> None:
+        METRICS.set_gauge("admission.active", self._active)
+        METRICS.set_gauge("admission.queue_depth", len(self._waiters))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "active": self._active,
+            "limit": self._limit,
+            "queued": len(self._waiters),
+            "max_queue": self._max_queue,
+            "max_wait_s": self._max_wait,
+            "service_time_s": round(self._service_time, 3),
+        }
+
+
+ADMISSION = AdmissionController(ADMISSION_MAX_ACTIVE or SPIDER_POOL_SIZE)
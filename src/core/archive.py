@@ -0,0 +1,248 @@
+import atexit
+import gzip
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .config import (
+    CAPTCHA_ARCHIVE_MAX_AGE_HOURS,
+    CAPTCHA_ARCHIVE_MAX_MB,
+    CAPTCHA_ARCHIVE_QUEUE,
+    CAPTCHA_ARCHIVE_SEGMENT_MB,
+    CAPTCHA_ARCHIVE_SEGMENT_SECONDS,
+    CAPTCHA_DIR,
+    CAPTCHA_SAMPLE_RATE,
+    SAVE_CAPTCHA,
+)
+from .jsonfast import dumps_line, loads
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+_SEGMENT_SUFFIX = ".bin.gz"
+_INDEX_SUFFIX = ".idx.jsonl"
+# Segments another worker may still be appending to are left alone by size pruning.
+_ACTIVE_GRACE = 60.0
+_SEGMENT_SEQ = itertools.count(1)
+
+
+class _Segment:
+    def __init__(self, directory: Path) -> None:
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        self.name = f"captcha-{stamp}-{os.getpid()}-{next(_SEGMENT_SEQ)}"
+        self.opened = time.monotonic()
+        self.data_path = directory / (self.name + _SEGMENT_SUFFIX)
+        self.index_path = directory / (self.name + _INDEX_SUFFIX)
+        self.data: BinaryIO = open(self.data_path, "ab")
+        self.index: BinaryIO = open(self.index_path, "ab")
+        self.size = self.data.tell()
+        self._pending: List[bytes] = []
+
+    def append(self, meta: Dict[str, Any], image_bytes: bytes) -> int:
+        # One gzip member per image, so any record can be read back from its offset;
+        # the whole segment is also a valid gzip stream.
+        blob = gzip.compress(image_bytes, compresslevel=6, mtime=0)
+        offset = self.size
+        self.data.write(blob)
+        self.size += len(blob)
+        meta.update(segment=self.name, offset=offset, length=len(blob), size=len(image_bytes))
+        self._pending.append(dumps_line(meta))
+        return len(blob)
+
+    def flush(self) -> None:
+        # Data before index, so a crash never leaves an index row pointing past the data.
+        self.data.flush()
+        self.index.write(b"".join(self._pending))
+        self._pending.clear()
+        self.index.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.data.close()
+        self.index.close()
+
+
+class CaptchaArchive:
+    # Captcha images are sampled on the request path and handed to one writer thread,
+    # which appends them to rolling compressed segments with a JSONL index and prunes
+    # old segments by total size and age. A full queue drops images instead of blocking.
+    def __init__(
+        self,
+        directory: Path = CAPTCHA_DIR,
+        sample_rate: float = CAPTCHA_SAMPLE_RATE,
+        max_queue: int = CAPTCHA_ARCHIVE_QUEUE,
+        segment_bytes: int = int(CAPTCHA_ARCHIVE_SEGMENT_MB * 1024 * 1024),
+        segment_seconds: float = CAPTCHA_ARCHIVE_SEGMENT_SECONDS,
+        max_bytes: int = int(CAPTCHA_ARCHIVE_MAX_MB * 1024 * 1024),
+        max_age: float = CAPTCHA_ARCHIVE_MAX_AGE_HOURS * 3600.0,
+    ) -> None:
+        self._directory = directory
+        self._sample_rate = sample_rate
+        self._segment_bytes = segment_bytes
+        self._segment_seconds = segment_seconds
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Any], bytes]]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._ids = itertools.count(1)
+        self._segment: Optional[_Segment] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="captcha-archive", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_bytes: bytes, **meta: Any) -> Optional[str]:
+        if self._closed or not image_bytes:
+            return None
+        if self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            METRICS.inc("captcha_archive.sampled_out")
+            return None
+        record_id = f"{int(time.time() * 1000)}-{os.getpid()}-{next(self._ids)}"
+        meta.update(id=record_id, ts=round(time.time(), 3))
+        try:
+            self._queue.put_nowait((meta, image_bytes))
+        except queue.Full:
+            METRICS.inc("captcha_archive.dropped")
+            return None
+        return record_id
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            _LOGGER.warning("captcha_archive_close: pending=%s dropped", self._queue.qsize())
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        self._prune()
+        while True:
+            item = self._queue.get()
+            if item is not None:
+                try:
+                    self._write(*item)
+                except OSError as exc:
+                    METRICS.inc("captcha_archive.errors")
+                    _LOGGER.warning("captcha_archive_error: err=%s", exc)
+                    self._close_segment()
+            # Flush once the backlog is drained rather than per image.
+            if item is None or self._queue.empty():
+                if self._segment is not None:
+                    try:
+                        self._segment.flush()
+                    except OSError as exc:
+                        _LOGGER.warning("captcha_archive_error: err=%s", exc)
+            if item is None:
+                self._close_segment()
+                return
+
+    def _write(self, meta: Dict[str, Any], image_bytes: bytes) -> None:
+        segment = self._segment
+        if segment is not None and (
+            segment.size >= self._segment_bytes or time.monotonic() - segment.opened >= self._segment_seconds
+        ):
+            self._close_segment()
+            self._prune()
+            segment = None
+        if segment is None:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            segment = self._segment = _Segment(self._directory)
+        written = segment.append(meta, image_bytes)
+        METRICS.inc("captcha_archive.written")
+        METRICS.inc("captcha_archive.bytes", written)
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            try:
+                self._segment.close()
+            except OSError:
+                pass
+            self._segment = None
+
+    def _prune(self) -> None:
+        segments = list_segments(self._directory)
+        now = time.time()
+        current = self._segment.name if self._segment is not None else None
+        total = sum(size for _, size, _ in segments)
+        removed = 0
+        for name, size, mtime in segments:
+            if name == current:
+                continue
+            too_old = self._max_age > 0 and now - mtime > self._max_age
+            too_big = self._max_bytes > 0 and total > self._max_bytes and now - mtime > _ACTIVE_GRACE
+            if not (too_old or too_big):
+                continue
+            for suffix in (_SEGMENT_SUFFIX, _INDEX_SUFFIX):
+                try:
+                    (self._directory / (name + suffix)).unlink()
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        if removed:
+            METRICS.inc("captcha_archive.pruned", removed)
+            _LOGGER.info("captcha_archive_pruned: segments=%s remaining_mb=%.1f", removed, total / 1048576)
+
+
+def list_segments(directory: Path) -> List[Tuple[str, int, float]]:
+    # (name, size, mtime), oldest first.
+    found = []
+    try:
+        paths = list(directory.glob("captcha-*" + _SEGMENT_SUFFIX))
+    except OSError:
+        return []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        found.append((path.name[: -len(_SEGMENT_SUFFIX)], stat.st_size, stat.st_mtime))
+    found.sort(key=lambda item: item[2])
+    return found
+
+
+def iter_index(directory: Path = CAPTCHA_DIR) -> Iterator[Dict[str, Any]]:
+    for name, _, _ in list_segments(directory):
+        try:
+            with open(directory / (name + _INDEX_SUFFIX), "rb") as handle:
+                for line in handle:
+                    try:
+                        yield loads(line)
+                    except ValueError:
+                        # A partial last row from a killed writer.
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def read_image(directory: Path, meta: Dict[str, Any]) -> bytes:
+    with open(directory / (meta["segment"] + _SEGMENT_SUFFIX), "rb") as handle:
+        handle.seek(int(meta["offset"]))
+        return gzip.decompress(handle.read(int(meta["length"])))
+
+
+_ARCHIVE: Optional[CaptchaArchive] = None
+_ARCHIVE_LOCK = threading.Lock()
+
+
+def captcha_archive() -> Optional[CaptchaArchive]:
+    global _ARCHIVE
+    if not SAVE_CAPTCHA:
+        return None
+    if _ARCHIVE is None:
+        with _ARCHIVE_LOCK:
+            if _ARCHIVE is None:
+                _ARCHIVE = CaptchaArchive()
+                atexit.register(_ARCHIVE.close)
+    return _ARCHIVE
+
+
+def close_archive() -> None:
+    if _ARCHIVE is not None:
+        _ARCHIVE.close()
@@ -0,0 +1,142 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict
+
+from .config import BREAKER_BACKOFF_MAX, BREAKER_BACKOFF_SECONDS, BREAKER_ENABLED, BREAKER_FAILURES
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"circuit_open:{name}")
+        self.name = name
+        self.error = f"circuit_open:{name}"
+        self.retry_after = max(0.0, retry_after)
+
+
+class CircuitBreaker:
+    # Opens after `failures` consecutive failures. Once the (jittered) backoff
+    # elapses, a single probe is let through; success closes the circuit, failure
+    # reopens it with a doubled backoff.
+    def __init__(
+        self,
+        name: str,
+        failures: int = BREAKER_FAILURES,
+        backoff: float = BREAKER_BACKOFF_SECONDS,
+        backoff_max: float = BREAKER_BACKOFF_MAX,
+        enabled: bool = BREAKER_ENABLED,
+    ) -> None:
+        self.name = name
+        self._threshold = max(1, failures)
+        self._base = max(0.1, backoff)
+        self._max = max(self._base, backoff_max)
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._backoff = self._base
+        self._open_until = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before(self) -> None:
+        if not self._enabled:
+            return
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == OPEN and now >= self._open_until:
+                self._state = HALF_OPEN
+                self._probing = False
+                _LOGGER.info("breaker_half_open: name=%s", self.name)
+                self._publish()
+            # A probe that never reported back is replaced after one backoff period.
+            if self._state == HALF_OPEN and (not self._probing or now - self._probe_started > self._backoff):
+                self._probing = True
+                self._probe_started = now
+                METRICS.inc(f"breaker.{self.name}.probes")
+                return
+            METRICS.inc(f"breaker.{self.name}.rejected")
+            raise CircuitOpenError(self.name, self._open_until - now)
+
+    def success(self) -> None:
+        if not self._enabled:
+            return
+        with self._lock:
+            if self._state != CLOSED:
+                _LOGGER.info("breaker_closed: name=%s", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._backoff = self._base
+            self._probing = False
+            self._publish()
+
+    def failure(self, reason: str = "") -> None:
+        if not self._enabled:
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._backoff = min(self._max, self._backoff * 2)
+                self._open(reason)
+                return
+            self._failures += 1
+            if self._state == CLOSED and self._failures >= self._threshold:
+                self._open(reason)
+
+    def _open(self, reason: str) -> None:
+        # Jitter keeps workers (and sibling processes) from probing in lockstep.
+        delay = random.uniform(self._backoff / 2, self._backoff)
+        self._state = OPEN
+        self._probing = False
+        self._open_until = time.monotonic() + delay
+        METRICS.inc(f"breaker.{self.name}.opens")
+        _LOGGER.warning(
+            "breaker_open: name=%s failures=%s retry_in=%.1fs reason=%s",
+            self.name,
+            self._failures,
+            delay,
+            reason,
+        )
+        self._publish()
+
+    def _publish(self) -> None:
+        METRICS.set_gauge(f"breaker.{self.name}.state", _STATE_GAUGE[self._state])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = max(0.0, self._open_until - time.monotonic()) if self._state == OPEN else 0.0
+            return {"state": self._state, "failures": self._failures, "retry_in_s": round(retry_in, 3)}
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker(name: str) -> CircuitBreaker:
+    with _BREAKERS_LOCK:
+        found = _BREAKERS.get(name)
+        if found is None:
+            found = CircuitBreaker(name)
+            _BREAKERS[name] = found
+        return found
+
+
+def breakers_snapshot() -> Dict[str, Dict[str, Any]]:
+    with _BREAKERS_LOCK:
+        items = list(_BREAKERS.items())
+    return {name: item.snapshot() for name, item in items}
@@ -1,17 +1,18 @@
 import time
-from typing import Optional, Tuple
+from typing import Any, Optional, Tuple, Union
 
 import requests
 
+from .archive import captcha_archive
 from .config import (
-    CAPTCHA_DIR,
     CAPTCHA_REFRESH_PARAM,
     CAPTCHA_REFRESH_PARAM_NAME,
     CAPTCHA_URL,
-    REQUEST_TIMEOUT,
-    SAVE_CAPTCHA,
+    REQUEST_CONNECT_TIMEOUT,
+    REQUEST_READ_TIMEOUT,
     VERIFY_SSL,
 )
+from .dataset import captcha_dataset
 
 
 def build_captcha_url() -> str:
@@ -24,20 +25,27 @@ def build_captcha_url() -> str:
     return f"{CAPTCHA_URL}{sep}{ts}"
 
 
-def save_captcha(image_bytes: bytes) -> Optional[str]:
-    if not SAVE_CAPTCHA:
+def save_captcha(image_bytes: bytes, **meta: Any) -> Optional[str]:
+    # Returns the archive record id; the image is written later by the archiver thread.
+    archive = captcha_archive()
+    if archive is None:
         return None
-    CAPTCHA_DIR.mkdir(parents=True, exist_ok=True)
-    filename = f"captcha_{int(time.time() * 1000)}.png"
-    path = CAPTCHA_DIR / filename
-    path.write_bytes(image_bytes)
-    return str(path)
+    return archive.submit(image_bytes, **meta)
 
 
-def fetch_captcha(session: requests.Session) -> Tuple[bytes, Optional[str]]:
+def label_captcha(image_bytes: bytes, text: str, variant: str, accepted: bool) -> None:
+    dataset = captcha_dataset()
+    if dataset is not None:
+        dataset.record(image_bytes, text, variant, accepted)
+
+
+def fetch_captcha(
+    session: requests.Session,
+    timeout: Union[float, Tuple[float, float], None] = None,
+) -> bytes:
     url = build_captcha_url()
-    resp = session.get(url, timeout=REQUEST_TIMEOUT, verify=VERIFY_SSL)
+    if timeout is None:
+        timeout = (REQUEST_CONNECT_TIMEOUT, REQUEST_READ_TIMEOUT)
+    resp = session.get(url, timeout=timeout, verify=VERIFY_SSL)
     resp.raise_for_status()
-    image_bytes = resp.content
-    saved_path = save_captcha(image_bytes)
-    return image_bytes, saved_path
+    return resp.content
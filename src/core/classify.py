@@ -0,0 +1,149 @@
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Pattern, Tuple
+
+from .config import (
+    BLOCK_HINTS,
+    BLOCK_HTTP_STATUSES,
+    CAPTCHA_ERROR_HINT,
+    CAPTCHA_ERROR_HINTS,
+    CAPTCHA_ERROR_STATUSES,
+    CLASSIFY_FIELDS,
+    CLASSIFY_RULES_JSON,
+    PROXY_LIMIT_HINTS,
+    PROXY_LIMIT_STATUSES,
+)
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+SUCCESS = "success"
+CAPTCHA_REJECTED = "captcha_rejected"
+LIMIT_REACHED = "limit_reached"
+BLOCKED = "blocked"
+UNKNOWN = "unknown"
+
+# When several rules match one response the earliest outcome here wins.
+_PRECEDENCE = (CAPTCHA_REJECTED, LIMIT_REACHED, BLOCKED)
+
+
+@dataclass(frozen=True)
+class Classification:
+    outcome: str
+    matched: Optional[str] = None
+
+
+class ResponseClassifier:
+    def __init__(
+        self,
+        hints: Dict[str, Iterable[str]],
+        statuses: Dict[str, Iterable[int]],
+        http_statuses: Dict[str, Iterable[int]],
+        fields: Iterable[str] = ("msg",),
+    ) -> None:
+        self._rank = {outcome: index for index, outcome in enumerate(_PRECEDENCE)}
+        self._fields = tuple(fields)
+        self._pattern = self._compile(hints)
+        self._statuses = self._lookup(statuses)
+        self._http_statuses = self._lookup(http_statuses)
+
+    def _compile(self, hints: Dict[str, Iterable[str]]) -> Optional[Pattern[str]]:
+        # One alternation with a named group per outcome, so a single regex pass
+        # finds every configured hint.
+        groups = []
+        for outcome in _PRECEDENCE:
+            words = sorted({hint for hint in hints.get(outcome, ()) if hint}, key=len, reverse=True)
+            if words:
+                groups.append(f"(?P<{outcome}>{'|'.join(re.escape(word) for word in words)})")
+        if not groups:
+            return None
+        return re.compile("|".join(groups), re.IGNORECASE)
+
+    def _lookup(self, statuses: Dict[str, Iterable[int]]) -> Dict[int, str]:
+        table: Dict[int, str] = {}
+        for outcome in reversed(_PRECEDENCE):
+            for status in statuses.get(outcome, ()):
+                table[int(status)] = outcome
+        return table
+
+    def _better(self, current: Tuple[Optional[str], Optional[str]], outcome: str, matched: str):
+        if current[0] is None or self._rank[outcome] < self._rank[current[0]]:
+            return outcome, matched
+        return current
+
+    def _haystack(self, data: Any, text: Optional[str]) -> str:
+        if isinstance(data, dict):
+            parts = [data.get(name) for name in self._fields]
+            return "\n".join(part for part in parts if isinstance(part, str))
+        return text or ""
+
+    def classify(self, http_status: int, data: Any, text: Optional[str]) -> Classification:
+        best: Tuple[Optional[str], Optional[str]] = (None, None)
+        outcome = self._http_statuses.get(http_status)
+        if outcome:
+            best = self._better(best, outcome, f"http_status={http_status}")
+        if isinstance(data, dict) and self._statuses:
+            try:
+                status = int(data.get("status"))
+            except (TypeError, ValueError):
+                status = None
+            outcome = self._statuses.get(status) if status is not None else None
+            if outcome:
+                best = self._better(best, outcome, f"status={status}")
+        if self._pattern is not None and best[0] != _PRECEDENCE[0]:
+            haystack = self._haystack(data, text)
+            if haystack:
+                for match in self._pattern.finditer(haystack):
+                    best = self._better(best, match.lastgroup, match.group(0))
+                    if best[0] == _PRECEDENCE[0]:
+                        break
+        if best[0] is None:
+            outcome = SUCCESS if 200 <= http_status < 400 else UNKNOWN
+            result = Classification(outcome)
+        else:
+            result = Classification(best[0], best[1])
+        METRICS.inc(f"classify.{result.outcome}")
+        return result
+
+
+def _extra_rules() -> Tuple[Dict[str, list], Dict[str, list], Dict[str, list]]:
+    hints: Dict[str, list] = {}
+    statuses: Dict[str, list] = {}
+    http_statuses: Dict[str, list] = {}
+    try:
+        rules = json.loads(CLASSIFY_RULES_JSON) if CLASSIFY_RULES_JSON else []
+    except json.JSONDecodeError as exc:
+        _LOGGER.warning("classify_rules_invalid: %s", exc)
+        return hints, statuses, http_statuses
+    for rule in rules if isinstance(rules, list) else []:
+        outcome = rule.get("outcome") if isinstance(rule, dict) else None
+        if outcome not in _PRECEDENCE:
+            _LOGGER.warning("classify_rule_skipped: rule=%s", rule)
+            continue
+        if rule.get("hint"):
+            hints.setdefault(outcome, []).append(str(rule["hint"]))
+        try:
+            if rule.get("status") is not None:
+                statuses.setdefault(outcome, []).append(int(rule["status"]))
+            if rule.get("http_status") is not None:
+                http_statuses.setdefault(outcome, []).append(int(rule["http_status"]))
+        except (TypeError, ValueError):
+            _LOGGER.warning("classify_rule_skipped: rule=%s", rule)
+    return hints, statuses, http_statuses
+
+
+def build_classifier() -> ResponseClassifier:
+    hints, statuses, http_statuses = _extra_rules()
+    hints.setdefault(CAPTCHA_REJECTED, []).extend([CAPTCHA_ERROR_HINT, *CAPTCHA_ERROR_HINTS])
+    hints.setdefault(LIMIT_REACHED, []).extend(PROXY_LIMIT_HINTS)
+    hints.setdefault(BLOCKED, []).extend(BLOCK_HINTS)
+    statuses.setdefault(CAPTCHA_REJECTED, []).extend(CAPTCHA_ERROR_STATUSES)
+    statuses.setdefault(LIMIT_REACHED, []).extend(PROXY_LIMIT_STATUSES)
+    http_statuses.setdefault(BLOCKED, []).extend(BLOCK_HTTP_STATUSES)
+    _LOGGER.debug("classifier_rules: hints=%s statuses=%s http_statuses=%s", hints, statuses, http_statuses)
+    return ResponseClassifier(hints, statuses, http_statuses, CLASSIFY_FIELDS)
+
+
+CLASSIFIER = build_classifier()
@@ -61,6 +61,10 @@ CAPTCHA_URL = os.getenv("CAPTCHA_URL", f"{BASE_URL}/captcha.html")
 QUERY_URL = os.getenv("QUERY_URL", f"{BASE_URL}/mark/data.do")
 
 REQUEST_TIMEOUT = _get_float("REQUEST_TIMEOUT", 15.0)
+REQUEST_CONNECT_TIMEOUT = _get_float("REQUEST_CONNECT_TIMEOUT", min(5.0, REQUEST_TIMEOUT))
+REQUEST_READ_TIMEOUT = _get_float("REQUEST_READ_TIMEOUT", REQUEST_TIMEOUT)
+QUERY_DEADLINE_MS = _get_int("QUERY_DEADLINE_MS", 60000)
+QUERY_DEADLINE_MAX_MS = _get_int("QUERY_DEADLINE_MAX_MS", 300000)
 VERIFY_SSL = _get_bool("VERIFY_SSL", True)
 
 USER_AGENT = os.getenv(
@@ -100,9 +104,24 @@ CAPTCHA_REGEX = os.getenv("CAPTCHA_REGEX", "")
 CAPTCHA_ERROR_HINT = os.getenv("CAPTCHA_ERROR_HINT", "")
 CAPTCHA_ERROR_HINTS = _get_list("CAPTCHA_ERROR_HINTS", CAPTCHA_ERROR_HINT)
 CAPTCHA_MAX_TRIES = _get_int("CAPTCHA_MAX_TRIES", 3)
+RETRY_POLICY = os.getenv("RETRY_POLICY", "fixed").lower()
+RETRY_MAX_STEPS = _get_int("RETRY_MAX_STEPS", 8)
+RETRY_BUDGET_SECONDS = _get_float("RETRY_BUDGET_SECONDS", 15.0)
+RETRY_EXPLORE = _get_float("RETRY_EXPLORE", 0.05)
+RETRY_DECAY = _get_float("RETRY_DECAY", 0.98)
+RETRY_ROTATE_COST = _get_float("RETRY_ROTATE_COST", 2.0)
 CAPTCHA_REFRESH_PARAM = _get_bool("CAPTCHA_REFRESH_PARAM", True)
 CAPTCHA_REFRESH_PARAM_NAME = os.getenv("CAPTCHA_REFRESH_PARAM_NAME", "t")
 SAVE_CAPTCHA = _get_bool("SAVE_CAPTCHA", False)
+CAPTCHA_SAMPLE_RATE = _get_float("CAPTCHA_SAMPLE_RATE", 1.0)
+CAPTCHA_ARCHIVE_QUEUE = _get_int("CAPTCHA_ARCHIVE_QUEUE", 1024)
+CAPTCHA_ARCHIVE_SEGMENT_MB = _get_float("CAPTCHA_ARCHIVE_SEGMENT_MB", 16.0)
+CAPTCHA_ARCHIVE_SEGMENT_SECONDS = _get_float("CAPTCHA_ARCHIVE_SEGMENT_SECONDS", 3600.0)
+CAPTCHA_ARCHIVE_MAX_MB = _get_float("CAPTCHA_ARCHIVE_MAX_MB", 1024.0)
+CAPTCHA_ARCHIVE_MAX_AGE_HOURS = _get_float("CAPTCHA_ARCHIVE_MAX_AGE_HOURS", 168.0)
+CAPTCHA_DATASET = _get_bool("CAPTCHA_DATASET", False)
+CAPTCHA_DATASET_MAX_MB = _get_float("CAPTCHA_DATASET_MAX_MB", 256.0)
+CAPTCHA_DATASET_QUEUE = _get_int("CAPTCHA_DATASET_QUEUE", 1024)
 
 OCR_WHITELIST = os.getenv(
     "OCR_WHITELIST",
@@ -144,12 +163,87 @@ PROXY_ROTATE_ON_LIMIT = _get_bool("PROXY_ROTATE_ON_LIMIT", False)
 PROXY_LIMIT_HINT = os.getenv("PROXY_LIMIT_HINT", "")
 PROXY_LIMIT_HINTS = _get_list("PROXY_LIMIT_HINTS", PROXY_LIMIT_HINT)
 PROXY_LIMIT_STATUSES = _get_int_list("PROXY_LIMIT_STATUSES")
+CAPTCHA_ERROR_STATUSES = _get_int_list("CAPTCHA_ERROR_STATUSES")
+BLOCK_HINTS = _get_list("BLOCK_HINTS")
+BLOCK_HTTP_STATUSES = _get_int_list("BLOCK_HTTP_STATUSES")
+CLASSIFY_FIELDS = _get_list("CLASSIFY_FIELDS", "msg")
+CLASSIFY_RULES_JSON = os.getenv("CLASSIFY_RULES_JSON", "")
 PROXY_RELEASE_ON_LIMIT = _get_bool("PROXY_RELEASE_ON_LIMIT", False)
+PROXY_ROTATE_AFTER_ERRORS = _get_int("PROXY_ROTATE_AFTER_ERRORS", 1)
 PROXY_DEBUG_IP_CHECK = _get_bool("PROXY_DEBUG_IP_CHECK", False)
 PROXY_DEBUG_IP_URL = os.getenv("PROXY_DEBUG_IP_URL", "https://api.ipify.org")
 PROXY_DEBUG_IP_TIMEOUT = _get_float("PROXY_DEBUG_IP_TIMEOUT", 5.0)
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE = _get_bool("LOG_QUEUE", True)
+LOG_QUEUE_SIZE = _get_int("LOG_QUEUE_SIZE", 10000)
+LOG_SAMPLE = _get_list("LOG_SAMPLE", "")
+
 DATA_DIR = Path("data")
 COOKIE_FILE = DATA_DIR / "cookies.json"
 COOKIE_PERSIST = _get_bool("COOKIE_PERSIST", True)
 CAPTCHA_DIR = DATA_DIR / "captcha"
+CAPTCHA_DATASET_PATH = os.getenv("CAPTCHA_DATASET_PATH", str(DATA_DIR / "captcha_dataset.db"))
+
+TRAFFIC_MODE = os.getenv("TRAFFIC_MODE", "off").lower()
+TRAFFIC_ARCHIVE = os.getenv("TRAFFIC_ARCHIVE", str(DATA_DIR / "traffic.jsonl.gz"))
+TRAFFIC_REPLAY_SPEED = _get_float("TRAFFIC_REPLAY_SPEED", 1.0)
+
+SPIDER_POOL_SIZE = _get_int("SPIDER_POOL_SIZE", 1)
+STARTUP_WARMUP = _get_bool("STARTUP_WARMUP", True)
+STARTUP_WARM_SESSIONS = _get_bool("STARTUP_WARM_SESSIONS", True)
+SINGLE_FLIGHT = _get_bool("SINGLE_FLIGHT", True)
+JOB_DB = Path(os.getenv("JOB_DB", str(DATA_DIR / "jobs.db")))
+JOB_WORKERS = _get_int("JOB_WORKERS", 1)
+JOB_MAX_ITEMS = _get_int("JOB_MAX_ITEMS", 100000)
+JOB_LEASE_SECONDS = _get_float("JOB_LEASE_SECONDS", 60.0)
+JOB_HEARTBEAT_SECONDS = _get_float("JOB_HEARTBEAT_SECONDS", 0.0)
+JOB_MAX_ATTEMPTS = _get_int("JOB_MAX_ATTEMPTS", 5)
+JOB_DB_SHARED = _get_bool("JOB_DB_SHARED", False)
+JOB_NODE_ID = os.getenv("JOB_NODE_ID", "")
+
+SHARED_STATE = os.getenv("SHARED_STATE", "memory").lower()
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", str(DATA_DIR / "state.db"))
+RESULT_CACHE_TTL = _get_float("RESULT_CACHE_TTL", 0.0)
+RESULT_CACHE_MAX = _get_int("RESULT_CACHE_MAX", 10000)
+
+QUERY_FAST_RESPONSE = _get_bool("QUERY_FAST_RESPONSE", True)
+
+ADAPTIVE_CONCURRENCY = _get_bool("ADAPTIVE_CONCURRENCY", False)
+ADAPTIVE_GLOBAL_INITIAL = _get_int("ADAPTIVE_GLOBAL_INITIAL", 4)
+ADAPTIVE_GLOBAL_MIN = _get_int("ADAPTIVE_GLOBAL_MIN", 1)
+ADAPTIVE_GLOBAL_MAX = _get_int("ADAPTIVE_GLOBAL_MAX", 64)
+ADAPTIVE_PROXY_INITIAL = _get_int("ADAPTIVE_PROXY_INITIAL", 2)
+ADAPTIVE_PROXY_MIN = _get_int("ADAPTIVE_PROXY_MIN", 1)
+ADAPTIVE_PROXY_MAX = _get_int("ADAPTIVE_PROXY_MAX", 16)
+ADAPTIVE_BACKOFF = _get_float("ADAPTIVE_BACKOFF", 0.5)
+ADAPTIVE_LATENCY_FACTOR = _get_float("ADAPTIVE_LATENCY_FACTOR", 3.0)
+
+BREAKER_ENABLED = _get_bool("BREAKER_ENABLED", True)
+BREAKER_FAILURES = _get_int("BREAKER_FAILURES", 5)
+BREAKER_BACKOFF_SECONDS = _get_float("BREAKER_BACKOFF_SECONDS", 5.0)
+BREAKER_BACKOFF_MAX = _get_float("BREAKER_BACKOFF_MAX", 120.0)
+
+QUERY_HEDGE = _get_bool("QUERY_HEDGE", False)
+QUERY_HEDGE_PERCENTILE = _get_float("QUERY_HEDGE_PERCENTILE", 95.0)
+QUERY_HEDGE_MIN_SAMPLES = _get_int("QUERY_HEDGE_MIN_SAMPLES", 20)
+
+ADMISSION_ENABLED = _get_bool("ADMISSION_ENABLED", False)
+ADMISSION_MAX_ACTIVE = _get_int("ADMISSION_MAX_ACTIVE", 0)
+ADMISSION_MAX_QUEUE = _get_int("ADMISSION_MAX_QUEUE", 64)
+ADMISSION_MAX_WAIT_MS = _get_int("ADMISSION_MAX_WAIT_MS", 10000)
+
+LANE_INTERACTIVE_WEIGHT = _get_float("LANE_INTERACTIVE_WEIGHT", 4.0)
+LANE_BULK_WEIGHT = _get_float("LANE_BULK_WEIGHT", 1.0)
+LANE_BULK_MAX_SHARE = _get_float("LANE_BULK_MAX_SHARE", 0.75)
+PROXY_DAILY_QUOTA = _get_int("PROXY_DAILY_QUOTA", 0)
+LANE_INTERACTIVE_QUOTA_RESERVE = _get_float("LANE_INTERACTIVE_QUOTA_RESERVE", 0.2)
+
+SESSION_KEEPALIVE_SECONDS = _get_float("SESSION_KEEPALIVE_SECONDS", 0.0)
+SESSION_KEEPALIVE_MODE = os.getenv("SESSION_KEEPALIVE_MODE", "index").lower()
+CAPTCHA_PREFETCH_TTL = _get_float("CAPTCHA_PREFETCH_TTL", 60.0)
+
+STATE_SNAPSHOT_PATH = os.getenv("STATE_SNAPSHOT_PATH", str(DATA_DIR / "snapshot.json"))
+STATE_SNAPSHOT_INTERVAL = _get_float("STATE_SNAPSHOT_INTERVAL", 60.0)
+STATE_SNAPSHOT_WARM_TTL = _get_float("STATE_SNAPSHOT_WARM_TTL", 300.0)
@@ -0,0 +1,205 @@
+import atexit
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import CAPTCHA_DATASET, CAPTCHA_DATASET_MAX_MB, CAPTCHA_DATASET_PATH, CAPTCHA_DATASET_QUEUE
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    hash TEXT PRIMARY KEY,
+    image BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    accepted INTEGER NOT NULL,
+    seen INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_created ON samples (created_at);
+"""
+
+# An accepted label wins over a rejected one for the same image; a rejection only
+# counts as another sighting.
+_UPSERT = """
+INSERT INTO samples (hash, image, size, text, variant, accepted, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hash) DO UPDATE SET
+    seen = seen + 1,
+    updated_at = excluded.updated_at,
+    text = CASE WHEN excluded.accepted > accepted THEN excluded.text ELSE text END,
+    variant = CASE WHEN excluded.accepted > accepted THEN excluded.variant ELSE variant END,
+    accepted = MAX(accepted, excluded.accepted)
+"""
+
+_Sample = Tuple[bytes, str, str, bool, float]
+
+
+class CaptchaDataset:
+    # Ground-truth captcha labels from upstream verdicts: an accepted query proves the
+    # OCR text right, a captcha_rejected proves it wrong. Images are deduplicated by
+    # hash and the oldest samples are evicted once the images exceed `max_bytes`.
+    # One writer thread owns the connection; the request path only enqueues.
+    def __init__(
+        self,
+        path: Path = Path(CAPTCHA_DATASET_PATH),
+        max_bytes: int = int(CAPTCHA_DATASET_MAX_MB * 1024 * 1024),
+        max_queue: int = CAPTCHA_DATASET_QUEUE,
+    ) -> None:
+        self._path = path
+        self._max_bytes = max_bytes
+        self._queue: "queue.Queue[Optional[_Sample]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="captcha-dataset", daemon=True)
+        self._thread.start()
+
+    def record(self, image_bytes: bytes, text: str, variant: str, accepted: bool) -> None:
+        if self._closed or not image_bytes or not text:
+            return
+        try:
+            self._queue.put_nowait((image_bytes, text, variant, accepted, time.time()))
+        except queue.Full:
+            METRICS.inc("captcha_dataset.dropped")
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            _LOGGER.warning("captcha_dataset_close: pending=%s dropped", self._queue.qsize())
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        try:
+            conn = _connect(self._path)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM samples").fetchone()[0]
+        except sqlite3.Error as exc:
+            _LOGGER.warning("captcha_dataset_error: path=%s err=%s", self._path, exc)
+            self._closed = True
+            return
+        stop = False
+        while not stop:
+            batch: List[_Sample] = []
+            item = self._queue.get()
+            # Drain whatever is queued into one transaction.
+            while item is not None:
+                batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stop = item is None
+            if not batch:
+                continue
+            try:
+                total = self._write(conn, batch, total)
+            except sqlite3.Error as exc:
+                METRICS.inc("captcha_dataset.errors")
+                _LOGGER.warning("captcha_dataset_error: path=%s err=%s", self._path, exc)
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[_Sample], total: int) -> int:
+        conn.execute("BEGIN")
+        try:
+            for image_bytes, text, variant, accepted, now in batch:
+                digest = hashlib.sha1(image_bytes).hexdigest()
+                exists = conn.execute("SELECT 1 FROM samples WHERE hash = ?", (digest,)).fetchone() is not None
+                conn.execute(
+                    _UPSERT,
+                    (digest, image_bytes, len(image_bytes), text, variant, int(accepted), now, now),
+                )
+                if exists:
+                    METRICS.inc("captcha_dataset.duplicates")
+                else:
+                    total += len(image_bytes)
+                    METRICS.inc("captcha_dataset.accepted" if accepted else "captcha_dataset.rejected")
+            if self._max_bytes > 0 and total > self._max_bytes:
+                total = self._evict(conn, total)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return total
+
+    def _evict(self, conn: sqlite3.Connection, total: int) -> int:
+        # Trim to 90% of the cap so eviction does not run on every insert.
+        target = int(self._max_bytes * 0.9)
+        evicted = 0
+        rows = conn.execute("SELECT hash, size FROM samples ORDER BY created_at").fetchall()
+        doomed = []
+        for digest, size in rows:
+            if total <= target:
+                break
+            doomed.append((digest,))
+            total -= size
+            evicted += 1
+        conn.executemany("DELETE FROM samples WHERE hash = ?", doomed)
+        METRICS.inc("captcha_dataset.evicted", evicted)
+        _LOGGER.info("captcha_dataset_evicted: samples=%s remaining_mb=%.1f", evicted, total / 1048576)
+        return total
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def iter_samples(
+    path: Path = Path(CAPTCHA_DATASET_PATH),
+    accepted: Optional[bool] = None,
+) -> Iterator[Dict[str, Any]]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        query = "SELECT hash, image, text, variant, accepted, seen, created_at FROM samples"
+        params: Tuple[Any, ...] = ()
+        if accepted is not None:
+            query += " WHERE accepted = ?"
+            params = (int(accepted),)
+        for digest, image, text, variant, ok, seen, created_at in conn.execute(query + " ORDER BY created_at", params):
+            yield {
+                "hash": digest,
+                "image": image,
+                "text": text,
+                "variant": variant,
+                "accepted": bool(ok),
+                "seen": seen,
+                "created_at": created_at,
+            }
+    finally:
+        conn.close()
+
+
+_DATASET: Optional[CaptchaDataset] = None
+_DATASET_LOCK = threading.Lock()
+
+
+def captcha_dataset() -> Optional[CaptchaDataset]:
+    global _DATASET
+    if not CAPTCHA_DATASET:
+        return None
+    if _DATASET is None:
+        with _DATASET_LOCK:
+            if _DATASET is None:
+                _DATASET = CaptchaDataset()
+                atexit.register(_DATASET.close)
+    return _DATASET
+
+
+def close_dataset() -> None:
+    if _DATASET is not None:
+        _DATASET.close()
@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+from .config import QUERY_DEADLINE_MAX_MS, QUERY_DEADLINE_MS, REQUEST_CONNECT_TIMEOUT, REQUEST_READ_TIMEOUT
+from .metrics import METRICS
+
+
+class DeadlineExceeded(RuntimeError):
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"deadline_exceeded:{stage}")
+        self.stage = stage
+        self.error = "deadline_exceeded"
+
+
+class Deadline:
+    # Absolute time budget for one query, shared by every stage (pool wait, warm-up,
+    # captcha, submit, retries). A hedged attempt gets a child with the same expiry
+    # and its own cancel flag.
+    def __init__(self, expires: Optional[float] = None) -> None:
+        self._expires = expires
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def after_ms(cls, budget_ms: Optional[int]) -> "Deadline":
+        if not budget_ms or budget_ms <= 0:
+            return cls()
+        if QUERY_DEADLINE_MAX_MS > 0:
+            budget_ms = min(budget_ms, QUERY_DEADLINE_MAX_MS)
+        return cls(time.monotonic() + budget_ms / 1000.0)
+
+    @classmethod
+    def default(cls) -> "Deadline":
+        return cls.after_ms(QUERY_DEADLINE_MS)
+
+    def child(self) -> "Deadline":
+        return Deadline(self._expires)
+
+    def remaining(self) -> Optional[float]:
+        if self._expires is None:
+            return None
+        return max(0.0, self._expires - time.monotonic())
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def expired(self) -> bool:
+        return self.cancelled or (self._expires is not None and time.monotonic() >= self._expires)
+
+    def check(self, stage: str) -> None:
+        if self.cancelled:
+            raise DeadlineExceeded("cancelled")
+        if self._expires is not None and time.monotonic() >= self._expires:
+            METRICS.inc(f"deadline.exceeded.{stage}")
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage: str) -> Tuple[float, float]:
+        # (connect, read) for requests, clipped so no single call outlives the budget.
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return REQUEST_CONNECT_TIMEOUT, REQUEST_READ_TIMEOUT
+        # urllib3 rejects a zero timeout.
+        remaining = max(0.001, remaining)
+        return min(REQUEST_CONNECT_TIMEOUT, remaining), min(REQUEST_READ_TIMEOUT, remaining)
@@ -5,6 +5,8 @@ from typing import Dict, Optional
 import requests
 
 from .config import COOKIE_FILE, COOKIE_PERSIST, EXTRA_HEADERS, ORIGIN, REFERER, USER_AGENT
+from .state import get_state
+from .traffic import mount_traffic
 
 
 DEFAULT_HEADERS: Dict[str, str] = {
@@ -34,6 +36,7 @@ def create_session(
     session.headers.update(DEFAULT_HEADERS)
     if proxies:
         session.proxies.update(proxies)
+    mount_traffic(session)
     load_cookies(session, cookie_key)
     return session
 
@@ -41,6 +44,10 @@ def create_session(
 def save_cookies(session: requests.Session, cookie_key: Optional[str] = None) -> None:
     if not COOKIE_PERSIST:
         return
+    state = get_state()
+    if state.shared:
+        state.save_cookies(cookie_key or "", requests.utils.dict_from_cookiejar(session.cookies))
+        return
     cookie_file = _cookie_path(cookie_key)
     COOKIE_FILE.parent.mkdir(parents=True, exist_ok=True)
     data = requests.utils.dict_from_cookiejar(session.cookies)
@@ -51,6 +58,12 @@ def save_cookies(session: requests.Session, cookie_key: Optional[str] = None) ->
 def load_cookies(session: requests.Session, cookie_key: Optional[str] = None) -> None:
     if not COOKIE_PERSIST:
         return
+    state = get_state()
+    if state.shared:
+        data = state.load_cookies(cookie_key or "")
+        if data:
+            session.cookies.update(data)
+        return
     cookie_file = _cookie_path(cookie_key)
     if not COOKIE_FILE.parent.exists():
         return
@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Generic, Iterable, List, Optional, TypeVar
+
+from .config import (
+    LANE_BULK_MAX_SHARE,
+    LANE_BULK_WEIGHT,
+    LANE_INTERACTIVE_QUOTA_RESERVE,
+    LANE_INTERACTIVE_WEIGHT,
+    PROXY_DAILY_QUOTA,
+)
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+# Bulk work held back by the quota reservation retries after this long; by then
+# interactive traffic may have rotated to a fresh proxy.
+_QUOTA_RETRY_AFTER = 30.0
+
+T = TypeVar("T")
+
+
+class QuotaReserved(RuntimeError):
+    def __init__(self, key: str, used: int, allowed: int) -> None:
+        super().__init__(f"quota_reserved:{key} used={used} allowed={allowed}")
+        self.error = "quota_reserved"
+        self.retry_after = _QUOTA_RETRY_AFTER
+
+
+def parse_lane(value: Optional[str], default: str = INTERACTIVE) -> Optional[str]:
+    if not value:
+        return default
+    lane = value.strip().lower()
+    return lane if lane in LANES else None
+
+
+def bulk_quota_allowance() -> Optional[int]:
+    # Per proxy and day, bulk work stops at PROXY_DAILY_QUOTA minus the interactive reserve.
+    if PROXY_DAILY_QUOTA <= 0:
+        return None
+    reserve = min(max(LANE_INTERACTIVE_QUOTA_RESERVE, 0.0), 1.0)
+    return int(PROXY_DAILY_QUOTA * (1.0 - reserve))
+
+
+class _Ticket:
+    __slots__ = ("item", "want")
+
+    def __init__(self, want: Any = None) -> None:
+        self.item: Any = None
+        # A ticket may ask for one particular item (a session holding a manual captcha).
+        self.want = want
+
+
+class _Lane:
+    def __init__(
+        self,
+        name: str,
+        weight: float,
+        limit: int,
+        rank: Optional[Callable[[Any], float]] = None,
+        yielding: bool = False,
+    ) -> None:
+        self.name = name
+        self.rank = rank
+        # Last rank per item (by id), computed outside the scheduler lock.
+        self.scores: Dict[int, float] = {}
+        # A yielding lane is only served while no other lane has anyone waiting.
+        self.yielding = yielding
+        self.weight = max(weight, 0.01)
+        self.limit = limit
+        self.in_use = 0
+        self.waiting: Deque[_Ticket] = deque()
+        # Stride scheduling: the waiting lane with the lowest pass goes next and
+        # advances by 1/weight, so grants split in proportion to the weights.
+        self.pass_value = 0.0
+
+
+class LaneScheduler(Generic[T]):
+    # Hands out pooled items to per-lane FIFO queues with weighted fair sharing.
+    # A lane never holds more than its limit, which keeps capacity free for the others.
+    # `capacity` (the adaptive global limit) may cap how many items are out at once;
+    # each lane's limit shrinks by the same amount so the other lanes keep their share.
+    def __init__(
+        self,
+        items: List[T],
+        weights: Dict[str, float],
+        limits: Dict[str, int],
+        ranks: Optional[Dict[str, Callable[[T], float]]] = None,
+        capacity: Optional[Callable[[], Optional[int]]] = None,
+        yielding: Iterable[str] = (),
+    ) -> None:
+        self._idle: Deque[T] = deque(items)
+        self._size = len(items)
+        self._capacity = capacity
+        self._cond = threading.Condition()
+        ranks = ranks or {}
+        yielding = set(yielding)
+        self._lanes = {
+            name: _Lane(name, weights[name], limits[name], ranks.get(name), name in yielding) for name in weights
+        }
+        self._vtime = 0.0
+        for lane in self._lanes.values():
+            self._publish(lane)
+
+    def idle(self) -> int:
+        with self._cond:
+            return len(self._idle)
+
+    def acquire(self, lane: str, timeout: Optional[float] = None, want: Optional[T] = None) -> Optional[T]:
+        state = self._lanes[lane]
+        if state.rank is not None and want is None:
+            self._rescore(state)
+        ticket = _Ticket(want)
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        with self._cond:
+            if not state.waiting:
+                # A lane returning from idle does not get credit for the time it was away.
+                state.pass_value = max(state.pass_value, self._vtime)
+            state.waiting.append(ticket)
+            self._publish(state)
+            self._dispatch()
+            while ticket.item is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    state.waiting.remove(ticket)
+                    self._publish(state)
+                    return None
+                self._cond.wait(remaining)
+        METRICS.observe(f"lanes.{lane}.wait_s", time.monotonic() - started)
+        return ticket.item
+
+    def borrow(self) -> Optional[T]:
+        # Background maintenance only takes an item nobody is waiting for.
+        with self._cond:
+            if not self._idle or any(lane.waiting for lane in self._lanes.values()):
+                return None
+            return self._idle.popleft()
+
+    def restore(self, item: T) -> None:
+        with self._cond:
+            self._idle.append(item)
+            self._dispatch()
+
+    def release(self, lane: str, item: T) -> None:
+        with self._cond:
+            self._idle.append(item)
+            self._lanes[lane].in_use -= 1
+            self._publish(self._lanes[lane])
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        granted = False
+        while self._idle:
+            cap = self._capacity() if self._capacity is not None else None
+            cut = 0 if cap is None else max(0, self._size - cap)
+            if cut and sum(lane.in_use for lane in self._lanes.values()) >= self._size - cut:
+                break
+            urgent = any(lane.waiting for lane in self._lanes.values() if not lane.yielding)
+            best: Optional[_Lane] = None
+            best_ticket: Optional[_Ticket] = None
+            for lane in self._lanes.values():
+                if lane.yielding and urgent:
+                    continue
+                if lane.waiting and lane.in_use < lane.limit - cut:
+                    ticket = self._ready(lane)
+                    if ticket is not None and (best is None or lane.pass_value < best.pass_value):
+                        best, best_ticket = lane, ticket
+            if best is None:
+                break
+            best.waiting.remove(best_ticket)
+            if best_ticket.want is not None:
+                self._idle.remove(best_ticket.want)
+                best_ticket.item = best_ticket.want
+            else:
+                best_ticket.item = self._take(best)
+            best.in_use += 1
+            self._vtime = best.pass_value
+            best.pass_value += 1.0 / best.weight
+            METRICS.inc(f"lanes.{best.name}.granted")
+            self._publish(best)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _ready(self, lane: _Lane) -> Optional[_Ticket]:
+        # FIFO, except that a ticket waiting for a busy item lets the ones behind it go first.
+        for ticket in lane.waiting:
+            if ticket.want is None or ticket.want in self._idle:
+                return ticket
+        return None
+
+    def _rescore(self, lane: _Lane) -> None:
+        # Ranking may read shared state (SQLite quota), so it runs before taking the lock;
+        # _take() only compares the cached scores.
+        with self._cond:
+            idle = list(self._idle)
+        scores = {id(item): lane.rank(item) for item in idle}
+        with self._cond:
+            lane.scores.update(scores)
+
+    def _take(self, lane: _Lane) -> T:
+        # Lanes without a rank take the longest-idle item; ranked lanes take the best one.
+        if lane.rank is None or len(self._idle) == 1:
+            return self._idle.popleft()
+        best = max(range(len(self._idle)), key=lambda index: lane.scores.get(id(self._idle[index]), 0.0))
+        item = self._idle[best]
+        del self._idle[best]
+        return item
+
+    def _publish(self, lane: _Lane) -> None:
+        METRICS.set_gauge(f"lanes.{lane.name}.in_use", lane.in_use)
+        METRICS.set_gauge(f"lanes.{lane.name}.waiting", len(lane.waiting))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                name: {
+                    "weight": lane.weight,
+                    "limit": lane.limit,
+                    "in_use": lane.in_use,
+                    "waiting": len(lane.waiting),
+                }
+                for name, lane in self._lanes.items()
+            }
+
+
+def lane_scheduler(
+    items: List[T],
+    bulk_rank: Optional[Callable[[T], float]] = None,
+    interactive: bool = True,
+    capacity: Optional[Callable[[], Optional[int]]] = None,
+) -> LaneScheduler[T]:
+    size = len(items)
+    yielding: List[str] = []
+    if not interactive:
+        # Bulk-only pools (bulk CLI, job worker nodes) have no callers to keep sessions for.
+        bulk_limit = size
+    elif size > 1:
+        # At least one session always stays free for interactive callers.
+        bulk_limit = max(1, min(size - 1, int(size * LANE_BULK_MAX_SHARE)))
+    else:
+        # Nothing to reserve: bulk borrows the one session only while no interactive caller waits.
+        bulk_limit = size
+        yielding.append(BULK)
+        _LOGGER.info("lanes_bulk_yielding: pool_size=%s", size)
+    return LaneScheduler(
+        items,
+        {INTERACTIVE: LANE_INTERACTIVE_WEIGHT, BULK: LANE_BULK_WEIGHT},
+        {INTERACTIVE: size, BULK: bulk_limit},
+        {BULK: bulk_rank} if bulk_rank is not None else None,
+        capacity,
+        yielding,
+    )
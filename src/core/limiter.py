@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from .config import (
+    ADAPTIVE_BACKOFF,
+    ADAPTIVE_CONCURRENCY,
+    ADAPTIVE_GLOBAL_INITIAL,
+    ADAPTIVE_GLOBAL_MAX,
+    ADAPTIVE_GLOBAL_MIN,
+    ADAPTIVE_LATENCY_FACTOR,
+    ADAPTIVE_PROXY_INITIAL,
+    ADAPTIVE_PROXY_MAX,
+    ADAPTIVE_PROXY_MIN,
+)
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Outcomes (see core.classify) that mean the upstream or proxy is overloaded.
+_CONGESTION = {"error", "blocked", "unknown"}
+_MAX_PROXY_LIMITERS = 256
+# Scheduling jitter on fast upstreams should not read as congestion.
+_LATENCY_SLACK = 0.1
+
+
+class AIMDLimiter:
+    # Additive increase (+1 per window of successes), multiplicative decrease on
+    # errors or latency well above the recent median.
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        floor: int,
+        ceiling: int,
+        backoff: float = 0.5,
+        latency_factor: float = 3.0,
+        gauges: bool = True,
+    ) -> None:
+        self.name = name
+        self._floor = max(1, floor)
+        self._ceiling = max(self._floor, ceiling)
+        self._limit = float(min(max(initial, self._floor), self._ceiling))
+        self._backoff = min(max(backoff, 0.1), 0.95)
+        self._latency_factor = latency_factor
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._latencies: Deque[float] = deque(maxlen=100)
+        self._gauges = gauges
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[float]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._inflight >= int(self._limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            self._inflight += 1
+            self._publish()
+            return time.monotonic()
+
+    def enter(self) -> float:
+        # Counts a request admitted elsewhere (the global limit is applied at pool borrow).
+        with self._cond:
+            self._inflight += 1
+            self._publish()
+            return time.monotonic()
+
+    def bound(self, ceiling: int) -> None:
+        with self._cond:
+            self._ceiling = max(self._floor, min(self._ceiling, ceiling))
+            self._limit = min(self._limit, float(self._ceiling))
+            self._publish()
+
+    def release(self, started: float, outcome: str) -> None:
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self._inflight -= 1
+            if outcome in _CONGESTION or outcome == "limit_reached" or self._slow(latency):
+                # Only the first signal from a congestion episode counts: requests
+                # that started before the last decrease saw the old limit.
+                if started >= self._last_decrease:
+                    self._limit = max(float(self._floor), self._limit * self._backoff)
+                    self._last_decrease = now
+                    METRICS.inc(f"limiter.{self.name}.decreases")
+            elif outcome == "success":
+                self._latencies.append(latency)
+                self._limit = min(float(self._ceiling), self._limit + 1.0 / self._limit)
+            self._publish()
+            self._cond.notify_all()
+
+    def _slow(self, latency: float) -> bool:
+        if self._latency_factor <= 0 or len(self._latencies) < 10:
+            return False
+        baseline = sorted(self._latencies)[len(self._latencies) // 2]
+        return latency > self._latency_factor * baseline and latency - baseline > _LATENCY_SLACK
+
+    def _publish(self) -> None:
+        if self._gauges:
+            METRICS.set_gauge(f"limiter.{self.name}.limit", int(self._limit))
+            METRICS.set_gauge(f"limiter.{self.name}.inflight", self._inflight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "inflight": self._inflight,
+                "floor": self._floor,
+                "ceiling": self._ceiling,
+            }
+
+
+class Permit:
+    __slots__ = ("_limits", "_proxy", "_proxy_started", "_global_started", "_released")
+
+    def __init__(
+        self,
+        limits: "AdaptiveLimits",
+        proxy: Optional[AIMDLimiter],
+        proxy_started: Optional[float],
+        global_started: Optional[float],
+    ) -> None:
+        self._limits = limits
+        self._proxy = proxy
+        self._proxy_started = proxy_started
+        self._global_started = global_started
+        self._released = False
+
+    def release(self, outcome: str) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self._global_started is not None:
+            # limit_reached is a per-proxy quota signal, not upstream congestion.
+            self._limits.global_limiter.release(
+                self._global_started, "captcha_rejected" if outcome == "limit_reached" else outcome
+            )
+        if self._proxy is not None and self._proxy_started is not None:
+            self._proxy.release(self._proxy_started, outcome)
+
+
+class AdaptiveLimits:
+    def __init__(self, enabled: bool = ADAPTIVE_CONCURRENCY) -> None:
+        self.enabled = enabled
+        self.global_limiter = AIMDLimiter(
+            "global",
+            ADAPTIVE_GLOBAL_INITIAL,
+            ADAPTIVE_GLOBAL_MIN,
+            ADAPTIVE_GLOBAL_MAX,
+            ADAPTIVE_BACKOFF,
+            ADAPTIVE_LATENCY_FACTOR,
+            gauges=enabled,
+        )
+        self._proxies: Dict[str, AIMDLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _proxy_limiter(self, key: str) -> AIMDLimiter:
+        with self._lock:
+            limiter = self._proxies.pop(key, None)
+            if limiter is None:
+                limiter = AIMDLimiter(
+                    "proxy",
+                    ADAPTIVE_PROXY_INITIAL,
+                    ADAPTIVE_PROXY_MIN,
+                    ADAPTIVE_PROXY_MAX,
+                    ADAPTIVE_BACKOFF,
+                    ADAPTIVE_LATENCY_FACTOR,
+                    gauges=False,
+                )
+                if len(self._proxies) >= _MAX_PROXY_LIMITERS:
+                    for stale, old in list(self._proxies.items()):
+                        if old.inflight == 0:
+                            self._proxies.pop(stale)
+                            break
+            # Re-inserted so iteration order tracks recent use.
+            self._proxies[key] = limiter
+            return limiter
+
+    def capacity(self) -> Optional[int]:
+        # How many pooled sessions may run queries at once; None means all of them.
+        return self.global_limiter.limit if self.enabled else None
+
+    def bound(self, size: int) -> None:
+        # The global limit gates pool borrows, so growing past the pool size would mean nothing.
+        self.global_limiter.bound(size)
+
+    def acquire(self, proxy_key: Optional[str], timeout: Optional[float] = None) -> Optional[Permit]:
+        # Returns None when the proxy limiter stays full for `timeout` seconds. The global
+        # limiter only records the outcome here; the pool enforces it (see capacity()).
+        proxy = self._proxy_limiter(proxy_key) if self.enabled and proxy_key else None
+        proxy_started = None
+        if proxy is not None:
+            proxy_started = proxy.acquire(timeout)
+            if proxy_started is None:
+                return None
+        global_started = self.global_limiter.enter() if self.enabled else None
+        return Permit(self, proxy, proxy_started, global_started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            proxies = {key: limiter.snapshot() for key, limiter in self._proxies.items()}
+        return {"enabled": self.enabled, "global": self.global_limiter.snapshot(), "proxies": proxies}
+
+
+LIMITS = AdaptiveLimits()
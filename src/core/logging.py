@@ -1,8 +1,215 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from .config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE, LOG_QUEUE_SIZE, LOG_SAMPLE
+from .metrics import METRICS
+
+_TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+_EVENT = re.compile(r"^([a-z][a-z0-9_]*):\s?(.*)$", re.S)
+_FIELDS = re.compile(r"(\w+)=(\S*)")
+_CLIENT_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_REQUEST_ID: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+_LISTENER: Optional["_QueueListener"] = None
+_HOOKED = False
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> str:
+    return _REQUEST_ID.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    # Every log line emitted inside the block (including worker threads started via
+    # contextvars.copy_context) carries this id.
+    request_id = request_id or new_request_id()
+    token = _REQUEST_ID.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _REQUEST_ID.reset(token)
+
+
+class RequestIdMiddleware:
+    # Plain ASGI middleware: takes a sane X-Request-Id from the client or makes one,
+    # binds it for the request and echoes it in the response.
+    def __init__(self, app: Any) -> None:
+        self._app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers") or ():
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _CLIENT_ID.match(candidate):
+                    request_id = candidate
+                break
+        with request_context(request_id) as bound:
+            header = (b"x-request-id", bound.encode("latin-1"))
+
+            async def send_with_id(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [header]
+                await send(message)
+
+            await self._app(scope, receive, send_with_id)
+
+
+def _event_of(message: str) -> str:
+    head, sep, _ = message.partition(":")
+    return head if sep and head.isidentifier() else ""
+
+
+def _parse_rates(items: list[str]) -> Dict[str, float]:
+    rates = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            rates[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return rates
+
+
+class _ContextFilter(logging.Filter):
+    # Runs on the calling thread: tags the record with the request id and drops
+    # sampled-out INFO/DEBUG events before anything is formatted or queued.
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self._rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = _REQUEST_ID.get()
+        record.request_id = request_id
+        if not self._rates or record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        rate = self._rates.get(_event_of(record.msg))
+        if rate is None or rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        if request_id != "-":
+            # Keyed on the request, so a sampled request keeps all lines of that event.
+            return zlib.crc32(f"{record.msg}|{request_id}".encode("utf-8")) / 4294967296.0 < rate
+        return random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the %-merge happens on the caller's thread; formatting (and any
+        # traceback rendering) is left to the writer thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on a slow log sink.
+            METRICS.inc("log.dropped")
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # The stop marker waits for room; dropping it would leave stop() hanging.
+        self.queue.put(self._sentinel)
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        match = _EVENT.match(message)
+        if match:
+            entry["event"] = match.group(1)
+            rest = match.group(2)
+            # Only `key=value` lists are split into fields; free text stays in msg.
+            if rest and _FIELDS.sub("", rest).strip() == "":
+                entry.update({key: value for key, value in _FIELDS.findall(rest) if key not in entry})
+        entry["msg"] = message
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
 
 
 def setup_logging() -> None:
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)s %(name)s %(message)s",
-    )
+    global _LISTENER, _HOOKED
+    if _LISTENER is not None:
+        return
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter(_TEXT_FORMAT))
+    context = _ContextFilter(_parse_rates(LOG_SAMPLE))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    if not LOG_QUEUE:
+        stream.addFilter(context)
+        root.addHandler(stream)
+        return
+    # Callers only enqueue; one listener thread formats and writes.
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(0, LOG_QUEUE_SIZE))
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(context)
+    root.addHandler(handler)
+    _LISTENER = _QueueListener(log_queue, stream, respect_handler_level=True)
+    _LISTENER.start()
+    if not _HOOKED:
+        _HOOKED = True
+        atexit.register(stop_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_after_fork)
+
+
+def stop_logging() -> None:
+    global _LISTENER
+    if _LISTENER is not None:
+        # Drains what is already queued before returning.
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+def _after_fork() -> None:
+    # The listener thread does not survive fork; pre-forked workers start their own.
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER = None
+        setup_logging()
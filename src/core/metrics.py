@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Any, Dict
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def inc(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name: str, amount: float) -> None:
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            entry = self._timings.get(name)
+            if entry is None:
+                entry = {"count": 0, "sum": 0.0, "max": 0.0}
+                self._timings[name] = entry
+            entry["count"] += 1
+            entry["sum"] += value
+            if value > entry["max"]:
+                entry["max"] = value
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {
+                name: {
+                    "count": entry["count"],
+                    "avg": entry["sum"] / entry["count"] if entry["count"] else 0.0,
+                    "max": entry["max"],
+                }
+                for name, entry in self._timings.items()
+            }
+            return {
+                "uptime_s": round(time.time() - self._started, 3),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings,
+            }
+
+
+METRICS = Metrics()
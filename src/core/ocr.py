@@ -1,27 +1,50 @@
 import io
 import logging
 import re
-from typing import Optional
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-import ddddocr
 from PIL import Image, ImageChops, ImageFilter, ImageSequence
 
 from .config import CAPTCHA_CASE, CAPTCHA_LEN, CAPTCHA_REGEX, OCR_THRESHOLD, OCR_WHITELIST
 
+if TYPE_CHECKING:
+    import ddddocr
+
 _LOGGER = logging.getLogger(__name__)
-_OCR: Optional[ddddocr.DdddOcr] = None
+_OCR: Optional["ddddocr.DdddOcr"] = None
+_OCR_LOCK = threading.Lock()
 
 
-def _get_ocr() -> ddddocr.DdddOcr:
+def _get_ocr() -> "ddddocr.DdddOcr":
     global _OCR
     if _OCR is None:
-        ocr = ddddocr.DdddOcr(show_ad=False)
-        if OCR_WHITELIST:
-            ocr.set_ranges(OCR_WHITELIST)
-        _OCR = ocr
+        with _OCR_LOCK:
+            if _OCR is None:
+                # ddddocr pulls in onnxruntime; import it only when the model is needed.
+                import ddddocr
+
+                ocr = ddddocr.DdddOcr(show_ad=False)
+                if OCR_WHITELIST:
+                    ocr.set_ranges(OCR_WHITELIST)
+                _OCR = ocr
     return _OCR
 
 
+def ocr_loaded() -> bool:
+    return _OCR is not None
+
+
+def warm_ocr() -> float:
+    started = time.perf_counter()
+    ocr = _get_ocr()
+    ocr.classification(_to_bytes(Image.new("L", (100, 40), 255)))
+    elapsed = time.perf_counter() - started
+    _LOGGER.info("ocr_warm: elapsed=%.3fs", elapsed)
+    return elapsed
+
+
 def _to_bytes(img: Image.Image) -> bytes:
     buffer = io.BytesIO()
     img.save(buffer, format="PNG")
@@ -67,9 +90,9 @@ def _classify(image_bytes: bytes) -> str:
     return normalize_text(ocr.classification(image_bytes))
 
 
-def _extract_variants(image_bytes: bytes) -> list[bytes]:
+def _extract_variants(image_bytes: bytes) -> List[Tuple[str, bytes]]:
     img = Image.open(io.BytesIO(image_bytes))
-    variants: list[bytes] = []
+    variants: List[Tuple[str, bytes]] = []
     if getattr(img, "is_animated", False) and getattr(img, "n_frames", 1) > 1:
         frames = []
         for frame in ImageSequence.Iterator(img):
@@ -82,41 +105,53 @@ def _extract_variants(image_bytes: bytes) -> list[bytes]:
         for frame in frames[1:]:
             darker = ImageChops.darker(darker, frame)
             lighter = ImageChops.lighter(lighter, frame)
-        variants.append(_to_bytes(frames[0]))
-        variants.append(_to_bytes(darker))
-        variants.append(_to_bytes(lighter))
+        variants.append(("frame", _to_bytes(frames[0])))
+        variants.append(("darker", _to_bytes(darker)))
+        variants.append(("lighter", _to_bytes(lighter)))
         if OCR_THRESHOLD >= 0:
-            variants.append(_to_bytes(_prepare_image(frames[0].copy(), OCR_THRESHOLD)))
-            variants.append(_to_bytes(_prepare_image(darker.copy(), OCR_THRESHOLD)))
-            variants.append(_to_bytes(_prepare_image(lighter.copy(), OCR_THRESHOLD)))
+            variants.append(("frame_threshold", _to_bytes(_prepare_image(frames[0].copy(), OCR_THRESHOLD))))
+            variants.append(("darker_threshold", _to_bytes(_prepare_image(darker.copy(), OCR_THRESHOLD))))
+            variants.append(("lighter_threshold", _to_bytes(_prepare_image(lighter.copy(), OCR_THRESHOLD))))
         return variants
 
-    variants.append(preprocess(image_bytes, None))
+    variants.append(("gray", preprocess(image_bytes, None)))
     if OCR_THRESHOLD >= 0:
-        variants.append(preprocess(image_bytes, OCR_THRESHOLD))
+        variants.append(("threshold", preprocess(image_bytes, OCR_THRESHOLD)))
     return variants
 
 
-def read_captcha_text(image_bytes: bytes) -> str:
-    candidates = []
-    candidates.append(_classify(image_bytes))
-    for variant in _extract_variants(image_bytes):
-        candidates.append(_classify(variant))
+def ocr_candidates(image_bytes: bytes) -> List[Tuple[str, str]]:
+    # (variant, text) for every distinct reading, in preference order.
+    candidates = [("raw", _classify(image_bytes))]
+    for name, variant in _extract_variants(image_bytes):
+        candidates.append((name, _classify(variant)))
 
     seen = set()
     ordered = []
-    for text in candidates:
+    for name, text in candidates:
         if text in seen:
             continue
         seen.add(text)
-        ordered.append(text)
+        ordered.append((name, text))
+    if ordered:
+        _LOGGER.info("ocr_candidates: %s", [text for _, text in ordered])
+    return ordered
 
-    for text in ordered:
-        if text and is_valid(text):
-            _LOGGER.info("ocr_candidates: %s", ordered)
-            return text
 
+def pick_candidate(ordered: List[Tuple[str, str]]) -> Tuple[str, str]:
+    for name, text in ordered:
+        if text and is_valid(text):
+            return text, name
     if ordered:
-        _LOGGER.info("ocr_candidates: %s", ordered)
-        return max(ordered, key=len)
-    return ""
+        name, text = max(ordered, key=lambda item: len(item[1]))
+        return text, name
+    return "", ""
+
+
+def read_captcha(image_bytes: bytes) -> Tuple[str, str]:
+    # (text, name of the image variant the text was read from)
+    return pick_candidate(ocr_candidates(image_bytes))
+
+
+def read_captcha_text(image_bytes: bytes) -> str:
+    return read_captcha(image_bytes)[0]
@@ -0,0 +1,47 @@
+import os
+import sys
+from typing import Dict, Optional
+
+
+def _read_kb_fields(path: str, fields: tuple[str, ...]) -> Dict[str, int]:
+    values: Dict[str, int] = {}
+    try:
+        with open(path, "r", encoding="ascii", errors="replace") as handle:
+            for line in handle:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    parts = rest.split()
+                    if parts:
+                        values[name] = int(parts[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    pid = pid or os.getpid()
+    # smaps_rollup gives PSS, which splits copy-on-write pages shared with the
+    # parent across the processes that map them.
+    rollup = _read_kb_fields(
+        f"/proc/{pid}/smaps_rollup",
+        ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"),
+    )
+    if rollup:
+        return {
+            "rss_bytes": rollup.get("Rss", 0),
+            "pss_bytes": rollup.get("Pss", 0),
+            "shared_bytes": rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0),
+            "private_bytes": rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0),
+        }
+    status = _read_kb_fields(f"/proc/{pid}/status", ("VmRSS",))
+    if status:
+        return {"rss_bytes": status["VmRSS"]}
+    if pid == os.getpid():
+        try:
+            import resource
+        except ImportError:
+            return {}
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere.
+        return {"max_rss_bytes": peak if sys.platform == "darwin" else peak * 1024}
+    return {}
@@ -2,8 +2,8 @@ import json
 import logging
 import re
 import time
-from dataclasses import dataclass
-from typing import Optional, Tuple
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import quote, urlparse
 
 import requests
@@ -24,6 +24,10 @@ from .config import (
     PROXY_ALWAYS_REFRESH,
     PROXY_REFRESH_BEFORE_SECONDS,
 )
+from .breaker import CircuitOpenError, breaker
+from .proxystats import PROXY_STATS
+from .state import get_state, quota_key
+from .traffic import mount_traffic
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -49,12 +53,46 @@ class ProxyInfo:
     expires_at: Optional[float] = None
 
 
+def build_proxy_url(endpoint: str) -> str:
+    if "://" in endpoint:
+        url = endpoint
+    else:
+        url = f"{PROXY_SCHEME}://{endpoint}"
+    if PROXY_USERNAME and PROXY_PASSWORD and "@" not in url:
+        user = quote(PROXY_USERNAME, safe="")
+        password = quote(PROXY_PASSWORD, safe="")
+        scheme, rest = url.split("://", 1)
+        url = f"{scheme}://{user}:{password}@{rest}"
+    return url
+
+
+def export_proxy(info: ProxyInfo) -> Dict[str, Any]:
+    # Snapshots never hold proxy credentials; import_proxy() takes them from config again.
+    data = asdict(info)
+    parsed = urlparse(info.url)
+    if "@" in parsed.netloc:
+        data["url"] = parsed._replace(netloc=parsed.netloc.rsplit("@", 1)[1]).geturl()
+    return data
+
+
+def import_proxy(data: Dict[str, Any]) -> ProxyInfo:
+    data = dict(data)
+    if data.get("source") == "static" and PROXY_URL.strip():
+        data["url"] = build_proxy_url(PROXY_URL.strip())
+    else:
+        data["url"] = build_proxy_url(data["url"])
+    return ProxyInfo(**data)
+
+
 class ProxyManager:
     def __init__(self) -> None:
         self._session = requests.Session()
         if PROXY_API_HEADERS:
             self._session.headers.update({str(k): str(v) for k, v in PROXY_API_HEADERS.items()})
+        mount_traffic(self._session)
         self._current: Optional[ProxyInfo] = None
+        self._need_budget = False
+        self._state = get_state()
 
     def enabled(self) -> bool:
         return PROXY_MODE in {"static", "api"}
@@ -64,7 +102,7 @@ class ProxyManager:
             raw = PROXY_URL.strip()
             if not raw:
                 return None
-            url = self._build_proxy_url(raw)
+            url = build_proxy_url(raw)
             endpoint = self._endpoint_key(url)
             fetched_at = time.time()
             return ProxyInfo(
@@ -76,20 +114,55 @@ class ProxyManager:
                 cookie_key=endpoint,
             )
         if PROXY_MODE == "api":
-            if self._current and self._should_refresh(self._current):
+            if self._current and (self._should_refresh(self._current) or self._state.proxy_retired(self._current)):
                 self._current = None
             if self._current is None:
-                self._current = self._fetch_from_api()
+                # With shared state another worker's live proxy is reused before buying a new one.
+                self._current = self._state.acquire_proxy(
+                    self._fetch_from_api,
+                    lambda info: not self._should_refresh(info) and not (self._need_budget and self.rank(info) < 0),
+                    self.rank,
+                )
             return self._current
         return None
 
+    def rank(self, info: ProxyInfo) -> float:
+        # Among live proxies, reuse the one whose remaining budget is most at risk of expiring unused.
+        return PROXY_STATS.score(info, self._state.quota(quota_key(info))[0])
+
     def rotate(self, reason: str) -> Optional[ProxyInfo]:
         if PROXY_MODE != "api":
             return self.get_proxy()
         _LOGGER.info("proxy_rotate: reason=%s", reason)
+        PROXY_STATS.rotated(reason)
+        if self._current is not None:
+            self._state.retire_proxy(self._current, reason)
         self._current = None
         return self.get_proxy()
 
+    def adopt(self, info: ProxyInfo) -> bool:
+        # Resume a proxy from a state snapshot if it is still live.
+        if PROXY_MODE != "api":
+            return True
+        if self._should_refresh(info) or self._state.proxy_retired(info):
+            return False
+        self._current = info
+        return True
+
+    def move_off(self, reason: str) -> Optional[ProxyInfo]:
+        # Unlike rotate(), the current proxy stays live for other sessions; this one
+        # switches to a proxy with bulk budget left, buying one if none is live.
+        if PROXY_MODE != "api":
+            return self.get_proxy()
+        _LOGGER.info("proxy_move_off: reason=%s", reason)
+        PROXY_STATS.rotated(reason)
+        self._current = None
+        self._need_budget = True
+        try:
+            return self.get_proxy()
+        finally:
+            self._need_budget = False
+
     def release_current(self, reason: str) -> bool:
         if PROXY_MODE != "api" or not PROXY_API_RELEASE_URL:
             return False
@@ -112,29 +185,17 @@ class ProxyManager:
         _LOGGER.info("proxy_release: reason=%s status=%s body=%s", reason, status, text)
         return True
 
-    def _build_proxy_url(self, endpoint: str) -> str:
-        if "://" in endpoint:
-            url = endpoint
-        else:
-            url = f"{PROXY_SCHEME}://{endpoint}"
-        if PROXY_USERNAME and PROXY_PASSWORD and "@" not in url:
-            user = quote(PROXY_USERNAME, safe="")
-            password = quote(PROXY_PASSWORD, safe="")
-            scheme, rest = url.split("://", 1)
-            url = f"{scheme}://{user}:{password}@{rest}"
-        return url
-
     def _fetch_from_api(self) -> ProxyInfo:
         if not PROXY_API_URL:
             raise ValueError("proxy_api_url_missing")
         payload = self._fetch_payload(PROXY_API_URL, allow_active=True)
-        url = self._build_proxy_url(payload.server)
+        url = build_proxy_url(payload.server)
         safe_endpoint = self._endpoint_key(url)
         fetched_at = time.time()
         cookie_key = self._cookie_key(payload, safe_endpoint, fetched_at)
         expires_at = self._parse_deadline(payload.deadline)
         _LOGGER.info("proxy_api: endpoint=%s", safe_endpoint)
-        return ProxyInfo(
+        info = ProxyInfo(
             endpoint=safe_endpoint,
             url=url,
             source="api",
@@ -145,12 +206,27 @@ class ProxyManager:
             cookie_key=cookie_key,
             expires_at=expires_at,
         )
+        PROXY_STATS.purchased(info)
+        return info
 
     def _fetch_payload(self, url: str, allow_active: bool) -> ProxyPayload:
-        text, status_code = self._request_api(url)
+        circuit = breaker("proxy_api" if allow_active else "proxy_api_active")
+        try:
+            circuit.before()
+        except CircuitOpenError:
+            if allow_active and PROXY_API_ACTIVE_URL:
+                return self._fetch_payload(PROXY_API_ACTIVE_URL, allow_active=False)
+            raise
+        try:
+            text, status_code = self._request_api(url)
+        except requests.RequestException as exc:
+            circuit.failure(type(exc).__name__)
+            raise
         payload, code, message = self._parse_endpoint(text)
         if payload:
+            circuit.success()
             return payload
+        circuit.failure(code or f"http_{status_code}")
         if allow_active and code == "NO_AVAILABLE_CHANNEL" and PROXY_API_ACTIVE_URL:
             _LOGGER.info("proxy_api_active_fallback: code=%s", code)
             return self._fetch_payload(PROXY_API_ACTIVE_URL, allow_active=False)
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+from .config import PROXY_REFRESH_BEFORE_SECONDS
+from .lanes import bulk_quota_allowance
+from .metrics import METRICS
+from .state import quota_key
+
+_MAX_RECORDS = 256
+_WINDOW = 50
+
+
+class _ProxyRecord:
+    __slots__ = ("key", "purchased_at", "expires_at", "ok", "failed", "limited", "outcomes", "last_used")
+
+    def __init__(self, key: str, purchased_at: float, expires_at: Optional[float]) -> None:
+        self.key = key
+        self.purchased_at = purchased_at
+        self.expires_at = expires_at
+        self.ok = 0
+        self.failed = 0
+        self.limited = 0
+        self.outcomes: Deque[bool] = deque(maxlen=_WINDOW)
+        self.last_used = 0.0
+
+    def success_rate(self) -> float:
+        # Laplace-smoothed so a fresh proxy starts near 1 and one error does not sink it.
+        return (sum(self.outcomes) + 1.0) / (len(self.outcomes) + 2.0)
+
+
+class ProxyStats:
+    # Per exit IP usage for this process: what each purchased proxy delivered
+    # before it was rotated, and a score used to pack batch work onto proxies.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, _ProxyRecord]" = OrderedDict()
+        self._purchases = 0
+        self._queries = 0
+        self._rotations: Dict[str, int] = {}
+
+    def _record(self, info: Any) -> _ProxyRecord:
+        key = quota_key(info)
+        record = self._records.get(key)
+        if record is None:
+            record = _ProxyRecord(key, info.fetched_at, info.expires_at)
+            self._records[key] = record
+            while len(self._records) > _MAX_RECORDS:
+                self._records.popitem(last=False)
+        return record
+
+    def purchased(self, info: Any) -> None:
+        with self._lock:
+            self._purchases += 1
+            self._record(info)
+        METRICS.inc("proxy.purchases")
+
+    def rotated(self, reason: str) -> None:
+        with self._lock:
+            self._rotations[reason] = self._rotations.get(reason, 0) + 1
+
+    def record(self, info: Any, outcome: str) -> None:
+        with self._lock:
+            record = self._record(info)
+            record.last_used = time.time()
+            if outcome == "success":
+                self._queries += 1
+                record.ok += 1
+                record.outcomes.append(True)
+            elif outcome == "limit_reached":
+                record.limited += 1
+            elif outcome in ("error", "blocked", "unknown"):
+                record.failed += 1
+                record.outcomes.append(False)
+
+    def score(self, info: Any, used: Optional[int] = None, now: Optional[float] = None) -> float:
+        # Higher goes first. A proxy that must serve many queries in little time
+        # (remaining budget over time to expiry) is drained before fresher ones, so
+        # budget is not lost when it expires; -1 means no bulk budget left.
+        now = time.time() if now is None else now
+        with self._lock:
+            record = self._records.get(quota_key(info))
+            rate = record.success_rate() if record is not None else 1.0
+            if used is None:
+                used = record.ok if record is not None else 0
+        allowance = bulk_quota_allowance()
+        remaining = None if allowance is None else allowance - used
+        if remaining is not None and remaining <= 0:
+            return -1.0
+        urgency = 0.0
+        if info.expires_at is not None:
+            time_left = max(1.0, info.expires_at - PROXY_REFRESH_BEFORE_SECONDS - now)
+            urgency = (remaining if remaining is not None else 1) / time_left
+        return rate * (1.0 + urgency)
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            rotations = sum(self._rotations.values())
+            proxies = [
+                {
+                    "key": record.key,
+                    "ok": record.ok,
+                    "failed": record.failed,
+                    "limited": record.limited,
+                    "success_rate": round(record.success_rate(), 3),
+                    "expires_in_s": None if record.expires_at is None else round(record.expires_at - time.time()),
+                }
+                for record in (list(self._records.values())[-top:] if top > 0 else [])
+            ]
+            return {
+                "purchases": self._purchases,
+                "queries": self._queries,
+                "queries_per_proxy": round(self._queries / self._purchases, 1) if self._purchases else None,
+                "rotations": dict(self._rotations),
+                "rotations_per_1k": round(rotations * 1000.0 / self._queries, 1) if self._queries else None,
+                "proxies": proxies,
+            }
+
+
+PROXY_STATS = ProxyStats()
@@ -0,0 +1,56 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, required: bool = True) -> None:
+        with self._lock:
+            self._components[name] = {"state": "pending", "required": required, "error": None, "elapsed_s": None}
+
+    def mark(self, name: str, state: str, error: Optional[str] = None, elapsed: Optional[float] = None) -> None:
+        with self._lock:
+            component = self._components.setdefault(name, {"required": True})
+            component["state"] = state
+            component["error"] = error
+            component["elapsed_s"] = round(elapsed, 3) if elapsed is not None else None
+
+    def ready(self) -> bool:
+        with self._lock:
+            for component in self._components.values():
+                if component["state"] == "pending":
+                    return False
+                if component["required"] and component["state"] != "ready":
+                    return False
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: dict(component) for name, component in self._components.items()}
+
+    def run(self, name: str, fn: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as exc:
+            _LOGGER.warning("startup_%s_error: %s", name, exc)
+            self.mark(name, "failed", error=str(exc) or type(exc).__name__, elapsed=time.perf_counter() - started)
+            return
+        self.mark(name, "ready", elapsed=time.perf_counter() - started)
+
+    def start_background(self, steps: list[tuple[str, Callable[[], Any]]]) -> threading.Thread:
+        def _run() -> None:
+            for name, fn in steps:
+                self.run(name, fn)
+            _LOGGER.info("startup_ready: ready=%s components=%s", self.ready(), self.snapshot())
+
+        thread = threading.Thread(target=_run, name="startup-warmup", daemon=True)
+        thread.start()
+        return thread
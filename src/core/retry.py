@@ -0,0 +1,214 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from .config import (
+    CAPTCHA_MAX_TRIES,
+    PROXY_ROTATE_AFTER_ERRORS,
+    RETRY_BUDGET_SECONDS,
+    RETRY_DECAY,
+    RETRY_EXPLORE,
+    RETRY_MAX_STEPS,
+    RETRY_POLICY,
+    RETRY_ROTATE_COST,
+)
+from .classify import BLOCKED, CAPTCHA_REJECTED
+from .metrics import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Failure classes: the classifier's captcha_rejected and blocked, plus two seen before a verdict.
+CAPTCHA_INVALID = "captcha_invalid"
+PROXY_ERROR = "proxy_error"
+FAILURES = (CAPTCHA_INVALID, CAPTCHA_REJECTED, PROXY_ERROR, BLOCKED)
+
+REOCR = "reocr"
+REFETCH = "refetch"
+REWARM = "rewarm"
+ROTATE = "rotate"
+GIVE_UP = "give_up"
+ACTIONS = (REOCR, REFETCH, REWARM, ROTATE)
+
+# (success probability, seconds) before anything is observed. Worth _PRIOR_WEIGHT
+# observations, so live data takes over after a handful of retries.
+_PRIORS: Dict[Tuple[str, str], Tuple[float, float]] = {
+    (CAPTCHA_INVALID, REFETCH): (0.6, 0.3),
+    (CAPTCHA_INVALID, REWARM): (0.6, 0.6),
+    (CAPTCHA_INVALID, ROTATE): (0.6, 1.0),
+    (CAPTCHA_REJECTED, REOCR): (0.3, 0.2),
+    (CAPTCHA_REJECTED, REFETCH): (0.6, 0.5),
+    (CAPTCHA_REJECTED, REWARM): (0.6, 0.8),
+    (CAPTCHA_REJECTED, ROTATE): (0.6, 1.2),
+    (PROXY_ERROR, REFETCH): (0.4, 1.0),
+    (PROXY_ERROR, REWARM): (0.5, 1.2),
+    (PROXY_ERROR, ROTATE): (0.8, 1.5),
+    (BLOCKED, REFETCH): (0.1, 0.5),
+    (BLOCKED, REWARM): (0.3, 0.8),
+    (BLOCKED, ROTATE): (0.8, 1.5),
+}
+_PRIOR_WEIGHT = 2.0
+_MIN_P = 0.02
+
+
+class _Arm:
+    __slots__ = ("wins", "trials", "cost", "taken")
+
+    def __init__(self, p: float, cost: float) -> None:
+        self.wins = p * _PRIOR_WEIGHT
+        self.trials = _PRIOR_WEIGHT
+        self.cost = cost
+        self.taken = 0
+
+    def p(self) -> float:
+        return max(_MIN_P, self.wins / self.trials)
+
+
+class RetryRun:
+    # Retry bookkeeping for one query; the open decision is scored by the next outcome.
+    __slots__ = ("started", "steps", "proxy_failures", "pending")
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.steps = 0
+        self.proxy_failures = 0
+        self.pending: Optional[Tuple[str, str, float]] = None
+
+
+class RetryPolicy:
+    # Picks the next action after a failed attempt. Each (failure, action) pair keeps a
+    # decayed success rate and an average cost in seconds (what the retry took until its
+    # outcome, plus RETRY_ROTATE_COST for a proxy rotation); the action with the lowest
+    # expected cost to a success (cost / p) wins, and the query gives up once that exceeds
+    # the time left in its budget. "fixed" keeps the old CAPTCHA_MAX_TRIES behaviour.
+    def __init__(
+        self,
+        mode: str = RETRY_POLICY,
+        max_steps: int = RETRY_MAX_STEPS,
+        budget: float = RETRY_BUDGET_SECONDS,
+        explore: float = RETRY_EXPLORE,
+        decay: float = RETRY_DECAY,
+        rotate_cost: float = RETRY_ROTATE_COST,
+    ) -> None:
+        self.mode = mode if mode in ("learned", "fixed") else "fixed"
+        self._max_steps = max(1, max_steps)
+        self._budget = budget
+        self._explore = explore
+        self._decay = min(max(decay, 0.0), 1.0)
+        self._rotate_cost = max(0.0, rotate_cost)
+        self._lock = threading.Lock()
+        self._arms = {key: _Arm(p, cost) for key, (p, cost) in _PRIORS.items()}
+
+    def max_attempts(self) -> int:
+        return CAPTCHA_MAX_TRIES if self.mode == "fixed" else self._max_steps
+
+    def start(self) -> RetryRun:
+        return RetryRun()
+
+    def outcome(self, run: RetryRun, ok: bool) -> None:
+        if run.pending is None:
+            return
+        failure, action, decided_at = run.pending
+        run.pending = None
+        cost = time.monotonic() - decided_at
+        with self._lock:
+            arm = self._arms[(failure, action)]
+            arm.wins = arm.wins * self._decay + (1.0 if ok else 0.0)
+            arm.trials = arm.trials * self._decay + 1.0
+            arm.cost += (cost - arm.cost) * 0.2
+        METRICS.inc(f"retry.{failure}.{action}.{'ok' if ok else 'failed'}")
+
+    def decide(
+        self,
+        run: RetryRun,
+        failure: str,
+        options: Sequence[str],
+        remaining: Optional[float] = None,
+        proxy_errors: int = 0,
+    ) -> str:
+        # Called after each failed attempt; the previous decision (if any) failed too.
+        self.outcome(run, False)
+        if failure == PROXY_ERROR or failure == BLOCKED:
+            run.proxy_failures += 1
+        run.steps += 1
+        if self.mode == "fixed":
+            action = self._fixed(run, failure, options, proxy_errors)
+            expected = 0.0
+            explored = False
+        else:
+            action, expected, explored = self._learned(run, failure, options, remaining)
+        METRICS.inc(f"retry.{failure}.{action}")
+        _LOGGER.info(
+            "retry_decision: failure=%s action=%s expected=%.2f spent=%.2f step=%s explore=%s",
+            failure,
+            action,
+            expected,
+            time.monotonic() - run.started,
+            run.steps,
+            int(explored),
+        )
+        if action != GIVE_UP:
+            with self._lock:
+                self._arms[(failure, action)].taken += 1
+            run.pending = (failure, action, time.monotonic())
+        return action
+
+    def exhausted(self, run: RetryRun) -> bool:
+        # Checked after an action has been applied: the fixed policy still rotates on the
+        # last proxy failure and only then stops, as the retry loop always did.
+        return self.mode == "fixed" and run.proxy_failures >= max(3, CAPTCHA_MAX_TRIES * 2)
+
+    def _fixed(self, run: RetryRun, failure: str, options: Sequence[str], proxy_errors: int) -> str:
+        if failure in (PROXY_ERROR, BLOCKED):
+            if ROTATE not in options:
+                return GIVE_UP
+            # With PROXY_ROTATE_AFTER_ERRORS > 1 a connection error first retries the same proxy.
+            if failure == PROXY_ERROR and proxy_errors < PROXY_ROTATE_AFTER_ERRORS:
+                return REWARM
+            return ROTATE
+        return REFETCH
+
+    def _learned(
+        self, run: RetryRun, failure: str, options: Sequence[str], remaining: Optional[float]
+    ) -> Tuple[str, float, bool]:
+        if run.steps > self._max_steps:
+            return GIVE_UP, 0.0, False
+        left = self._budget - (time.monotonic() - run.started) if self._budget > 0 else None
+        if remaining is not None:
+            left = remaining if left is None else min(left, remaining)
+        with self._lock:
+            scored = []
+            for action in options:
+                arm = self._arms.get((failure, action))
+                if arm is not None:
+                    cost = arm.cost + (self._rotate_cost if action == ROTATE else 0.0)
+                    scored.append((cost / arm.p(), action))
+            if not scored:
+                return GIVE_UP, 0.0, False
+            scored.sort(key=lambda item: item[0])
+            expected, action = scored[0]
+            explored = False
+            if len(scored) > 1 and self._explore > 0 and random.random() < self._explore:
+                # Occasionally try a worse-looking action so its estimate stays current.
+                expected, action = random.choice(scored[1:])
+                explored = True
+            if left is not None and expected > left:
+                return GIVE_UP, expected, explored
+        return action, expected, explored
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            table: Dict[str, Any] = {}
+            for (failure, action), arm in self._arms.items():
+                cost = arm.cost + (self._rotate_cost if action == ROTATE else 0.0)
+                table.setdefault(failure, {})[action] = {
+                    "p": round(arm.p(), 3),
+                    "cost_s": round(cost, 3),
+                    "expected_s": round(cost / arm.p(), 3),
+                    "taken": arm.taken,
+                }
+            return {"mode": self.mode, "policy": table}
+
+
+RETRIES = RetryPolicy()
@@ -0,0 +1,59 @@
+import threading
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from .metrics import METRICS
+
+T = TypeVar("T")
+
+
+class FollowerTimeout(TimeoutError):
+    # The follower's own wait ran out; the leader keeps running.
+    pass
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self, name: str = "singleflight") -> None:
+        self._name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call[T]] = {}
+
+    def do(self, key: str, fn: Callable[[], T], timeout: Optional[float] = None) -> Tuple[T, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                METRICS.set_gauge(f"{self._name}.inflight", len(self._calls))
+        if not leader:
+            METRICS.inc(f"{self._name}.followers")
+            if not call.done.wait(timeout):
+                METRICS.inc(f"{self._name}.follower_timeouts")
+                raise FollowerTimeout(key)
+            if call.error is not None:
+                raise call.error
+            return call.result, True  # type: ignore[return-value]
+
+        METRICS.inc(f"{self._name}.leaders")
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                METRICS.set_gauge(f"{self._name}.inflight", len(self._calls))
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import STATE_SNAPSHOT_INTERVAL, STATE_SNAPSHOT_PATH, STATE_SNAPSHOT_WARM_TTL
+from .jsonfast import dumps, loads
+from .state import get_state
+
+_LOGGER = logging.getLogger(__name__)
+
+_VERSION = 1
+
+
+def snapshot_path(base: str = STATE_SNAPSHOT_PATH) -> Optional[Path]:
+    if not base:
+        return None
+    path = Path(base)
+    # Pre-forked workers each keep their own sessions, so each gets its own file.
+    worker = os.getenv("SPIDER_WORKER_SLOT", "0")
+    if worker != "0":
+        path = path.with_name(f"{path.stem}.{worker}{path.suffix}")
+    return path
+
+
+class StateSnapshot:
+    # Live proxies, quota counters and the result cache (memory state) plus per-slot
+    # session proxy, cookies and warm flag, written periodically and on shutdown.
+    def __init__(self, pool: Any, path: Optional[Path] = None, interval: float = STATE_SNAPSHOT_INTERVAL) -> None:
+        self._pool = pool
+        self._path = path if path is not None else snapshot_path()
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self) -> bool:
+        if self._path is None:
+            return False
+        data = {
+            "version": _VERSION,
+            "written_at": time.time(),
+            "state": get_state().export(),
+            "sessions": self._pool.export_sessions(),
+        }
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            # Session cookies are in here: owner-only, whatever the umask or a stale tmp file says.
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as handle:
+                os.chmod(tmp, 0o600)
+                handle.write(dumps(data))
+            os.replace(tmp, self._path)
+        except OSError as exc:
+            _LOGGER.warning("snapshot_write_error: path=%s err=%s", self._path, exc)
+            return False
+        return True
+
+    def restore(self) -> Dict[str, int]:
+        if self._path is None:
+            return {}
+        try:
+            data = loads(self._path.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            _LOGGER.warning("snapshot_read_error: path=%s err=%s", self._path, exc)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != _VERSION:
+            _LOGGER.warning("snapshot_skipped: path=%s reason=version", self._path)
+            return {}
+        age = time.time() - float(data.get("written_at") or 0)
+        proxies = get_state().restore(data.get("state") or {})
+        sessions = self._pool.restore_sessions(data.get("sessions") or {}, fresh=age <= STATE_SNAPSHOT_WARM_TTL)
+        _LOGGER.info("snapshot_restored: path=%s age=%.0fs proxies=%s sessions=%s", self._path, age, proxies, sessions)
+        return {"proxies": proxies, "sessions": sessions}
+
+    def start(self) -> None:
+        if self._path is None or self._interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="state-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10.0)
+        self.write()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.write()
+            except Exception as exc:
+                _LOGGER.warning("snapshot_error: %s", exc)
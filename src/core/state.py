@@ -0,0 +1,378 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+from .config import (
+    PROXY_REFRESH_BEFORE_SECONDS,
+    RESULT_CACHE_MAX,
+    SHARED_STATE,
+    SHARED_STATE_PATH,
+)
+from .jsonfast import dumps, loads
+
+_LOGGER = logging.getLogger(__name__)
+
+
+_MAX_RETIRED = 1024
+
+
+def quota_day() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+def proxy_key(info: Any) -> str:
+    return str(info.cookie_key or info.endpoint)
+
+
+def quota_key(info: Any) -> str:
+    return str(info.proxy_ip or info.server or info.endpoint)
+
+
+class MemoryState:
+    # Process-local state: pooled sessions in this process share proxies, other
+    # processes do not; cookies stay in data/cookies_*.json.
+    shared = False
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._proxy_lock = threading.Lock()
+        self._proxies: Dict[str, Any] = {}
+        self._retired: Dict[str, str] = {}
+        self._quota: Dict[Tuple[str, str], list[int]] = {}
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def acquire_proxy(
+        self,
+        fetch: Callable[[], Any],
+        usable: Callable[[Any], bool],
+        rank: Optional[Callable[[Any], float]] = None,
+    ) -> Any:
+        # Held across the fetch so concurrent sessions reuse one purchase instead of each buying.
+        with self._proxy_lock:
+            candidates = [
+                info
+                for key, info in self._proxies.items()
+                if key not in self._retired and usable(info) and not self.quota(quota_key(info))[1]
+            ]
+            if candidates:
+                return max(candidates, key=rank) if rank is not None else candidates[-1]
+            info = fetch()
+            self._proxies[proxy_key(info)] = info
+            now = time.time()
+            for key, old in list(self._proxies.items()):
+                if key in self._retired or (old.expires_at is not None and old.expires_at < now):
+                    self._proxies.pop(key)
+            while len(self._retired) > _MAX_RETIRED:
+                self._retired.pop(next(iter(self._retired)))
+            return info
+
+    def retire_proxy(self, info: Any, reason: str) -> None:
+        with self._proxy_lock:
+            self._retired[proxy_key(info)] = reason
+            self._proxies.pop(proxy_key(info), None)
+
+    def proxy_retired(self, info: Any) -> bool:
+        return proxy_key(info) in self._retired
+
+    def export(self) -> Dict[str, Any]:
+        from .proxy import export_proxy
+
+        now = time.time()
+        with self._proxy_lock:
+            proxies = [
+                export_proxy(info)
+                for key, info in self._proxies.items()
+                if key not in self._retired and (info.expires_at is None or info.expires_at > now)
+            ]
+            retired = dict(self._retired)
+        day = quota_day()
+        with self._lock:
+            quota = [[key, used, limited] for (key, when), (used, limited) in self._quota.items() if when == day]
+            cache = {key: [expires, value] for key, (expires, value) in self._cache.items() if expires > now}
+        return {"day": day, "proxies": proxies, "retired": retired, "quota": quota, "cache": cache}
+
+    def restore(self, data: Dict[str, Any]) -> int:
+        from .proxy import import_proxy
+
+        now = time.time()
+        restored = 0
+        with self._proxy_lock:
+            self._retired.update(data.get("retired") or {})
+            for raw in data.get("proxies") or []:
+                info = import_proxy(raw)
+                if info.expires_at is not None and info.expires_at - PROXY_REFRESH_BEFORE_SECONDS <= now:
+                    continue
+                if proxy_key(info) not in self._retired:
+                    self._proxies.setdefault(proxy_key(info), info)
+                    restored += 1
+        with self._lock:
+            if data.get("day") == quota_day():
+                for key, used, limited in data.get("quota") or []:
+                    entry = self._quota.setdefault((key, quota_day()), [0, 0])
+                    entry[0] = max(entry[0], int(used))
+                    entry[1] = max(entry[1], int(limited))
+            for key, (expires, value) in (data.get("cache") or {}).items():
+                if expires > now:
+                    self._cache.setdefault(key, (expires, value))
+        return restored
+
+    def record_use(self, key: str) -> int:
+        with self._lock:
+            entry = self._quota.setdefault((key, quota_day()), [0, 0])
+            entry[0] += 1
+            return entry[0]
+
+    def mark_limited(self, key: str) -> None:
+        with self._lock:
+            self._quota.setdefault((key, quota_day()), [0, 0])[1] = 1
+
+    def quota(self, key: str) -> Tuple[int, bool]:
+        with self._lock:
+            used, limited = self._quota.get((key, quota_day()), [0, 0])
+            return used, bool(limited)
+
+    def load_cookies(self, key: str) -> Optional[Dict[str, str]]:
+        return None
+
+    def save_cookies(self, key: str, cookies: Dict[str, str]) -> None:
+        return None
+
+    def cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._cache.pop(key, None)
+                return None
+            return entry[1]
+
+    def cache_set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        with self._lock:
+            if RESULT_CACHE_MAX > 0 and len(self._cache) >= RESULT_CACHE_MAX:
+                now = time.time()
+                for stale in [k for k, (expires, _) in self._cache.items() if expires < now]:
+                    self._cache.pop(stale, None)
+                while self._cache and len(self._cache) >= RESULT_CACHE_MAX:
+                    self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = (time.time() + ttl, value)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxies (
+    key TEXT PRIMARY KEY,
+    quota_key TEXT NOT NULL,
+    info TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL,
+    retired INTEGER NOT NULL DEFAULT 0,
+    retired_reason TEXT
+);
+CREATE TABLE IF NOT EXISTS quota (
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    used INTEGER NOT NULL DEFAULT 0,
+    limited INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, day)
+);
+CREATE TABLE IF NOT EXISTS cookies (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class _FileLock:
+    # Serializes proxy purchases across worker processes on one host.
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._thread_lock = threading.Lock()
+
+    def __enter__(self) -> "_FileLock":
+        self._thread_lock.acquire()
+        self._handle: IO[bytes] = open(self._path, "a+b")
+        try:
+            import fcntl
+
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        try:
+            try:
+                import fcntl
+
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            except ImportError:
+                import msvcrt
+
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._handle.close()
+            self._thread_lock.release()
+
+
+class SqliteState:
+    # Host-wide state shared by every worker process through one WAL-mode database.
+    shared = True
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._local = threading.local()
+        self._proxy_lock = _FileLock(path.with_name(path.name + ".lock"))
+        self._cache_sets = 0
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self._path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def acquire_proxy(
+        self,
+        fetch: Callable[[], Any],
+        usable: Callable[[Any], bool],
+        rank: Optional[Callable[[Any], float]] = None,
+    ) -> Any:
+        from .proxy import export_proxy, import_proxy
+
+        with self._proxy_lock:
+            conn = self._conn()
+            now = time.time()
+            rows = conn.execute(
+                "SELECT p.info FROM proxies p "
+                "LEFT JOIN quota q ON q.key = p.quota_key AND q.day = ? "
+                "WHERE p.retired = 0 AND (p.expires_at IS NULL OR p.expires_at > ?) "
+                "AND COALESCE(q.limited, 0) = 0 ORDER BY p.fetched_at DESC",
+                (quota_day(), now + PROXY_REFRESH_BEFORE_SECONDS),
+            ).fetchall()
+            # Rows hold no credentials; import_proxy() adds them from this process's config.
+            candidates = [info for info in (import_proxy(json.loads(raw)) for (raw,) in rows) if usable(info)]
+            if candidates:
+                return max(candidates, key=rank) if rank is not None else candidates[0]
+            info = fetch()
+            conn.execute(
+                "INSERT OR REPLACE INTO proxies (key, quota_key, info, fetched_at, expires_at, retired) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (proxy_key(info), quota_key(info), json.dumps(export_proxy(info)), info.fetched_at, info.expires_at),
+            )
+            conn.execute(
+                "DELETE FROM proxies WHERE (retired = 1 OR expires_at < ?) AND fetched_at < ?",
+                (now, now - 86400),
+            )
+            return info
+
+    def retire_proxy(self, info: Any, reason: str) -> None:
+        self._conn().execute(
+            "UPDATE proxies SET retired = 1, retired_reason = ? WHERE key = ?",
+            (reason, proxy_key(info)),
+        )
+
+    def proxy_retired(self, info: Any) -> bool:
+        row = self._conn().execute("SELECT retired FROM proxies WHERE key = ?", (proxy_key(info),)).fetchone()
+        return bool(row and row[0])
+
+    # Everything here already lives in the database, so snapshots carry nothing for it.
+    def export(self) -> Dict[str, Any]:
+        return {}
+
+    def restore(self, data: Dict[str, Any]) -> int:
+        return 0
+
+    def record_use(self, key: str) -> int:
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO quota (key, day, used) VALUES (?, ?, 1) "
+            "ON CONFLICT (key, day) DO UPDATE SET used = used + 1",
+            (key, quota_day()),
+        )
+        row = conn.execute("SELECT used FROM quota WHERE key = ? AND day = ?", (key, quota_day())).fetchone()
+        return int(row[0]) if row else 0
+
+    def mark_limited(self, key: str) -> None:
+        self._conn().execute(
+            "INSERT INTO quota (key, day, limited) VALUES (?, ?, 1) "
+            "ON CONFLICT (key, day) DO UPDATE SET limited = 1",
+            (key, quota_day()),
+        )
+
+    def quota(self, key: str) -> Tuple[int, bool]:
+        row = self._conn().execute(
+            "SELECT used, limited FROM quota WHERE key = ? AND day = ?",
+            (key, quota_day()),
+        ).fetchone()
+        if not row:
+            return 0, False
+        return int(row[0]), bool(row[1])
+
+    def load_cookies(self, key: str) -> Optional[Dict[str, str]]:
+        row = self._conn().execute("SELECT data FROM cookies WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_cookies(self, key: str, cookies: Dict[str, str]) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cookies (key, data, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(cookies, ensure_ascii=True), time.time()),
+        )
+
+    def cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at >= ?",
+            (key, time.time()),
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def cache_set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, dumps(value).decode("utf-8"), now + ttl),
+        )
+        self._cache_sets += 1
+        if RESULT_CACHE_MAX > 0 and self._cache_sets % 100 == 0:
+            conn.execute(
+                "DELETE FROM cache WHERE expires_at < ? OR key IN ("
+                "SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (now, RESULT_CACHE_MAX),
+            )
+
+
+_STATE: Optional[Any] = None
+_STATE_LOCK = threading.Lock()
+
+
+def get_state():
+    global _STATE
+    if _STATE is None:
+        with _STATE_LOCK:
+            if _STATE is None:
+                if SHARED_STATE == "sqlite":
+                    _STATE = SqliteState(Path(SHARED_STATE_PATH))
+                    _LOGGER.info("shared_state: backend=sqlite path=%s", SHARED_STATE_PATH)
+                else:
+                    _STATE = MemoryState()
+    return _STATE
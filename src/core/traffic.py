@@ -0,0 +1,203 @@
+import atexit
+import base64
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .config import TRAFFIC_ARCHIVE, TRAFFIC_MODE, TRAFFIC_REPLAY_SPEED
+
+_LOGGER = logging.getLogger(__name__)
+_KEPT_HEADERS = ("content-type",)
+
+
+def exchange_key(method: str, url: str) -> str:
+    # Query strings carry cache-busting timestamps and API keys, so exchanges
+    # are matched (and stored) by method + host + path only.
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+def _encode_body(content: bytes, content_type: str) -> Dict[str, str]:
+    if not content_type.startswith("image/"):
+        try:
+            return {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            pass
+    return {"b64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(record: Dict[str, Any]) -> bytes:
+    if "text" in record:
+        return record["text"].encode("utf-8")
+    return base64.b64decode(record.get("b64", ""))
+
+
+class TrafficRecorder:
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._handle: Optional[gzip.GzipFile] = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self._handle is None:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                # Appending starts a new gzip member; concatenated members stay readable.
+                self._handle = gzip.open(self._path, "ab")
+            self._handle.write(line)
+            self._handle.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+
+def iter_archive(path: Path) -> Iterator[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        while True:
+            try:
+                line = handle.readline()
+            except EOFError:
+                # A process killed while recording leaves the last member unterminated.
+                return
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, recorder: TrafficRecorder, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._recorder = recorder
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        content = response.content
+        elapsed = time.perf_counter() - started
+        content_type = response.headers.get("Content-Type", "")
+        headers = {
+            key: value for key, value in response.headers.items() if key.lower() in _KEPT_HEADERS
+        }
+        record = {
+            "key": exchange_key(request.method, request.url),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": headers,
+            "elapsed": round(elapsed, 4),
+            "ts": round(time.time(), 3),
+        }
+        record.update(_encode_body(content, content_type))
+        self._recorder.write(record)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, path: Path, speed: float = 1.0) -> None:
+        super().__init__()
+        self._speed = speed
+        self._lock = threading.Lock()
+        self._records: Dict[str, list[Dict[str, Any]]] = defaultdict(list)
+        for record in iter_archive(path):
+            self._records[record["key"]].append(record)
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = {}
+        _LOGGER.info(
+            "traffic_replay: archive=%s exchanges=%s keys=%s",
+            path,
+            sum(len(items) for items in self._records.values()),
+            len(self._records),
+        )
+
+    def _next(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                return None
+            queue = self._queues.get(key)
+            if not queue:
+                # Replay in recorded order and wrap around when exhausted.
+                queue = deque(records)
+                self._queues[key] = queue
+            return queue.popleft()
+
+    def send(self, request, **kwargs):
+        key = exchange_key(request.method, request.url)
+        record = self._next(key)
+        if record is None:
+            raise requests.exceptions.ConnectionError(f"traffic_replay_miss:{key}", request=request)
+        delay = float(record.get("elapsed") or 0.0)
+        if self._speed > 0 and delay > 0:
+            time.sleep(delay / self._speed)
+        response = requests.Response()
+        response.status_code = int(record.get("status") or 200)
+        response.reason = record.get("reason") or ""
+        response.headers = CaseInsensitiveDict(record.get("headers") or {})
+        response._content = _decode_body(record)
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.elapsed = timedelta(seconds=delay)
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        return None
+
+
+_RECORDER: Optional[TrafficRecorder] = None
+_REPLAY: Optional[ReplayAdapter] = None
+_STATE_LOCK = threading.Lock()
+
+
+def _recorder() -> TrafficRecorder:
+    global _RECORDER
+    with _STATE_LOCK:
+        if _RECORDER is None:
+            _RECORDER = TrafficRecorder(Path(TRAFFIC_ARCHIVE))
+            atexit.register(_RECORDER.close)
+            _LOGGER.info("traffic_record: archive=%s", TRAFFIC_ARCHIVE)
+        return _RECORDER
+
+
+def _replay() -> ReplayAdapter:
+    global _REPLAY
+    with _STATE_LOCK:
+        if _REPLAY is None:
+            _REPLAY = ReplayAdapter(Path(TRAFFIC_ARCHIVE), TRAFFIC_REPLAY_SPEED)
+        return _REPLAY
+
+
+def mount_traffic(session: requests.Session) -> None:
+    if TRAFFIC_MODE == "record":
+        adapter: BaseAdapter = RecordingAdapter(_recorder())
+    elif TRAFFIC_MODE == "replay":
+        adapter = _replay()
+    else:
+        return
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def close_traffic() -> None:
+    if _RECORDER is not None:
+        _RECORDER.close()
@@ -0,0 +1,154 @@
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+from .core.procmem import process_memory
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _pick(module: str, value: str) -> str:
+    try:
+        __import__(module)
+    except ImportError:
+        return "auto"
+    return value
+
+
+def _bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _format_mb(value: Optional[int]) -> str:
+    if value is None:
+        return "-"
+    return f"{value / (1024 * 1024):.1f}MB"
+
+
+class PreforkLauncher:
+    def __init__(self, host: str, port: int, workers: int, memory_report_every: float = 60.0) -> None:
+        self._host = host
+        self._port = port
+        self._workers = max(1, workers)
+        self._memory_report_every = memory_report_every
+        self._children: Dict[int, int] = {}
+        self._stopping = False
+
+    def run(self) -> None:
+        # Import the app and load the OCR weights before forking so every worker
+        # shares the model pages copy-on-write instead of loading its own copy.
+        from .core.ocr import warm_ocr
+        from .main import app
+
+        warm_ocr()
+        sock = _bind(self._host, self._port)
+        _LOGGER.info(
+            "launcher_start: pid=%s workers=%s bind=%s:%s parent=%s",
+            os.getpid(),
+            self._workers,
+            self._host,
+            self._port,
+            self._memory_line(os.getpid()),
+        )
+        for slot in range(self._workers):
+            self._spawn(slot, app, sock)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        last_report = time.time()
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                slot = self._children.pop(pid, None)
+                if slot is not None and not self._stopping:
+                    _LOGGER.warning("worker_exit: pid=%s status=%s, restarting slot=%s", pid, status, slot)
+                    self._spawn(slot, app, sock)
+                continue
+            now = time.time()
+            if self._memory_report_every and now - last_report >= self._memory_report_every:
+                last_report = now
+                self.report_memory()
+            time.sleep(0.5)
+        sock.close()
+        _LOGGER.info("launcher_stop")
+
+    def _spawn(self, slot: int, app, sock: socket.socket) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = slot
+            return
+        try:
+            os.environ["SPIDER_WORKER_SLOT"] = str(slot)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            config = uvicorn.Config(
+                app,
+                loop=_pick("uvloop", "uvloop"),
+                http=_pick("httptools", "httptools"),
+                lifespan="on",
+                access_log=False,
+            )
+            uvicorn.Server(config).run(sockets=[sock])
+        finally:
+            os._exit(0)
+
+    def _handle_stop(self, signum, frame) -> None:
+        if self._stopping:
+            return
+        self._stopping = True
+        _LOGGER.info("launcher_stopping: signal=%s", signum)
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self._children.pop(pid, None)
+
+    def _memory_line(self, pid: int) -> str:
+        mem = process_memory(pid)
+        return (
+            f"rss={_format_mb(mem.get('rss_bytes'))} pss={_format_mb(mem.get('pss_bytes'))} "
+            f"shared={_format_mb(mem.get('shared_bytes'))} private={_format_mb(mem.get('private_bytes'))}"
+        )
+
+    def report_memory(self) -> None:
+        _LOGGER.info("worker_memory: pid=%s role=parent %s", os.getpid(), self._memory_line(os.getpid()))
+        total_pss = process_memory(os.getpid()).get("pss_bytes", 0)
+        for pid, slot in sorted(self._children.items(), key=lambda item: item[1]):
+            _LOGGER.info("worker_memory: pid=%s slot=%s %s", pid, slot, self._memory_line(pid))
+            total_pss += process_memory(pid).get("pss_bytes", 0)
+        if total_pss:
+            _LOGGER.info("worker_memory_total: pss=%s", _format_mb(total_pss))
+
+
+def run_production(host: str, port: int, workers: int, memory_report_every: float = 60.0) -> None:
+    from .core.logging import setup_logging
+
+    setup_logging()
+    if not hasattr(os, "fork"):
+        # No fork (Windows): uvicorn spawns workers, so each one loads its own model.
+        _LOGGER.warning("launcher_no_fork: falling back to uvicorn workers without model sharing")
+        uvicorn.run(
+            "src.main:app",
+            host=host,
+            port=port,
+            workers=workers,
+            loop=_pick("uvloop", "uvloop"),
+            http=_pick("httptools", "httptools"),
+            access_log=False,
+        )
+        return
+    PreforkLauncher(host, port, workers, memory_report_every).run()
@@ -1,20 +1,88 @@
+import math
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
-from .core.logging import setup_logging
+from .core.admission import AdmissionRejected
+from .core.archive import close_archive
+from .core.breaker import CircuitOpenError
+from .core.config import JOB_DB, JOB_WORKERS, SPIDER_POOL_SIZE, STARTUP_WARM_SESSIONS, STARTUP_WARMUP
+from .core.dataset import close_dataset
+from .core.deadline import DeadlineExceeded
+from .core.jsonfast import FastJSONResponse
+from .core.logging import RequestIdMiddleware, setup_logging
+from .core.ocr import warm_ocr
+from .core.readiness import Readiness
+from .core.snapshot import StateSnapshot
+from .core.traffic import close_traffic
+from .routes.jobs import router as jobs_router
+from .routes.metrics import router as metrics_router
 from .routes.query import router as query_router
-from .services.spider import SpiderService
+from .services.jobs import JobRunner, JobStore
+from .services.keepalive import SessionKeeper
+from .services.pool import SpiderPool
 
 setup_logging()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.spider = SpiderService()
+    app.state.readiness = Readiness()
+    app.state.pool = SpiderPool(SPIDER_POOL_SIZE)
+    # Resume proxies, quota and warm sessions from the last run before anything buys or warms.
+    app.state.snapshot = StateSnapshot(app.state.pool)
+    app.state.snapshot.restore()
+    app.state.snapshot.start()
+    app.state.job_store = JobStore(JOB_DB)
+    app.state.job_runner = JobRunner(app.state.job_store, app.state.pool, JOB_WORKERS)
+    app.state.job_runner.start()
+    app.state.keeper = SessionKeeper(app.state.pool)
+    app.state.keeper.start()
+    if STARTUP_WARMUP:
+        # Model load and proxy/session setup run off the event loop so the app
+        # accepts connections immediately; /health/ready reports when they finish.
+        steps = [("ocr", warm_ocr)]
+        app.state.readiness.register("ocr")
+        if STARTUP_WARM_SESSIONS:
+            steps.append(("sessions", app.state.pool.warm))
+            app.state.readiness.register("sessions", required=False)
+        app.state.readiness.start_background(steps)
     yield
-    app.state.spider.close()
+    app.state.keeper.stop()
+    app.state.job_runner.stop()
+    app.state.snapshot.stop()
+    app.state.job_store.close()
+    app.state.pool.close()
+    close_traffic()
+    close_archive()
+    close_dataset()
 
 
-app = FastAPI(title="captcha-spider", lifespan=lifespan)
+app = FastAPI(title="captcha-spider", lifespan=lifespan, default_response_class=FastJSONResponse)
 app.include_router(query_router)
+app.include_router(jobs_router)
+app.include_router(metrics_router)
+app.add_middleware(RequestIdMiddleware)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open(request: Request, exc: CircuitOpenError) -> FastJSONResponse:
+    return FastJSONResponse(
+        {"detail": exc.error},
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded) -> FastJSONResponse:
+    return FastJSONResponse({"detail": exc.error, "stage": exc.stage}, status_code=504)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected) -> FastJSONResponse:
+    return FastJSONResponse(
+        {"detail": exc.error},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
@@ -0,0 +1,204 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import requests
+
+
+@dataclass
+class Sample:
+    ok: bool
+    latency: float
+    attempts: int
+    error: Optional[str]
+
+
+@dataclass
+class LoadReport:
+    started_at: float
+    finished_at: float = 0.0
+    samples: list[Sample] = field(default_factory=list)
+
+    def add(self, sample: Sample) -> None:
+        self.samples.append(sample)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = max(self.finished_at - self.started_at, 1e-9)
+        latencies = sorted(sample.latency for sample in self.samples)
+        ok = sum(1 for sample in self.samples if sample.ok)
+        attempts = [sample.attempts for sample in self.samples]
+        errors = Counter(sample.error for sample in self.samples if not sample.ok)
+        return {
+            "queries": len(self.samples),
+            "ok": ok,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_qps": round(len(self.samples) / elapsed, 3),
+            "ok_qps": round(ok / elapsed, 3),
+            "latency_ms": {
+                "p50": _percentile_ms(latencies, 50),
+                "p90": _percentile_ms(latencies, 90),
+                "p95": _percentile_ms(latencies, 95),
+                "p99": _percentile_ms(latencies, 99),
+                "max": _percentile_ms(latencies, 100),
+            },
+            "attempts_per_query": round(sum(attempts) / len(attempts), 3) if attempts else 0.0,
+            "errors": dict(errors),
+        }
+
+
+def _percentile_ms(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return round(sorted_values[idx] * 1000.0, 1)
+
+
+def _phones(count: int, source: Optional[str], seed: Optional[int]) -> Iterator[str]:
+    if source:
+        with open(source, "r", encoding="utf-8") as handle:
+            emitted = 0
+            for line in handle:
+                phone = line.strip()
+                if not phone:
+                    continue
+                yield phone
+                emitted += 1
+                if count and emitted >= count:
+                    return
+        return
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "1" + rng.choice("3456789") + "".join(rng.choice("0123456789") for _ in range(9))
+
+
+def _http_runner(base_url: str, timeout: float) -> Callable[[str], Sample]:
+    local = threading.local()
+
+    def run(phone: str) -> Sample:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.trust_env = False
+            local.session = session
+        started = time.perf_counter()
+        try:
+            resp = session.get(f"{base_url.rstrip('/')}/query", params={"phone": phone}, timeout=timeout)
+        except requests.RequestException as exc:
+            return Sample(False, time.perf_counter() - started, 0, type(exc).__name__)
+        latency = time.perf_counter() - started
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+        ok = resp.ok and bool(body.get("ok"))
+        error = None if ok else str(body.get("error") or body.get("detail") or f"http_{resp.status_code}")
+        return Sample(ok, latency, int(body.get("attempts") or 0), error)
+
+    return run
+
+
+def _inprocess_runner() -> Callable[[str], Sample]:
+    from ..services.spider import SpiderService
+
+    local = threading.local()
+    spiders = []
+    lock = threading.Lock()
+
+    def run(phone: str) -> Sample:
+        started = time.perf_counter()
+        try:
+            spider = getattr(local, "spider", None)
+            if spider is None:
+                spider = SpiderService()
+                local.spider = spider
+                with lock:
+                    spiders.append(spider)
+            result = spider.query(phone)
+        except Exception as exc:
+            return Sample(False, time.perf_counter() - started, 0, type(exc).__name__)
+        return Sample(result.ok, time.perf_counter() - started, result.attempts, result.error)
+
+    run.spiders = spiders  # type: ignore[attr-defined]
+    return run
+
+
+def run_load(
+    runner: Callable[[str], Sample],
+    phones: Iterator[str],
+    concurrency: int,
+    progress_every: float = 5.0,
+) -> LoadReport:
+    report = LoadReport(started_at=time.perf_counter())
+    lock = threading.Lock()
+    last_progress = [report.started_at]
+
+    def task(phone: str) -> None:
+        sample = runner(phone)
+        with lock:
+            report.add(sample)
+            now = time.perf_counter()
+            if progress_every and now - last_progress[0] >= progress_every:
+                last_progress[0] = now
+                done = len(report.samples)
+                print(f"progress: done={done} qps={done / (now - report.started_at):.2f}", flush=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Bound the number of queued phones so large inputs stay streaming.
+        pending = threading.BoundedSemaphore(max(1, concurrency) * 2)
+        for phone in phones:
+            pending.acquire()
+            future = pool.submit(task, phone)
+            future.add_done_callback(lambda _: pending.release())
+    report.finished_at = time.perf_counter()
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Drive load against the spider service and report latency.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="service base URL (HTTP mode)")
+    parser.add_argument("--inprocess", action="store_true", help="drive SpiderService directly instead of HTTP")
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--phones", default=None, help="file with one phone per line")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    if args.inprocess:
+        from ..core.logging import setup_logging
+
+        setup_logging()
+        runner = _inprocess_runner()
+    else:
+        runner = _http_runner(args.url, args.timeout)
+    report = run_load(runner, _phones(args.count, args.phones, args.seed), args.concurrency)
+    for spider in getattr(runner, "spiders", []):
+        spider.close()
+
+    summary = report.summary()
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False))
+        return
+    latency = summary["latency_ms"]
+    print(
+        f"queries={summary['queries']} ok={summary['ok']} elapsed={summary['elapsed_s']}s "
+        f"throughput={summary['throughput_qps']}qps ok_rate={summary['ok_qps']}qps"
+    )
+    print(
+        f"latency_ms p50={latency['p50']} p90={latency['p90']} p95={latency['p95']} "
+        f"p99={latency['p99']} max={latency['max']}"
+    )
+    print(f"attempts_per_query={summary['attempts_per_query']} errors={summary['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import copy
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+
+from ..services.marks import MarkSummarizer
+from .upstream import _mark_payload
+
+
+def _payloads(count: int, seed: int) -> list[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [_mark_payload(f"138{index:08d}", rng) for index in range(count)]
+
+
+def _run(summarizer: MarkSummarizer, payloads: list[Dict[str, Any]], repeat: int) -> float:
+    # Copies are made up front: apply() rewrites the summary text in place.
+    batches = [[{"data": copy.deepcopy(payload), "text": None} for payload in payloads] for _ in range(repeat)]
+    started = time.perf_counter()
+    for batch in batches:
+        for parsed in batch:
+            summarizer.apply(parsed)
+    return time.perf_counter() - started
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmark the mark-summary extractor on mock payloads.")
+    parser.add_argument("-n", "--payloads", type=int, default=500)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    payloads = _payloads(args.payloads, args.seed)
+    calls = args.payloads * args.repeat
+    results = {}
+    for mode, cache_size in (("scan", 0), ("cached", 256)):
+        elapsed = _run(MarkSummarizer(cache_size=cache_size), payloads, args.repeat)
+        results[mode] = round(elapsed / calls * 1e6, 2)
+    summary = {"payloads": args.payloads, "calls": calls, "us_per_response": results}
+    if args.json:
+        print(json.dumps(summary))
+        return
+    for mode, value in results.items():
+        print(f"{mode:7s} {value:8.2f} us/response over {calls} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BASELINE = Path(__file__).with_name("microbench_baseline.json")
+
+# make(number) builds the inputs for `number` calls up front and returns the timed loop,
+# so per-call setup (payload copies, fresh sessions) never lands inside the measurement.
+Case = Tuple[str, int, Callable[[int], Callable[[], None]]]
+
+
+def _captchas(seed: int) -> Dict[str, bytes]:
+    from .upstream import render_captcha
+
+    rng = random.Random(seed)
+    return {
+        "still": render_captcha("k7m2", fmt="png", rng=rng),
+        "animated": render_captcha("k7m2", fmt="gif", frames=3, rng=rng),
+    }
+
+
+def _repeat(fn: Callable[..., Any], *args: Any) -> Callable[[int], Callable[[], None]]:
+    def make(number: int) -> Callable[[], None]:
+        loop = range(number)
+
+        def run() -> None:
+            for _ in loop:
+                fn(*args)
+
+        return run
+
+    return make
+
+
+def _ocr_cases(seed: int) -> List[Case]:
+    from ..core import ocr
+    from ..core.config import OCR_THRESHOLD
+
+    cases: List[Case] = []
+    for kind, image in _captchas(seed).items():
+        cases.append((f"ocr.preprocess.{kind}", 50, _repeat(ocr.preprocess, image, OCR_THRESHOLD)))
+        cases.append((f"ocr.extract_variants.{kind}", 20, _repeat(ocr._extract_variants, image)))
+        cases.append((f"ocr.read_captcha_text.{kind}", 3, _repeat(ocr.read_captcha_text, image)))
+    cases.append(("ocr.normalize_text", 5000, _repeat(ocr.normalize_text, " K7-m2 \n")))
+    cases.append(("ocr.is_valid", 5000, _repeat(ocr.is_valid, "k7m2")))
+    return cases
+
+
+_PROXY_SHAPES: Dict[str, Any] = {
+    "data_ips": {
+        "code": "SUCCESS",
+        "data": {
+            "task_id": "t1",
+            "ips": [{"server": "10.0.0.1:8080", "proxy_ip": "1.2.3.4", "deadline": "2030-01-01 00:00:00"}],
+        },
+    },
+    "data_list": {
+        "code": "SUCCESS",
+        "data": [{"server": "10.0.0.1:8080", "proxy_ip": "1.2.3.4", "task_id": "t1", "deadline": "2030-01-01 00:00:00"}],
+    },
+    "data_list_ips": {
+        "code": "SUCCESS",
+        "data": [{"task_id": "t1", "ips": [{"server": "10.0.0.1:8080", "proxy_ip": "1.2.3.4"}]}],
+    },
+    "data_tasks": {
+        "code": "SUCCESS",
+        "data": {"tasks": [{"task_id": "t1", "ips": [{"server": "10.0.0.1:8080", "proxy_ip": "1.2.3.4"}]}]},
+    },
+    "error_code": {"code": "NO_BALANCE", "message": "insufficient balance"},
+}
+
+
+def _proxy_cases() -> List[Case]:
+    from ..core.proxy import ProxyManager
+
+    manager = ProxyManager()
+    cases: List[Case] = []
+    for shape, body in _PROXY_SHAPES.items():
+        cases.append((f"proxy.parse_endpoint.{shape}", 2000, _repeat(manager._parse_endpoint, json.dumps(body))))
+    cases.append(("proxy.parse_endpoint.regex", 2000, _repeat(manager._parse_endpoint, "ok 10.0.0.1:8080\r\n")))
+    return cases
+
+
+def _mark_cases(seed: int) -> List[Case]:
+    from ..services.marks import MarkSummarizer
+    from .upstream import _mark_payload
+
+    rng = random.Random(seed)
+    small = _mark_payload("13800000000", rng)
+    large = _mark_payload("13800000001", rng)
+    items = large["data"]["list"]
+    large["data"]["list"] = [dict(items[index % len(items)], platform=f"p{index}") for index in range(200)]
+    cases: List[Case] = []
+    for size, payload in (("small", small), ("large", large)):
+
+        def make(number: int, payload: Dict[str, Any] = payload) -> Callable[[], None]:
+            # apply() rewrites the summary in place, so every call gets its own copy.
+            summarizer = MarkSummarizer()
+            batch = [{"data": copy.deepcopy(payload), "text": None} for _ in range(number)]
+
+            def run() -> None:
+                for parsed in batch:
+                    summarizer.apply(parsed)
+
+            return run
+
+        cases.append((f"marks.apply.{size}", 200 if size == "small" else 20, make))
+    return cases
+
+
+def _cookie_cases() -> List[Case]:
+    import requests
+
+    from ..core.http import load_cookies, save_cookies
+
+    session = requests.Session()
+    for index in range(8):
+        session.cookies.set(f"cookie{index}", f"value{index}" * 4, domain="example.test", path="/")
+    target = requests.Session()
+    save_cookies(session, "bench#0")
+    return [
+        ("http.save_cookies", 200, _repeat(save_cookies, session, "bench#0")),
+        ("http.load_cookies", 200, _repeat(load_cookies, target, "bench#0")),
+    ]
+
+
+def _cases(seed: int, only: Optional[str]) -> List[Case]:
+    cases = _ocr_cases(seed) + _proxy_cases() + _mark_cases(seed) + _cookie_cases()
+    if only:
+        cases = [case for case in cases if case[0].startswith(only)]
+    return cases
+
+
+def _measure(make: Callable[[int], Callable[[], None]], number: int, repeat: int, min_time: float) -> float:
+    # Calls per run grow until one run takes at least `min_time` (like timeit's autorange);
+    # the best of `repeat` runs, in microseconds per call, is the least noisy estimate.
+    while True:
+        run = make(number)
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+    best = elapsed
+    for _ in range(repeat - 1):
+        run = make(number)
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e6
+
+
+def _compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:40s} {value:12.2f} us  (new)")
+            continue
+        ratio = value / base
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1.0 / threshold:
+            flag = "  faster"
+        print(f"{name:40s} {value:12.2f} us  base {base:10.2f}  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmark hot functions against a committed baseline.")
+    parser.add_argument("-r", "--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per timed run")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--only", help="run only cases whose name starts with this prefix")
+    parser.add_argument("--save", nargs="?", const=str(BASELINE), help="write results as the new baseline")
+    parser.add_argument("--compare", nargs="?", const=str(BASELINE), help="compare against a baseline file")
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown ratio reported as a regression")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    # Cookie files and any sqlite state go to a scratch directory, not ./data.
+    os.environ["COOKIE_PERSIST"] = "true"
+    workdir = tempfile.mkdtemp(prefix="microbench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = {
+            name: round(_measure(make, number, max(1, args.repeat), args.min_time), 3)
+            for name, number, make in _cases(args.seed, args.only)
+        }
+    finally:
+        os.chdir(cwd)
+
+    if args.save:
+        data = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "unit": "us_per_call",
+            "results": results,
+        }
+        Path(args.save).write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.json:
+        print(json.dumps(results))
+    elif not args.compare:
+        for name, value in results.items():
+            print(f"{name:40s} {value:12.2f} us/call")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = _compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over x{args.threshold}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ..core.config import QUERY_METHOD, QUERY_URL, TRAFFIC_ARCHIVE
+from ..core.traffic import _decode_body, exchange_key, iter_archive
+
+
+def _load_responses(path: Path, key: str) -> list[requests.Response]:
+    responses = []
+    for record in iter_archive(path):
+        if record.get("key") != key:
+            continue
+        response = requests.Response()
+        response.status_code = int(record.get("status") or 200)
+        response.headers = CaseInsensitiveDict(record.get("headers") or {})
+        response._content = _decode_body(record)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        responses.append(response)
+    return responses
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark response parsing on recorded upstream traffic.")
+    parser.add_argument("archive", nargs="?", default=TRAFFIC_ARCHIVE)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    from ..services.spider import SpiderService
+
+    path = Path(args.archive)
+    keys = Counter(record.get("key") for record in iter_archive(path))
+    responses = _load_responses(path, exchange_key(QUERY_METHOD, QUERY_URL))
+    if not responses:
+        raise SystemExit(f"no query exchanges in {path}; keys={dict(keys)}")
+
+    spider = SpiderService()
+    try:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for response in responses:
+                parsed = spider._parse_response(response)
+                spider._apply_mark_summary(parsed)
+        elapsed = time.perf_counter() - started
+    finally:
+        spider.close()
+
+    calls = args.repeat * len(responses)
+    summary = {
+        "archive": str(path),
+        "exchanges": dict(keys),
+        "responses": len(responses),
+        "calls": calls,
+        "us_per_response": round(elapsed / calls * 1e6, 2),
+    }
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False))
+        return
+    for key, count in sorted(summary["exchanges"].items()):
+        print(f"{count:6d}  {key}")
+    print(f"parse+mark_summary: {summary['us_per_response']} us/response over {calls} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import io
+import random
+import string
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
+from PIL import Image, ImageDraw, ImageFont
+
+from ..core.config import CAPTCHA_FIELD, CAPTCHA_URL, CODE_FIELD, INDEX_URL, QUERY_URL
+
+
+SESSION_COOKIE = "MOCKSESSIONID"
+SUMMARY_TEXT = "基于平台标记与次数综合判断"
+CAPTCHA_ERROR_MSG = "验证码错误"
+LIMIT_MSG = "当天查询次数已达上限"
+PLATFORMS = ["360", "baidu", "sogou", "tencent", "xiaomi", "huawei"]
+MARK_NAMES = [
+    "骚扰电话",
+    "广告推销",
+    "房产中介",
+    "诈骗电话",
+]
+
+
+@dataclass
+class MockSettings:
+    latency_ms: float = 50.0
+    latency_jitter_ms: float = 20.0
+    captcha_format: str = "gif"
+    captcha_len: int = 4
+    captcha_frames: int = 3
+    strict_captcha: bool = True
+    reject_rate: float = 0.0
+    limit_rate: float = 0.0
+    limit_after: int = 0
+    no_channel_rate: float = 0.0
+    proxy_server: str = "127.0.0.1:9000"
+    proxy_ttl_seconds: int = 300
+    seed: Optional[int] = None
+
+
+@dataclass
+class _SessionState:
+    answer: Optional[str] = None
+    queries: int = 0
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class MockStats:
+    index: int = 0
+    captcha: int = 0
+    query: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    limited: int = 0
+    proxy_api: int = 0
+    proxy_release: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+def _path_of(url: str) -> str:
+    return urlparse(url).path or "/"
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    alphabet = string.ascii_lowercase + string.digits
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def render_captcha(text: str, fmt: str = "gif", frames: int = 3, rng: Optional[random.Random] = None) -> bytes:
+    rng = rng or random.Random()
+    font = ImageFont.load_default(size=30)
+    width, height = 26 * max(len(text), 1) + 20, 44
+
+    def _frame(noise: int) -> Image.Image:
+        img = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(img)
+        for idx, ch in enumerate(text):
+            draw.text((10 + idx * 26, 4 + rng.randint(-2, 2)), ch, fill=0, font=font)
+        for _ in range(noise):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.point((x, y), fill=rng.randint(120, 220))
+        return img
+
+    buffer = io.BytesIO()
+    if fmt == "gif" and frames > 1:
+        images = [_frame(60) for _ in range(frames)]
+        images[0].save(
+            buffer,
+            format="GIF",
+            save_all=True,
+            append_images=images[1:],
+            duration=100,
+            loop=0,
+        )
+    else:
+        _frame(60).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _mark_payload(code: str, rng: random.Random) -> Dict[str, Any]:
+    items = []
+    for platform in rng.sample(PLATFORMS, rng.randint(1, len(PLATFORMS))):
+        count = rng.choice([0, 0, 1, 3, 12, 57])
+        items.append(
+            {
+                "platform": platform,
+                "markName": rng.choice(MARK_NAMES) if count else "",
+                "markCount": count,
+            }
+        )
+    return {
+        "status": 0,
+        "msg": "查询成功",
+        "data": {
+            "code": code,
+            "desc": SUMMARY_TEXT,
+            "list": items,
+        },
+    }
+
+
+class _AbsoluteFormMiddleware:
+    # Forward-proxy clients send absolute-form targets ("GET http://host/path");
+    # strip the authority so the mock can double as its own HTTP proxy.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope.get("path", "")
+            if path.startswith("http://") or path.startswith("https://"):
+                parsed = urlparse(path)
+                scope = dict(scope)
+                scope["path"] = parsed.path or "/"
+                scope["raw_path"] = scope["path"].encode("utf-8")
+        await self.app(scope, receive, send)
+
+
+def create_app(settings: Optional[MockSettings] = None) -> FastAPI:
+    settings = settings or MockSettings()
+    rng = random.Random(settings.seed)
+    sessions: Dict[str, _SessionState] = {}
+    stats = MockStats()
+    app = FastAPI(title="mock-upstream")
+    app.state.settings = settings
+    app.state.stats = stats
+
+    async def _delay() -> None:
+        base = settings.latency_ms
+        jitter = settings.latency_jitter_ms
+        delay = base + (rng.uniform(-jitter, jitter) if jitter > 0 else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+    def _session(request: Request) -> Tuple[str, _SessionState, bool]:
+        sid = request.cookies.get(SESSION_COOKIE)
+        if sid and sid in sessions:
+            return sid, sessions[sid], False
+        sid = uuid.uuid4().hex
+        sessions[sid] = _SessionState()
+        return sid, sessions[sid], True
+
+    def _bind(response: Response, sid: str, new: bool) -> Response:
+        if new:
+            response.set_cookie(SESSION_COOKIE, sid)
+        return response
+
+    @app.get(_path_of(INDEX_URL))
+    async def index(request: Request) -> Response:
+        await _delay()
+        stats.index += 1
+        sid, _, new = _session(request)
+        return _bind(HTMLResponse("<html><body>mock index</body></html>"), sid, new)
+
+    @app.get(_path_of(CAPTCHA_URL))
+    async def captcha(request: Request) -> Response:
+        await _delay()
+        stats.captcha += 1
+        text = _random_text(rng, settings.captcha_len)
+        body = render_captcha(text, settings.captcha_format, settings.captcha_frames, rng)
+        media_type = "image/gif" if settings.captcha_format == "gif" else "image/png"
+        response = Response(content=body, media_type=media_type)
+        response.headers["X-Mock-Captcha"] = text
+        sid, state, new = _session(request)
+        state.answer = text
+        return _bind(response, sid, new)
+
+    @app.api_route(_path_of(QUERY_URL), methods=["GET", "POST"])
+    async def query(request: Request) -> Response:
+        await _delay()
+        stats.query += 1
+        if request.method == "GET":
+            fields: Dict[str, Any] = dict(request.query_params)
+        elif "json" in request.headers.get("content-type", ""):
+            fields = await request.json()
+        else:
+            fields = dict(parse_qsl((await request.body()).decode("utf-8")))
+        sid, state, new = _session(request)
+        submitted = str(fields.get(CAPTCHA_FIELD) or "").lower()
+        answer = state.answer
+        state.answer = None
+        if settings.strict_captcha and (not answer or submitted != answer):
+            stats.rejected += 1
+            body: Dict[str, Any] = {"status": 1, "msg": CAPTCHA_ERROR_MSG}
+        elif settings.reject_rate > 0 and rng.random() < settings.reject_rate:
+            stats.rejected += 1
+            body = {"status": 1, "msg": CAPTCHA_ERROR_MSG}
+        elif (settings.limit_after > 0 and state.queries >= settings.limit_after) or (
+            settings.limit_rate > 0 and rng.random() < settings.limit_rate
+        ):
+            stats.limited += 1
+            body = {"status": 1, "msg": LIMIT_MSG}
+        else:
+            state.queries += 1
+            stats.accepted += 1
+            body = _mark_payload(str(fields.get(CODE_FIELD) or ""), rng)
+        return _bind(JSONResponse(body), sid, new)
+
+    def _proxy_body() -> Dict[str, Any]:
+        deadline = time.strftime(
+            "%Y-%m-%d %H:%M:%S",
+            time.localtime(time.time() + settings.proxy_ttl_seconds),
+        )
+        return {
+            "code": "SUCCESS",
+            "data": {
+                "task_id": uuid.uuid4().hex[:12],
+                "ips": [
+                    {
+                        "server": settings.proxy_server,
+                        "proxy_ip": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                        "deadline": deadline,
+                    }
+                ],
+            },
+        }
+
+    @app.get("/proxy/get")
+    async def proxy_get() -> JSONResponse:
+        await _delay()
+        stats.proxy_api += 1
+        if settings.no_channel_rate > 0 and rng.random() < settings.no_channel_rate:
+            return JSONResponse({"code": "NO_AVAILABLE_CHANNEL", "message": "no channel"})
+        return JSONResponse(_proxy_body())
+
+    @app.get("/proxy/active")
+    async def proxy_active() -> JSONResponse:
+        await _delay()
+        stats.proxy_api += 1
+        return JSONResponse(_proxy_body())
+
+    @app.get("/proxy/release")
+    async def proxy_release() -> JSONResponse:
+        stats.proxy_release += 1
+        return JSONResponse({"code": "SUCCESS"})
+
+    @app.get("/mock/stats")
+    async def mock_stats() -> JSONResponse:
+        return JSONResponse(stats.to_dict())
+
+    @app.get("/mock/ip")
+    async def mock_ip(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(request.client.host if request.client else "")
+
+    app.add_middleware(_AbsoluteFormMiddleware)
+    return app
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the query upstream and proxy API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--captcha-format", choices=["gif", "png"], default="gif")
+    parser.add_argument("--captcha-len", type=int, default=4)
+    parser.add_argument("--captcha-frames", type=int, default=3)
+    parser.add_argument("--lenient-captcha", action="store_true", help="accept any captcha text")
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--limit-rate", type=float, default=0.0)
+    parser.add_argument("--limit-after", type=int, default=0, help="daily-limit message after N queries per session")
+    parser.add_argument("--no-channel-rate", type=float, default=0.0)
+    parser.add_argument("--proxy-server", default=None, help="server returned by the proxy API (default host:port)")
+    parser.add_argument("--proxy-ttl", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        captcha_format=args.captcha_format,
+        captcha_len=args.captcha_len,
+        captcha_frames=args.captcha_frames,
+        strict_captcha=not args.lenient_captcha,
+        reject_rate=args.reject_rate,
+        limit_rate=args.limit_rate,
+        limit_after=args.limit_after,
+        no_channel_rate=args.no_channel_rate,
+        proxy_server=args.proxy_server or f"{args.host}:{args.port}",
+        proxy_ttl_seconds=args.proxy_ttl,
+        seed=args.seed,
+    )
+    import uvicorn
+
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile
+
+from ..core.config import JOB_MAX_ITEMS
+from ..core.jsonfast import dumps_line, loads
+from ..schemas.jobs import JobCreateRequest, JobItemResponse, JobResultsResponse, JobStatusResponse
+from ..services.jobs import parse_phone_csv
+
+
+router = APIRouter()
+
+
+_TEXT_TYPES = ("text/csv", "text/plain")
+
+
+async def _uploaded_phones(request: Request) -> list[str]:
+    try:
+        form = await request.form()
+    except AssertionError:
+        # Starlette parses multipart only when python-multipart is installed.
+        raise HTTPException(status_code=415, detail="multipart_unsupported")
+    upload = form.get("file")
+    if not isinstance(upload, UploadFile):
+        raise HTTPException(status_code=400, detail="file_required")
+    data = await upload.read()
+    await form.close()
+    return parse_phone_csv(data.decode("utf-8-sig", errors="replace"))
+
+
+@router.post("/jobs", response_model=JobStatusResponse, status_code=202)
+async def create_job(request: Request) -> JobStatusResponse:
+    media_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type == "application/json":
+        try:
+            payload = JobCreateRequest(**loads(await request.body() or b"{}"))
+        except (ValueError, ValidationError):
+            raise HTTPException(status_code=400, detail="phones_required")
+        phones = [phone.strip() for phone in payload.phones if phone and phone.strip()]
+    elif media_type in _TEXT_TYPES:
+        phones = parse_phone_csv((await request.body()).decode("utf-8-sig", errors="replace"))
+    elif media_type == "multipart/form-data":
+        phones = await _uploaded_phones(request)
+    else:
+        raise HTTPException(status_code=415, detail="unsupported_content_type")
+    if not phones:
+        raise HTTPException(status_code=400, detail="phones_required")
+    if JOB_MAX_ITEMS > 0 and len(phones) > JOB_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail="too_many_phones")
+    store = request.app.state.job_store
+    job = await run_in_threadpool(store.create, phones)
+    request.app.state.job_runner.notify()
+    return JobStatusResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def job_status(request: Request, job_id: str) -> JobStatusResponse:
+    job = request.app.state.job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    return JobStatusResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}/results", response_model=JobResultsResponse)
+def job_results(
+    request: Request,
+    job_id: str,
+    offset: int = 0,
+    limit: int = 100,
+    stream: bool = False,
+):
+    store = request.app.state.job_store
+    if store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    if stream:
+        def lines() -> Iterator[bytes]:
+            for item in store.iter_results(job_id):
+                yield dumps_line(item.to_dict())
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    limit = max(1, min(limit, 1000))
+    items = store.results(job_id, max(0, offset), limit)
+    next_offset: Optional[int] = items[-1].seq + 1 if len(items) == limit else None
+    return JobResultsResponse(
+        id=job_id,
+        items=[JobItemResponse(**item.to_dict()) for item in items],
+        next_offset=next_offset,
+    )
@@ -0,0 +1,29 @@
+import os
+
+from fastapi import APIRouter, Request
+
+from ..core.admission import ADMISSION
+from ..core.breaker import breakers_snapshot
+from ..core.limiter import LIMITS
+from ..core.metrics import METRICS
+from ..core.procmem import process_memory
+from ..core.proxystats import PROXY_STATS
+from ..core.retry import RETRIES
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics(request: Request) -> dict:
+    snapshot = METRICS.snapshot()
+    snapshot["limits"] = LIMITS.snapshot()
+    snapshot["breakers"] = breakers_snapshot()
+    snapshot["admission"] = ADMISSION.snapshot()
+    snapshot["lanes"] = request.app.state.pool.lanes()
+    snapshot["proxies"] = PROXY_STATS.snapshot()
+    snapshot["retry"] = RETRIES.snapshot()
+    store = request.app.state.job_store
+    snapshot["jobs"] = {"node": store.node_id, "nodes": store.nodes()}
+    snapshot["process"] = {"pid": os.getpid(), **process_memory()}
+    return snapshot
@@ -2,29 +2,77 @@ import base64
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
+from ..core.admission import ADMISSION
+from ..core.config import QUERY_FAST_RESPONSE
+from ..core.deadline import Deadline
+from ..core.jsonfast import FastJSONResponse
+from ..core.lanes import parse_lane
 from ..schemas.query import CaptchaResponse, QueryRequest, QueryResponse
 
 
 router = APIRouter()
 
 
-def _run_query(spider, code: str, captcha: Optional[str]) -> QueryResponse:
-    result = spider.query(code, captcha=captcha)
+def _deadline(request: Request, deadline_ms: Optional[int]) -> Deadline:
+    # `deadline_ms` (query param) or `X-Deadline-Ms` bounds the whole query, capped at QUERY_DEADLINE_MAX_MS.
+    value = deadline_ms
+    if value is None:
+        header = request.headers.get("x-deadline-ms")
+        if header is None:
+            return Deadline.default()
+        try:
+            value = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="deadline_ms_invalid") from None
+    if value <= 0:
+        raise HTTPException(status_code=400, detail="deadline_ms_invalid")
+    return Deadline.after_ms(value)
+
+
+def _lane(request: Request, lane: Optional[str]) -> str:
+    # `lane` (param or body field) or `X-Lane`: interactive (default) or bulk.
+    value = parse_lane(lane or request.headers.get("x-lane"))
+    if value is None:
+        raise HTTPException(status_code=400, detail="lane_invalid")
+    return value
+
+
+async def _run_query(request: Request, code: str, captcha: Optional[str], deadline: Deadline, lane: str):
+    # Waiting for admission counts against the query deadline.
+    async with ADMISSION.slot(request, deadline.remaining()):
+        result = await run_in_threadpool(request.app.state.pool.query, code, captcha, deadline, lane)
     if not result.ok and result.status_code == 0:
         raise HTTPException(status_code=500, detail=result.error or "query_failed")
+    if QUERY_FAST_RESPONSE:
+        # SpiderResult already has the QueryResponse shape; returning a Response
+        # skips response_model validation and serializes once.
+        return FastJSONResponse(result.to_dict())
     return QueryResponse(**result.to_dict())
 
 
 @router.get("/health")
-def health() -> dict:
-    return {"status": "ok"}
+def health(request: Request) -> dict:
+    readiness = request.app.state.readiness
+    return {"status": "ok", "ready": readiness.ready(), "components": readiness.snapshot()}
+
+
+@router.get("/health/ready")
+def health_ready(request: Request) -> JSONResponse:
+    readiness = request.app.state.readiness
+    ready = readiness.ready()
+    return JSONResponse(
+        {"ready": ready, "components": readiness.snapshot()},
+        status_code=200 if ready else 503,
+    )
 
 
 @router.get("/captcha", response_model=CaptchaResponse)
-def captcha(request: Request, include_image: bool = False) -> CaptchaResponse:
-    spider = request.app.state.spider
-    result = spider.get_captcha()
+async def captcha(request: Request, include_image: bool = False) -> CaptchaResponse:
+    async with ADMISSION.slot(request):
+        result = await run_in_threadpool(request.app.state.pool.get_captcha)
     image_b64 = None
     if include_image:
         image_b64 = base64.b64encode(result.image_bytes).decode("ascii")
@@ -32,23 +80,29 @@ def captcha(request: Request, include_image: bool = False) -> CaptchaResponse:
 
 
 @router.get("/query", response_model=QueryResponse)
-def query_get(
+async def query_get(
     request: Request,
     phone: Optional[str] = None,
     code: Optional[str] = None,
     captcha: Optional[str] = None,
-) -> QueryResponse:
-    spider = request.app.state.spider
+    deadline_ms: Optional[int] = None,
+    lane: Optional[str] = None,
+):
     value = code or phone
     if not value:
         raise HTTPException(status_code=400, detail="code_or_phone_required")
-    return _run_query(spider, value, captcha)
+    return await _run_query(request, value, captcha, _deadline(request, deadline_ms), _lane(request, lane))
 
 
 @router.post("/query", response_model=QueryResponse)
-def query(request: Request, payload: QueryRequest) -> QueryResponse:
-    spider = request.app.state.spider
+async def query(request: Request, payload: QueryRequest, deadline_ms: Optional[int] = None):
     code = payload.code or payload.phone
     if not code:
         raise HTTPException(status_code=400, detail="code_or_phone_required")
-    return _run_query(spider, code, payload.captcha)
+    return await _run_query(
+        request,
+        code,
+        payload.captcha,
+        _deadline(request, deadline_ms),
+        _lane(request, payload.lane),
+    )
@@ -0,0 +1,31 @@
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+
+class JobCreateRequest(BaseModel):
+    phones: list[str]
+
+
+class JobStatusResponse(BaseModel):
+    id: str
+    status: str
+    total: int
+    done: int
+    failed: int
+    pending: int
+    created_at: float
+    updated_at: float
+
+
+class JobItemResponse(BaseModel):
+    seq: int
+    phone: str
+    status: str
+    result: Optional[Dict[str, Any]] = None
+
+
+class JobResultsResponse(BaseModel):
+    id: str
+    items: list[JobItemResponse]
+    next_offset: Optional[int] = None
@@ -7,6 +7,7 @@ class QueryRequest(BaseModel):
     code: Optional[str] = None
     phone: Optional[str] = None
     captcha: Optional[str] = None
+    lane: Optional[str] = None
 
 
 class QueryResponse(BaseModel):
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, ContextManager, Dict, Iterator, Optional, Tuple
+
+from ..core.breaker import CircuitOpenError
+from ..core.jsonfast import dumps_line, loads
+from ..core.lanes import BULK, QuotaReserved
+from ..core.logging import request_context
+from ..core.proxystats import PROXY_STATS
+from .pool import SpiderPool
+from .spider import SpiderResult
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Checkpoint:
+    offset: int = 0
+    output_size: int = 0
+    done: int = 0
+    ok: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "Checkpoint":
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls()
+        return cls(
+            offset=int(data.get("offset", 0)),
+            output_size=int(data.get("output_size", 0)),
+            done=int(data.get("done", 0)),
+            ok=int(data.get("ok", 0)),
+            errors=dict(data.get("errors") or {}),
+        )
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self.__dict__), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def iter_phone_records(handle: IO[bytes], start: int = 0) -> Iterator[Tuple[int, str, int]]:
+    # Yields (start, phone, end) byte spans; blank lines are folded into the
+    # following record so consecutive spans always touch.
+    offset = 0
+    if start > 0:
+        if handle.seekable():
+            handle.seek(start)
+            offset = start
+        else:
+            while offset < start:
+                line = handle.readline()
+                if not line:
+                    return
+                offset += len(line)
+    span_start = offset
+    for line in handle:
+        offset += len(line)
+        phone = line.decode("utf-8", errors="replace").strip().lstrip("﻿")
+        if not phone:
+            continue
+        yield span_start, phone, offset
+        span_start = offset
+
+
+def _trim_partial_line(output: Path, floor: int) -> int:
+    # A crash mid-write can leave a partial last line; appending after it would glue two
+    # records together. Cut back to the last newline, never before the checkpointed size.
+    if not output.exists():
+        return 0
+    with open(output, "r+b") as handle:
+        size = handle.seek(0, os.SEEK_END)
+        end = size
+        while end > floor:
+            start = max(floor, end - 65536)
+            handle.seek(start)
+            cut = handle.read(end - start).rfind(b"\n")
+            if cut >= 0:
+                end = start + cut + 1
+                break
+            end = start
+        if end < size:
+            handle.truncate(end)
+    return size - end
+
+
+def _written_records(output: Path, since: int) -> Dict[int, Optional[str]]:
+    # Results written after the last checkpoint but before a crash; bounded by the in-flight window.
+    # Maps start offset -> error (None when the record was ok).
+    written: Dict[int, Optional[str]] = {}
+    if not output.exists():
+        return written
+    with open(output, "rb") as handle:
+        handle.seek(since)
+        for line in handle:
+            try:
+                record = loads(line)
+                written[int(record["offset"])] = None if record.get("ok") else (record.get("error") or "unknown")
+            except (ValueError, KeyError, TypeError):
+                continue
+    return written
+
+
+class BulkRunner:
+    def __init__(
+        self,
+        source: str,
+        output: Path,
+        concurrency: int = 4,
+        checkpoint_every: float = 5.0,
+        progress_every: float = 10.0,
+        progress_stream: IO[str] = sys.stderr,
+    ) -> None:
+        self._source = source
+        self._output = output
+        self._checkpoint_path = output.with_name(output.name + ".ckpt")
+        self._concurrency = max(1, concurrency)
+        self._checkpoint_every = checkpoint_every
+        self._progress_every = progress_every
+        self._progress_stream = progress_stream
+        self._lock = threading.Lock()
+        # start offset -> (end offset, output position, error) for finished
+        # records that are still ahead of the checkpoint.
+        self._finished: Dict[int, Tuple[int, int, Optional[str]]] = {}
+
+    def _input_size(self) -> Optional[int]:
+        if self._source == "-":
+            return None
+        try:
+            return os.path.getsize(self._source)
+        except OSError:
+            return None
+
+    def _open_input(self) -> ContextManager[IO[bytes]]:
+        if self._source == "-":
+            # Not ours to close.
+            return nullcontext(sys.stdin.buffer)
+        return open(self._source, "rb")
+
+    def run(self, pool: SpiderPool) -> Checkpoint:
+        checkpoint = Checkpoint.load(self._checkpoint_path)
+        resume_output_size = checkpoint.output_size
+        if checkpoint.offset:
+            trimmed = _trim_partial_line(self._output, resume_output_size)
+            if trimmed:
+                _LOGGER.warning("bulk_output_trimmed: bytes=%s", trimmed)
+        skip = _written_records(self._output, resume_output_size) if checkpoint.offset else {}
+        self._output.parent.mkdir(parents=True, exist_ok=True)
+        if checkpoint.offset:
+            _LOGGER.info(
+                "bulk_resume: offset=%s done=%s already_written=%s",
+                checkpoint.offset,
+                checkpoint.done,
+                len(skip),
+            )
+        progress = _Progress(time.time(), checkpoint.offset, checkpoint.done, self._input_size())
+        last_save = [progress.started]
+        last_report = [progress.started]
+        window = threading.BoundedSemaphore(self._concurrency * 2)
+
+        with open(self._output, "ab") as out, self._open_input() as handle, ThreadPoolExecutor(
+            max_workers=self._concurrency
+        ) as executor:
+
+            def _finish(start: int, end: int, phone: str, result: SpiderResult) -> None:
+                record = {"offset": start, "phone": phone}
+                record.update(result.to_dict())
+                line = dumps_line(record)
+                with self._lock:
+                    position = out.tell()
+                    out.write(line)
+                    out.flush()
+                    error = None if result.ok else (result.error or "unknown")
+                    self._finished[start] = (end, position, error)
+                    self._advance(checkpoint, out.tell())
+                    now = time.time()
+                    if now - last_save[0] >= self._checkpoint_every:
+                        last_save[0] = now
+                        checkpoint.save(self._checkpoint_path)
+                    if self._progress_every and now - last_report[0] >= self._progress_every:
+                        last_report[0] = now
+                        self._report(checkpoint, progress)
+
+            def _work(start: int, end: int, phone: str) -> None:
+                try:
+                    try:
+                        with request_context(f"bulk-{start}"):
+                            result = self._query(pool, start, phone)
+                    except Exception as exc:
+                        _LOGGER.warning("bulk_item_error: offset=%s err=%s", start, exc)
+                        result = SpiderResult(
+                            ok=False,
+                            status_code=0,
+                            captcha=None,
+                            attempts=0,
+                            data=None,
+                            text=None,
+                            error=type(exc).__name__,
+                        )
+                    _finish(start, end, phone, result)
+                finally:
+                    window.release()
+
+            for start, phone, end in iter_phone_records(handle, checkpoint.offset):
+                if start in skip:
+                    with self._lock:
+                        self._finished[start] = (end, resume_output_size, skip[start])
+                        self._advance(checkpoint, out.tell())
+                    continue
+                window.acquire()
+                executor.submit(_work, start, end, phone)
+
+        with self._lock:
+            checkpoint.save(self._checkpoint_path)
+            self._report(checkpoint, progress)
+        return checkpoint
+
+    def _query(self, pool: SpiderPool, start: int, phone: str) -> SpiderResult:
+        # An open circuit or reserved quota is not an answer for this phone: wait it out.
+        while True:
+            try:
+                return pool.query(phone, lane=BULK)
+            except (CircuitOpenError, QuotaReserved) as exc:
+                _LOGGER.info("bulk_item_deferred: offset=%s err=%s", start, exc)
+                time.sleep(max(1.0, exc.retry_after))
+
+    def _advance(self, checkpoint: Checkpoint, output_size: int) -> None:
+        # The checkpoint (and its counters) only moves across a contiguous run of
+        # finished records, so a resume never skips a phone that was still in flight.
+        while checkpoint.offset in self._finished:
+            end, _, error = self._finished.pop(checkpoint.offset)
+            checkpoint.offset = end
+            checkpoint.done += 1
+            if error is None:
+                checkpoint.ok += 1
+            else:
+                checkpoint.errors[error] = checkpoint.errors.get(error, 0) + 1
+        if self._finished:
+            checkpoint.output_size = min(position for _, position, _ in self._finished.values())
+        else:
+            checkpoint.output_size = output_size
+
+    def _report(self, checkpoint: Checkpoint, progress: "_Progress") -> None:
+        elapsed = max(time.time() - progress.started, 1e-9)
+        rate = (checkpoint.done - progress.done) / elapsed
+        byte_rate = (checkpoint.offset - progress.offset) / elapsed
+        eta = ""
+        if progress.total_bytes and byte_rate > 0:
+            eta = f" eta={max(0.0, (progress.total_bytes - checkpoint.offset) / byte_rate):.0f}s"
+        proxies = PROXY_STATS.snapshot(top=0)
+        packing = ""
+        if proxies["purchases"]:
+            packing = (
+                f" proxies={proxies['purchases']} per_proxy={proxies['queries_per_proxy']}"
+                f" rotations_per_1k={proxies['rotations_per_1k']}"
+            )
+        self._progress_stream.write(
+            f"bulk: done={checkpoint.done} ok={checkpoint.ok} rate={rate:.2f}/s{eta}{packing} "
+            f"errors={checkpoint.errors}\n"
+        )
+        self._progress_stream.flush()
+
+
+@dataclass
+class _Progress:
+    started: float
+    offset: int
+    done: int
+    total_bytes: Optional[int]
@@ -0,0 +1,449 @@
+import csv
+import io
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from ..core.breaker import CircuitOpenError
+from ..core.config import JOB_DB_SHARED, JOB_HEARTBEAT_SECONDS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_NODE_ID
+from ..core.jsonfast import dumps, loads
+from ..core.lanes import BULK, QuotaReserved
+from ..core.logging import request_context
+from ..core.metrics import METRICS
+from .pool import SpiderPool
+from .spider import SpiderResult
+
+_LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    updated_at REAL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status, job_id, seq);
+CREATE TABLE IF NOT EXISTS job_nodes (
+    id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+@dataclass
+class JobInfo:
+    id: str
+    status: str
+    total: int
+    done: int
+    failed: int
+    created_at: float
+    updated_at: float
+
+    @property
+    def pending(self) -> int:
+        return max(0, self.total - self.done - self.failed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "pending": self.pending,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+@dataclass
+class JobItem:
+    job_id: str
+    seq: int
+    phone: str
+    status: str
+    result: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "phone": self.phone,
+            "status": self.status,
+            "result": self.result,
+        }
+
+
+def node_name() -> str:
+    # host:pid:random, so restarts and pre-forked siblings never share an id.
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def parse_phone_csv(text: str) -> list[str]:
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    column = 0
+    header = [cell.strip().lower() for cell in rows[0]]
+    for name in ("phone", "code", "number", "mobile"):
+        if name in header:
+            column = header.index(name)
+            rows = rows[1:]
+            break
+    phones = []
+    for row in rows:
+        if len(row) <= column:
+            continue
+        value = row[column].strip()
+        if value and any(ch.isdigit() for ch in value):
+            phones.append(value)
+    return phones
+
+
+class JobStore:
+    # Several processes, or hosts sharing the file, can work one queue: a claim is a
+    # lease held by this node's id and kept alive by heartbeat(); an item whose lease
+    # ran out (its node died) is handed to the next claimer. finish() only counts a
+    # result while the caller still owns the item, so every item is recorded once.
+    def __init__(
+        self,
+        path: Path,
+        node_id: Optional[str] = None,
+        lease: float = JOB_LEASE_SECONDS,
+        shared: bool = JOB_DB_SHARED,
+    ) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.node_id = node_id or JOB_NODE_ID or node_name()
+        self.lease = max(1.0, lease)
+        self._lock = threading.Lock()
+        # Other nodes hold the write lock briefly; wait for it instead of failing.
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30.0)
+        # WAL needs shared memory on one host; over a network filesystem use a rollback journal.
+        self._conn.execute("PRAGMA journal_mode=DELETE" if shared else "PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(job_items)")}
+        for name, definition in (
+            ("owner", "TEXT"),
+            ("lease_until", "REAL"),
+            ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+        ):
+            if name not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE job_items ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError:
+                    # Another node added it first.
+                    pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_items_owner ON job_items (owner)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def create(self, phones: Iterable[str]) -> JobInfo:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        rows = [(job_id, seq, phone, "pending") for seq, phone in enumerate(phones)]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, seq, phone, status) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, "queued" if rows else "completed", len(rows), now, now),
+            )
+            self._conn.execute("COMMIT")
+        return JobInfo(job_id, "queued" if rows else "completed", len(rows), 0, 0, now, now)
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, total, done, failed, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return JobInfo(*row) if row else None
+
+    def recover(self) -> int:
+        # Running items whose node is gone go back to the queue: the lease ran out, or
+        # the owner has not sent a heartbeat within one lease. Items of live nodes (on
+        # any host, including sibling workers of this process) are left alone.
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = 'pending', owner = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND (owner IS NULL OR lease_until IS NULL OR lease_until < ? "
+                "OR owner NOT IN (SELECT id FROM job_nodes WHERE last_seen >= ?))",
+                (now, now - self.lease),
+            )
+            return cursor.rowcount
+
+    def claim(self) -> Optional[JobItem]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                while True:
+                    row = self._conn.execute(
+                        "SELECT i.job_id, i.seq, i.phone, i.attempts, i.status FROM job_items i "
+                        "JOIN jobs j ON j.id = i.job_id "
+                        "WHERE i.status = 'pending' "
+                        "OR (i.status = 'running' AND (i.lease_until IS NULL OR i.lease_until < ?)) "
+                        "ORDER BY j.created_at, i.seq LIMIT 1",
+                        (now,),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    if row[4] == "running":
+                        METRICS.inc("jobs.redelivered")
+                        _LOGGER.info("job_item_redelivered: job=%s seq=%s attempts=%s", row[0], row[1], row[3])
+                    if JOB_MAX_ATTEMPTS > 0 and row[3] >= JOB_MAX_ATTEMPTS:
+                        # Every node that took it died or stalled: stop passing it around.
+                        self._record(row[0], row[1], "failed", {"ok": False, "error": "max_attempts"}, now)
+                        continue
+                    break
+                self._conn.execute(
+                    "UPDATE job_items SET status = 'running', owner = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE job_id = ? AND seq = ?",
+                    (self.node_id, now + self.lease, now, row[0], row[1]),
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return JobItem(job_id=row[0], seq=row[1], phone=row[2], status="running")
+
+    def heartbeat(self, done: int = 0) -> int:
+        # Extends every lease this node holds and records the node as alive.
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "UPDATE job_items SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                    (now + self.lease, self.node_id),
+                )
+                self._conn.execute(
+                    "INSERT INTO job_nodes (id, started_at, last_seen, done) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET last_seen = excluded.last_seen, done = excluded.done",
+                    (self.node_id, now, now, done),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def nodes(self, alive_within: Optional[float] = None) -> list[Dict[str, Any]]:
+        since = time.time() - (alive_within if alive_within is not None else self.lease)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT n.id, n.started_at, n.last_seen, n.done, "
+                "(SELECT COUNT(*) FROM job_items i WHERE i.owner = n.id AND i.status = 'running') "
+                "FROM job_nodes n WHERE n.last_seen >= ? ORDER BY n.id",
+                (since,),
+            ).fetchall()
+        return [
+            {"id": row[0], "started_at": row[1], "last_seen": row[2], "done": row[3], "leased": row[4]}
+            for row in rows
+        ]
+
+    def release(self, item: JobItem) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET status = 'pending', owner = NULL, lease_until = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE job_id = ? AND seq = ? AND status = 'running' AND owner = ?",
+                (time.time(), item.job_id, item.seq, self.node_id),
+            )
+
+    def finish(self, item: JobItem, ok: bool, result: Dict[str, Any]) -> bool:
+        status = "done" if ok else "failed"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                recorded = self._record(item.job_id, item.seq, status, result, time.time(), self.node_id)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not recorded:
+            # The lease ran out and the item went to another node (or is already finished).
+            METRICS.inc("jobs.duplicate_results")
+            _LOGGER.warning("job_item_lease_lost: job=%s seq=%s node=%s", item.job_id, item.seq, self.node_id)
+        return recorded
+
+    def _record(
+        self,
+        job_id: str,
+        seq: int,
+        status: str,
+        result: Dict[str, Any],
+        now: float,
+        owner: Optional[str] = None,
+    ) -> bool:
+        # Caller holds the lock and an open transaction.
+        query = (
+            "UPDATE job_items SET status = ?, result = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE job_id = ? AND seq = ? AND status IN ('pending', 'running')"
+        )
+        params: list[Any] = [status, dumps(result).decode("utf-8"), now, job_id, seq]
+        if owner is not None:
+            query += " AND status = 'running' AND owner = ?"
+            params.append(owner)
+        if self._conn.execute(query, params).rowcount == 0:
+            return False
+        self._conn.execute(
+            f"UPDATE jobs SET {status} = {status} + 1, updated_at = ?, "
+            "status = CASE WHEN done + failed + 1 >= total THEN 'completed' ELSE status END "
+            "WHERE id = ?",
+            (now, job_id),
+        )
+        return True
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> list[JobItem]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, seq, phone, status, result FROM job_items "
+                "WHERE job_id = ? AND status IN ('done', 'failed') AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [
+            JobItem(
+                job_id=row[0],
+                seq=row[1],
+                phone=row[2],
+                status=row[3],
+                result=loads(row[4]) if row[4] else None,
+            )
+            for row in rows
+        ]
+
+    def iter_results(self, job_id: str, batch: int = 500) -> Iterator[JobItem]:
+        offset = 0
+        while True:
+            items = self.results(job_id, offset, batch)
+            if not items:
+                return
+            yield from items
+            offset = items[-1].seq + 1
+
+
+class JobRunner:
+    def __init__(self, store: JobStore, pool: SpiderPool, workers: int, idle_wait: float = 1.0) -> None:
+        self._store = store
+        self._pool = pool
+        self._workers = max(1, workers)
+        self._idle_wait = idle_wait
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._done = 0
+        self._done_lock = threading.Lock()
+
+    def start(self) -> None:
+        # Beat first, so this node counts as alive when recover() looks at owners.
+        self._store.heartbeat()
+        recovered = self._store.recover()
+        if recovered:
+            _LOGGER.info("job_recover: items=%s", recovered)
+        _LOGGER.info("job_node_start: node=%s workers=%s lease=%ss", self._store.node_id, self._workers, self._store.lease)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        for idx in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _heartbeat(self) -> None:
+        interval = JOB_HEARTBEAT_SECONDS if JOB_HEARTBEAT_SECONDS > 0 else self._store.lease / 3.0
+        while not self._stop.wait(interval):
+            try:
+                self._store.heartbeat(self._done)
+            except sqlite3.Error as exc:
+                # A missed beat is fine as long as the next one lands within the lease.
+                _LOGGER.warning("job_heartbeat_error: node=%s err=%s", self._store.node_id, exc)
+
+    def _finish(self, item: JobItem, ok: bool, result: Dict[str, Any]) -> None:
+        if self._store.finish(item, ok, result):
+            with self._done_lock:
+                self._done += 1
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        backoff = self._idle_wait
+        while not self._stop.is_set():
+            try:
+                item = self._store.claim()
+            except sqlite3.Error as exc:
+                # e.g. "database is locked" while another node holds the write lock.
+                METRICS.inc("jobs.claim_errors")
+                _LOGGER.warning("job_claim_error: node=%s err=%s retry_in=%.1fs", self._store.node_id, exc, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = self._idle_wait
+            if item is None:
+                self._wake.wait(self._idle_wait)
+                self._wake.clear()
+                continue
+            try:
+                with request_context(f"job-{item.job_id[:8]}-{item.seq}"):
+                    result = self._pool.query(item.phone, lane=BULK)
+                self._finish(item, result.ok, result.to_dict())
+            except (CircuitOpenError, QuotaReserved) as exc:
+                # Transient outage or quota held for interactive traffic: put the item back and wait.
+                self._store.release(item)
+                _LOGGER.info("job_item_deferred: job=%s seq=%s err=%s", item.job_id, item.seq, exc)
+                self._stop.wait(max(1.0, exc.retry_after))
+            except Exception as exc:
+                _LOGGER.warning("job_item_error: job=%s seq=%s err=%s", item.job_id, item.seq, exc)
+                failed = SpiderResult(
+                    ok=False,
+                    status_code=0,
+                    captcha=None,
+                    attempts=0,
+                    data=None,
+                    text=None,
+                    error=str(exc) or type(exc).__name__,
+                )
+                self._finish(item, False, failed.to_dict())
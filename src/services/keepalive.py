@@ -0,0 +1,50 @@
+import logging
+import random
+import threading
+from typing import Optional
+
+from ..core.config import SESSION_KEEPALIVE_MODE, SESSION_KEEPALIVE_SECONDS
+from .pool import SpiderPool
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SessionKeeper:
+    # One idle session is touched per tick, and ticks are spread over the interval
+    # (interval / pool size, jittered), so the pool is refreshed evenly, not in bursts.
+    def __init__(
+        self,
+        pool: SpiderPool,
+        interval: float = SESSION_KEEPALIVE_SECONDS,
+        mode: str = SESSION_KEEPALIVE_MODE,
+    ) -> None:
+        self._pool = pool
+        self._interval = interval
+        self._prefetch = mode == "captcha"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._interval <= 0:
+            return
+        _LOGGER.info(
+            "keepalive_start: interval=%ss sessions=%s prefetch=%s",
+            self._interval,
+            self._pool.size,
+            self._prefetch,
+        )
+        self._thread = threading.Thread(target=self._run, name="session-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        tick = self._interval / self._pool.size
+        while not self._stop.wait(tick * random.uniform(0.8, 1.2)):
+            try:
+                self._pool.keepalive(self._interval, self._prefetch)
+            except Exception as exc:
+                _LOGGER.warning("keepalive_error: %s", exc)
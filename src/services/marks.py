@@ -0,0 +1,243 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from ..core.metrics import METRICS
+
+MARK_SUMMARY_TARGET = "基于平台标记与次数综合判断"
+MARK_SUMMARY_TEMPLATE = "被{platforms}个平台标记，标记次数:{count}"
+
+_DIGITS = re.compile(r"\d+")
+_MARK = 1
+_COUNT = 2
+_STATUS = 4
+_SHAPE_CACHE_MAX = 256
+
+Path = Tuple[Union[str, int], ...]
+
+
+@lru_cache(maxsize=2048)
+def _key_kind(key: str) -> int:
+    key_lower = key.lower()
+    kind = 0
+    if "mark" in key_lower or "tag" in key_lower or "标记" in key:
+        kind |= _MARK
+    if any(part in key_lower for part in ("count", "num", "times")):
+        kind |= _COUNT
+    if key_lower in {"status", "state", "flag"}:
+        kind |= _STATUS
+    return kind
+
+
+def _extract_int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        match = _DIGITS.search(value)
+        if match:
+            return int(match.group(0))
+    return None
+
+
+def _value_is_marked(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value > 0
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return False
+        number = _extract_int(text)
+        if number is not None:
+            return number > 0
+        if "未标记" in text:
+            return False
+        if text.lower() in {"1", "true", "yes", "y", "marked"}:
+            return True
+        if "已标记" in text or "标记" in text:
+            return True
+    return False
+
+
+def _entry_count(entry: Dict[str, Any], kinds: List[int]) -> Optional[int]:
+    # Entries without any mark-like key never count; otherwise the first numeric
+    # mark/count field wins, falling back to a marked flag/status (counts as 1).
+    for value, kind in zip(entry.values(), kinds):
+        if kind & (_MARK | _COUNT):
+            count = _extract_int(value)
+            if count is not None:
+                return count
+    for value, kind in zip(entry.values(), kinds):
+        if kind & (_MARK | _STATUS) and _value_is_marked(value):
+            return 1
+    return None
+
+
+def _score_list(items: List[Any]) -> Optional[Tuple[int, int, int]]:
+    # Returns (score, platforms, marks) for a non-empty list of dicts, scoring and
+    # counting in the same pass over each entry's keys.
+    if not items:
+        return None
+    score = 0
+    platforms = 0
+    marks = 0
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        kinds = [_key_kind(key) for key in item]
+        hits = sum(1 for kind in kinds if kind & _MARK)
+        if not hits:
+            continue
+        score += hits
+        count = _entry_count(item, kinds)
+        if count is not None and count > 0:
+            platforms += 1
+            marks += count
+    return score, platforms, marks
+
+
+class _Scan:
+    __slots__ = ("best", "best_path", "best_score", "best_len", "candidates", "targets")
+
+    def __init__(self) -> None:
+        self.best: Optional[Tuple[int, int]] = None
+        self.candidates = 0
+        self.best_path: Optional[Path] = None
+        self.best_score = 0
+        self.best_len = 0
+        self.targets: List[Path] = []
+
+    def walk(self, node: Any, path: Path) -> None:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, str):
+                    if MARK_SUMMARY_TARGET in value:
+                        self.targets.append(path + (key,))
+                elif isinstance(value, (dict, list)):
+                    self.walk(value, path + (key,))
+            return
+        self.consider(node, path)
+        for index, value in enumerate(node):
+            if isinstance(value, str):
+                if MARK_SUMMARY_TARGET in value:
+                    self.targets.append(path + (index,))
+            elif isinstance(value, (dict, list)):
+                self.walk(value, path + (index,))
+
+    def consider(self, items: List[Any], path: Path) -> None:
+        scored = _score_list(items)
+        if scored is None or scored[0] <= 0:
+            return
+        score = scored[0]
+        self.candidates += 1
+        if score > self.best_score or (score == self.best_score and len(items) > self.best_len):
+            self.best = scored[1], scored[2]
+            self.best_path = path
+            self.best_score = score
+            self.best_len = len(items)
+
+
+def _shape(payload: Dict[str, Any]) -> Tuple[Any, ...]:
+    # Dict keys down to two levels plus list emptiness; lists are not entered, so
+    # the key stays cheap and does not depend on how many entries a response carries.
+    shape: List[Any] = []
+    for key, value in payload.items():
+        if isinstance(value, dict):
+            shape.append((key, tuple((k, bool(v)) if isinstance(v, list) else k for k, v in value.items())))
+        elif isinstance(value, list):
+            shape.append((key, bool(value)))
+        else:
+            shape.append(key)
+    return tuple(shape)
+
+
+def _resolve(node: Any, path: Path) -> Any:
+    for step in path:
+        if isinstance(node, dict):
+            node = node.get(step)
+        elif isinstance(node, list) and isinstance(step, int) and step < len(node):
+            node = node[step]
+        else:
+            return None
+    return node
+
+
+def _replace_at(root: Any, path: Path, replacement: str) -> bool:
+    parent = _resolve(root, path[:-1])
+    step = path[-1]
+    try:
+        value = parent[step]
+    except (KeyError, IndexError, TypeError):
+        return False
+    if not isinstance(value, str) or MARK_SUMMARY_TARGET not in value:
+        return False
+    parent[step] = value.replace(MARK_SUMMARY_TARGET, replacement)
+    return True
+
+
+class MarkSummarizer:
+    def __init__(self, cache_size: int = _SHAPE_CACHE_MAX) -> None:
+        self._cache_size = cache_size
+        # response shape -> (mark list path, replacement string paths)
+        self._paths: Dict[Tuple[Any, ...], Tuple[Path, Tuple[Path, ...]]] = {}
+        self._lock = threading.Lock()
+
+    def _cached(
+        self, shape: Optional[Tuple[Any, ...]], payload: Dict[str, Any]
+    ) -> Optional[Tuple[Tuple[int, int], Tuple[Path, ...]]]:
+        cached = self._paths.get(shape) if shape is not None else None
+        if cached is None:
+            return None
+        items = _resolve(payload, cached[0])
+        scored = _score_list(items) if isinstance(items, list) else None
+        if scored is None or scored[0] <= 0:
+            return None
+        return (scored[1], scored[2]), cached[1]
+
+    def _remember(self, shape: Tuple[Any, ...], path: Path, targets: Tuple[Path, ...]) -> None:
+        with self._lock:
+            if len(self._paths) >= self._cache_size:
+                self._paths.pop(next(iter(self._paths)))
+            self._paths[shape] = (path, targets)
+
+    def apply(self, parsed: Dict[str, Any]) -> None:
+        data = parsed.get("data")
+        if not isinstance(data, dict):
+            return
+        shape = _shape(data) if self._cache_size > 0 else None
+        replaced = False
+        located = self._cached(shape, data)
+        summary = None
+        if located is not None:
+            summary = MARK_SUMMARY_TEMPLATE.format(platforms=located[0][0], count=located[0][1])
+            done = [_replace_at(data, path, summary) for path in located[1]]
+            replaced = any(done)
+            if not all(done):
+                # Same shape but the text moved; fall back to a full scan.
+                located = None
+        if located is None:
+            METRICS.inc("marks.path_cache_misses")
+            scan = _Scan()
+            scan.walk(data, ())
+            if scan.best is None:
+                return
+            summary = MARK_SUMMARY_TEMPLATE.format(platforms=scan.best[0], count=scan.best[1])
+            for path in scan.targets:
+                replaced = _replace_at(data, path, summary) or replaced
+            # Only unambiguous shapes are cached: one candidate list and a known
+            # replacement location, so a cache hit gives the same answer as a scan.
+            if shape is not None and scan.candidates == 1 and scan.targets and scan.best_path is not None:
+                self._remember(shape, scan.best_path, tuple(scan.targets))
+        else:
+            METRICS.inc("marks.path_cache_hits")
+        if not replaced:
+            data.setdefault("mark_summary", summary)
+        text = parsed.get("text")
+        if isinstance(text, str) and MARK_SUMMARY_TARGET in text:
+            parsed["text"] = text.replace(MARK_SUMMARY_TARGET, summary)
+
+MARKS = MarkSummarizer()
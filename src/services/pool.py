@@ -0,0 +1,278 @@
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+from ..core.config import (
+    QUERY_HEDGE,
+    QUERY_HEDGE_MIN_SAMPLES,
+    QUERY_HEDGE_PERCENTILE,
+    RESULT_CACHE_TTL,
+    SINGLE_FLIGHT,
+)
+from ..core.deadline import Deadline, DeadlineExceeded
+from ..core.lanes import INTERACTIVE, lane_scheduler
+from ..core.limiter import LIMITS
+from ..core.metrics import METRICS
+from ..core.singleflight import FollowerTimeout, SingleFlight
+from ..core.state import get_state
+from .spider import CaptchaResult, SpiderResult, SpiderService
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def normalize_code(code: str) -> str:
+    digits = re.sub(r"\D", "", code)
+    if len(digits) == 13 and digits.startswith("86"):
+        digits = digits[2:]
+    return digits or code.strip()
+
+
+class SpiderPool:
+    def __init__(self, size: int, interactive: bool = True) -> None:
+        self._size = max(1, size)
+        self._spiders: list[SpiderService] = []
+        self._lock = threading.Lock()
+        self._flight: SingleFlight[SpiderResult] = SingleFlight("query.singleflight")
+        self._latencies: Deque[float] = deque(maxlen=200)
+        # Hedged attempts run on their own threads so the caller can wait on both.
+        self._hedger: Optional[ThreadPoolExecutor] = None
+        if QUERY_HEDGE and self._size > 1:
+            self._hedger = ThreadPoolExecutor(max_workers=self._size * 2, thread_name_prefix="hedge")
+        worker = os.getenv("SPIDER_WORKER_SLOT", "0")
+        for index in range(self._size):
+            slot = "" if worker == "0" and index == 0 else f"{worker}.{index}"
+            spider = SpiderService(slot=slot)
+            self._spiders.append(spider)
+        # With ADAPTIVE_CONCURRENCY the global AIMD limit decides how many sessions run at once.
+        LIMITS.bound(self._size)
+        # Bulk work goes to the session whose proxy budget is most at risk of going unused.
+        self._lanes = lane_scheduler(
+            self._spiders,
+            bulk_rank=SpiderService.proxy_score,
+            interactive=interactive,
+            capacity=LIMITS.capacity,
+        )
+        _LOGGER.info("spider_pool: size=%s", self._size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def lanes(self) -> dict:
+        return self._lanes.snapshot()
+
+    @property
+    def manual(self) -> SpiderService:
+        # A manual captcha only works on the session that fetched it, so GET /captcha and
+        # queries carrying a captcha always use the first session.
+        return self._spiders[0]
+
+    @contextmanager
+    def acquire(
+        self,
+        timeout: Optional[float] = None,
+        lane: str = INTERACTIVE,
+        want: Optional[SpiderService] = None,
+    ) -> Iterator[SpiderService]:
+        spider = self._lanes.acquire(lane, timeout, want)
+        if spider is None:
+            raise TimeoutError("spider_pool_timeout")
+        try:
+            yield spider
+        finally:
+            self._lanes.release(lane, spider)
+
+    def query(
+        self,
+        code: str,
+        captcha: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        lane: str = INTERACTIVE,
+    ) -> SpiderResult:
+        METRICS.inc("query.requests")
+        METRICS.inc(f"query.lane.{lane}")
+        deadline = deadline or Deadline.default()
+        if captcha:
+            return self._query(code, captcha, deadline, lane)
+        key = normalize_code(code)
+        if RESULT_CACHE_TTL > 0:
+            cached = get_state().cache_get(key)
+            if cached is not None:
+                METRICS.inc("query.cache_hits")
+                return SpiderResult(**cached)
+            METRICS.inc("query.cache_misses")
+        if not SINGLE_FLIGHT:
+            return self._cached_query(key, code, deadline, lane)
+        # Concurrent callers for the same phone share one upstream query (and one unit of proxy quota).
+        # Keyed by lane too, so an interactive caller never waits at bulk priority behind a job.
+        try:
+            result, shared = self._flight.do(
+                f"{lane}:{key}", lambda: self._cached_query(key, code, deadline, lane), deadline.remaining()
+            )
+        except FollowerTimeout:
+            deadline.check("singleflight")
+            raise DeadlineExceeded("singleflight") from None
+        except DeadlineExceeded:
+            if deadline.expired():
+                raise
+            # The leader ran out of its own, shorter budget; this caller still has time to try.
+            METRICS.inc("query.singleflight.retried")
+            return self._cached_query(key, code, deadline, lane)
+        if shared:
+            _LOGGER.info("query_coalesced: code=%s", code)
+        return result
+
+    def _cached_query(self, key: str, code: str, deadline: Deadline, lane: str) -> SpiderResult:
+        result = self._query(code, None, deadline, lane)
+        if RESULT_CACHE_TTL > 0 and result.ok:
+            get_state().cache_set(key, result.to_dict(), RESULT_CACHE_TTL)
+        return result
+
+    def _query(self, code: str, captcha: Optional[str], deadline: Deadline, lane: str) -> SpiderResult:
+        # A manual captcha belongs to one session, so only OCR queries are hedged;
+        # bulk work is never hedged since a hedge spends extra quota.
+        delay = self._hedge_delay() if captcha is None and lane == INTERACTIVE else None
+        if delay is None:
+            return self._run(code, captcha, deadline, lane)
+        return self._hedged(code, deadline, delay)
+
+    def _run(self, code: str, captcha: Optional[str], deadline: Deadline, lane: str = INTERACTIVE) -> SpiderResult:
+        spider = self._lanes.acquire(lane, deadline.remaining(), self.manual if captcha else None)
+        if spider is None:
+            deadline.check("pool")
+            raise DeadlineExceeded("pool")
+        started = time.monotonic()
+        try:
+            result = spider.query(code, captcha=captcha, deadline=deadline, lane=lane)
+        finally:
+            self._lanes.release(lane, spider)
+        if result.ok:
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self._hedger is None:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples or len(samples) < QUERY_HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * QUERY_HEDGE_PERCENTILE / 100.0))
+        return samples[index]
+
+    def _hedged(self, code: str, deadline: Deadline, delay: float) -> SpiderResult:
+        # Start the query; if it is still running after the recent p95, send a duplicate
+        # on another idle session and keep the first ok result. The loser is cancelled
+        # at its next stage boundary (an in-flight HTTP call cannot be interrupted).
+        attempts: Dict[Future, Deadline] = {}
+        primary = deadline.child()
+        # Each attempt runs in a copy of the caller's context so its log lines keep the request id.
+        attempts[self._hedger.submit(contextvars.copy_context().run, self._run, code, None, primary)] = primary
+        pending = set(attempts)
+        hedge: Optional[Future] = None
+        last_result: Optional[SpiderResult] = None
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                remaining = deadline.remaining()
+                timeout = remaining
+                if hedge is None:
+                    timeout = delay if remaining is None else min(delay, remaining)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as exc:
+                        last_error = exc
+                        continue
+                    if result.ok:
+                        if future is hedge:
+                            METRICS.inc("query.hedge.won")
+                        return result
+                    last_result = result
+                if done:
+                    continue
+                deadline.check("query")
+                if hedge is None and self._lanes.idle() > 0:
+                    METRICS.inc("query.hedge.sent")
+                    _LOGGER.info("query_hedged: code=%s after=%.3fs", code, delay)
+                    child = deadline.child()
+                    hedge = self._hedger.submit(contextvars.copy_context().run, self._run, code, None, child)
+                    attempts[hedge] = child
+                    pending.add(hedge)
+        finally:
+            for attempt in attempts.values():
+                attempt.cancel()
+        if last_result is not None:
+            return last_result
+        raise last_error
+
+    def warm(self, warm_up: bool = True) -> int:
+        # The idle queue is FIFO, so taking `size` spiders in turn prepares each once
+        # unless live traffic is borrowing them at the same time.
+        prepared = 0
+        for _ in range(self._size):
+            with self.acquire() as spider:
+                try:
+                    spider.prepare(warm=warm_up)
+                except Exception as exc:
+                    _LOGGER.warning("spider_prepare_error: %s", exc)
+                    continue
+                prepared += 1
+        return prepared
+
+    def export_sessions(self) -> Dict[str, Any]:
+        sessions: Dict[str, Any] = {}
+        for spider in self._spiders:
+            try:
+                sessions[spider.slot] = spider.export_session()
+            except RuntimeError:
+                # The cookie jar changed under a running query; the next snapshot catches it.
+                continue
+        return sessions
+
+    def restore_sessions(self, sessions: Dict[str, Any], fresh: bool) -> int:
+        restored = 0
+        for spider in self._spiders:
+            data = sessions.get(spider.slot)
+            if not data:
+                continue
+            try:
+                restored += spider.restore_session(data, fresh)
+            except Exception as exc:
+                _LOGGER.warning("session_restore_error: slot=%s err=%s", spider.slot, exc)
+        return restored
+
+    def keepalive(self, min_idle: float, prefetch: bool = False) -> bool:
+        # Only sessions idle for `min_idle` seconds are touched, and only while no query waits.
+        spider = self._lanes.borrow()
+        if spider is None:
+            return False
+        try:
+            if spider.idle_seconds() < min_idle:
+                return False
+            return spider.keepalive(prefetch=prefetch)
+        finally:
+            self._lanes.restore(spider)
+
+    def get_captcha(self) -> CaptchaResult:
+        with self.acquire(want=self.manual) as spider:
+            return spider.get_captcha()
+
+    def close(self) -> None:
+        if self._hedger is not None:
+            self._hedger.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for spider in self._spiders:
+                try:
+                    spider.close()
+                except Exception as exc:
+                    _LOGGER.warning("spider_close_error: %s", exc)
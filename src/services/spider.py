@@ -1,25 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import logging
-import re
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
-from ..core.captcha import fetch_captcha
+from ..core.captcha import fetch_captcha, label_captcha, save_captcha
+from ..core.breaker import breaker
+from ..core.classify import BLOCKED, CAPTCHA_REJECTED, CLASSIFIER, LIMIT_REACHED, SUCCESS, UNKNOWN
 from ..core.config import (
-    CAPTCHA_ERROR_HINT,
-    CAPTCHA_ERROR_HINTS,
     CAPTCHA_FIELD,
-    CAPTCHA_MAX_TRIES,
+    CAPTCHA_PREFETCH_TTL,
     CODE_FIELD,
     EXTRA_FORM,
     INDEX_URL,
     PROXY_API_URL,
-    PROXY_LIMIT_HINT,
-    PROXY_LIMIT_HINTS,
-    PROXY_LIMIT_STATUSES,
     PROXY_MODE,
     PROXY_PASSWORD,
+    PROXY_REFRESH_BEFORE_SECONDS,
     PROXY_RELEASE_ON_LIMIT,
     PROXY_ROTATE_EACH_REQUEST,
     PROXY_ROTATE_ON_LIMIT,
@@ -31,19 +29,41 @@ from ..core.config import (
     QUERY_CONTENT_TYPE,
     QUERY_METHOD,
     QUERY_URL,
-    REQUEST_TIMEOUT,
+    SESSION_KEEPALIVE_SECONDS,
     VERIFY_SSL,
 )
+from ..core.deadline import Deadline, DeadlineExceeded
 from ..core.http import create_session, save_cookies
-from ..core.ocr import is_valid, read_captcha_text
-from ..core.proxy import ProxyManager
+from ..core.jsonfast import loads
+from ..core.lanes import BULK, INTERACTIVE, QuotaReserved, bulk_quota_allowance
+from ..core.limiter import LIMITS
+from ..core.ocr import is_valid, ocr_candidates, pick_candidate
+from ..core.metrics import METRICS
+from ..core.proxy import ProxyManager, export_proxy, import_proxy
+from ..core.proxystats import PROXY_STATS
+from ..core.retry import (
+    CAPTCHA_INVALID,
+    GIVE_UP,
+    PROXY_ERROR,
+    REFETCH,
+    REOCR,
+    RETRIES,
+    REWARM,
+    ROTATE,
+    RetryRun,
+)
+from ..core.state import get_state, quota_key
+from .marks import MARKS
 
 
 @dataclass
 class CaptchaResult:
     text: str
     image_bytes: bytes
-    image_path: Optional[str] = None
+    archive_id: Optional[str] = None
+    variant: str = ""
+    # Other valid (text, variant) readings of the same image, best first.
+    alternatives: List[Tuple[str, str]] = field(default_factory=list)
 
 
 @dataclass
@@ -69,15 +89,53 @@ class SpiderResult:
 
 
 class SpiderService:
-    def __init__(self) -> None:
+    def __init__(self, slot: str = "") -> None:
+        self._slot = slot
         self._warmed = False
         self._logger = logging.getLogger(__name__)
         self._proxy_manager = ProxyManager()
+        self._upstream = breaker("query")
+        self._deadline = Deadline()
+        self._lane = INTERACTIVE
+        self._proxy_errors = 0
+        self._last_used = time.monotonic()
+        self._prefetched: Optional[Tuple[CaptchaResult, float, requests.Session]] = None
         self._proxy_info = None
         self._cookie_key = None
         self.session = create_session()
         self._log_proxy_config()
+
+    @property
+    def slot(self) -> str:
+        return self._slot
+
+    def export_session(self) -> Dict[str, Any]:
+        return {
+            "proxy": export_proxy(self._proxy_info) if self._proxy_info is not None else None,
+            "cookie_key": self._cookie_key,
+            "warmed": self._warmed,
+            "cookies": requests.utils.dict_from_cookiejar(self.session.cookies),
+        }
+
+    def restore_session(self, data: Dict[str, Any], fresh: bool) -> bool:
+        # The proxy is resumed whenever it is still live; cookies and the warm flag
+        # only when the snapshot is `fresh` enough for the server-side session to exist.
+        if data.get("proxy") is not None:
+            if not self._proxy_manager.adopt(import_proxy(data["proxy"])):
+                return False
+            self._ensure_session()
+        elif self._proxy_manager.enabled():
+            return False
+        if not fresh or self._cookie_key != data.get("cookie_key"):
+            return True
+        self.session.cookies.update(data.get("cookies") or {})
+        self._warmed = bool(data.get("warmed"))
+        return True
+
+    def prepare(self, warm: bool = True) -> None:
         self._ensure_session()
+        if warm:
+            self.warm_up()
 
     def close(self) -> None:
         save_cookies(self.session, self._cookie_key)
@@ -125,14 +183,15 @@ class SpiderService:
         if proxy_info and (
             self._proxy_info is None
             or self._proxy_info.url != proxy_info.url
-            or self._cookie_key != proxy_info.cookie_key
+            or self._cookie_key != self._jar_key(proxy_info.cookie_key)
         ):
             save_cookies(self.session, self._cookie_key)
             self.session.close()
             proxies = {"http": proxy_info.url, "https": proxy_info.url}
-            self.session = create_session(proxies=proxies, cookie_key=proxy_info.cookie_key)
+            cookie_key = self._jar_key(proxy_info.cookie_key)
+            self.session = create_session(proxies=proxies, cookie_key=cookie_key)
             self._proxy_info = proxy_info
-            self._cookie_key = proxy_info.cookie_key
+            self._cookie_key = cookie_key
             self._warmed = False
             self._logger.info(
                 "proxy_in_use: endpoint=%s proxy_ip=%s source=%s",
@@ -151,6 +210,46 @@ class SpiderService:
             self._warmed = False
             self._logger.info("proxy_in_use: none")
 
+    def _next_action(self, run: RetryRun, failure: str, cap: Optional[CaptchaResult] = None) -> str:
+        if failure == PROXY_ERROR:
+            if self._proxy_info is not None:
+                PROXY_STATS.record(self._proxy_info, "error")
+            self._proxy_errors += 1
+        options = [REFETCH, REWARM]
+        # Another reading only helps when the upstream rejected the one we sent.
+        if failure == CAPTCHA_REJECTED and cap is not None and cap.alternatives:
+            options.append(REOCR)
+        if self._proxy_manager.enabled():
+            options.append(ROTATE)
+        return RETRIES.decide(run, failure, options, self._deadline.remaining(), self._proxy_errors)
+
+    def _apply_action(self, action: str, reason: str) -> bool:
+        # Returns whether the next attempt has to pick up a proxy session again.
+        if action == ROTATE:
+            self._proxy_errors = 0
+            self._reset_session()
+            self._proxy_manager.rotate(reason)
+            return True
+        if action == REWARM:
+            # Same proxy, fresh connection and warm-up.
+            self._reset_session()
+            return True
+        return False
+
+    def proxy_score(self) -> float:
+        # Used to steer bulk work onto the proxy whose budget is most at risk. Same ranking
+        # (and shared quota counts) the proxy manager uses to pick proxies, so workers agree.
+        if self._proxy_info is None:
+            return 0.0
+        return self._proxy_manager.rank(self._proxy_info)
+
+    def _jar_key(self, cookie_key: Optional[str]) -> Optional[str]:
+        # Sessions sharing one proxy still need their own server-side session (the
+        # captcha is bound to it), so every spider slot keeps a separate cookie jar.
+        if not cookie_key or not self._slot:
+            return cookie_key
+        return f"{cookie_key}#{self._slot}"
+
     def _log_proxy_exit_ip(self) -> None:
         if not PROXY_DEBUG_IP_CHECK:
             return
@@ -175,23 +274,78 @@ class SpiderService:
         if self._warmed:
             return
         self._logger.info("warm_up: url=%s", INDEX_URL)
-        resp = self.session.get(INDEX_URL, timeout=REQUEST_TIMEOUT, verify=VERIFY_SSL)
+        resp = self.session.get(INDEX_URL, timeout=self._deadline.timeout("warm_up"), verify=VERIFY_SSL)
         resp.raise_for_status()
         self._logger.info("warm_up: status=%s", resp.status_code)
         self._warmed = True
         save_cookies(self.session, self._cookie_key)
 
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self._last_used
+
+    def keepalive(self, prefetch: bool = False) -> bool:
+        # Touch the server-side session so the next query does not start cold. With
+        # `prefetch` the touch is a captcha fetch whose OCR result the next query uses.
+        info = self._proxy_info
+        if self._proxy_manager.enabled() and info is None:
+            return False
+        if info is not None and info.expires_at is not None:
+            if time.time() >= info.expires_at - PROXY_REFRESH_BEFORE_SECONDS - SESSION_KEEPALIVE_SECONDS:
+                METRICS.inc("keepalive.skipped_expiring")
+                return False
+        if self._upstream.state != "closed":
+            return False
+        try:
+            if prefetch:
+                self.warm_up()
+                self._prefetched = (self.get_captcha(), time.monotonic(), self.session)
+            else:
+                resp = self.session.get(INDEX_URL, timeout=self._deadline.timeout("keepalive"), verify=VERIFY_SSL)
+                resp.raise_for_status()
+                self._warmed = True
+                save_cookies(self.session, self._cookie_key)
+        except requests.RequestException as exc:
+            self._warmed = False
+            METRICS.inc("keepalive.errors")
+            self._logger.info("keepalive_error: slot=%s err=%s", self._slot, exc)
+            return False
+        self._last_used = time.monotonic()
+        METRICS.inc("keepalive.ok")
+        return True
+
+    def _take_prefetched(self) -> Optional[CaptchaResult]:
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is None:
+            return None
+        cap, fetched_at, session = prefetched
+        # A captcha is bound to the session that fetched it and expires server-side.
+        if session is not self.session or time.monotonic() - fetched_at > CAPTCHA_PREFETCH_TTL:
+            return None
+        METRICS.inc("keepalive.prefetch_used")
+        return cap
+
     def get_captcha(self) -> CaptchaResult:
         self._ensure_session(refresh_proxy=False)
-        image_bytes, image_path = fetch_captcha(self.session)
-        text = read_captcha_text(image_bytes)
+        # Counts as use, so keepalive does not replace the captcha before the caller submits it.
+        self._last_used = time.monotonic()
+        image_bytes = fetch_captcha(self.session, timeout=self._deadline.timeout("captcha"))
+        candidates = ocr_candidates(image_bytes)
+        text, variant = pick_candidate(candidates)
+        alternatives = [(other, name) for name, other in candidates if other != text and is_valid(other)]
+        archive_id = save_captcha(image_bytes, text=text, variant=variant)
         self._logger.info(
             "captcha_ocr: text=%s len=%s saved=%s",
             text,
             len(text),
-            image_path or "",
+            archive_id or "",
+        )
+        return CaptchaResult(
+            text=text,
+            image_bytes=image_bytes,
+            archive_id=archive_id,
+            variant=variant,
+            alternatives=alternatives,
         )
-        return CaptchaResult(text=text, image_bytes=image_bytes, image_path=image_path)
 
     def _build_payload(self, code: str, captcha: str) -> Dict[str, Any]:
         payload = dict(EXTRA_FORM)
@@ -200,214 +354,97 @@ class SpiderService:
         return payload
 
     def _send_query(self, payload: Dict[str, Any]) -> requests.Response:
+        timeout = self._deadline.timeout("submit")
         if QUERY_METHOD == "GET":
             return self.session.get(
                 QUERY_URL,
                 params=payload,
-                timeout=REQUEST_TIMEOUT,
+                timeout=timeout,
                 verify=VERIFY_SSL,
             )
         if QUERY_CONTENT_TYPE == "json":
             return self.session.post(
                 QUERY_URL,
                 json=payload,
-                timeout=REQUEST_TIMEOUT,
+                timeout=timeout,
                 verify=VERIFY_SSL,
             )
         return self.session.post(
             QUERY_URL,
             data=payload,
-            timeout=REQUEST_TIMEOUT,
+            timeout=timeout,
             verify=VERIFY_SSL,
         )
 
-    def _is_captcha_error(self, response: requests.Response) -> bool:
-        if not CAPTCHA_ERROR_HINT:
-            return False
-        return CAPTCHA_ERROR_HINT.lower() in response.text.lower()
-
-    def _matches_hint(self, message: Optional[str], hints: list[str]) -> bool:
-        if not message or not hints:
-            return False
-        for hint in hints:
-            if hint and hint in message:
-                return True
-        return False
-
     def _parse_response(self, response: requests.Response) -> Dict[str, Any]:
         data: Optional[Dict[str, Any]] = None
         text: Optional[str] = None
         content_type = response.headers.get("Content-Type", "")
         if "application/json" in content_type:
             try:
-                data = response.json()
+                data = loads(response.content)
             except ValueError:
-                text = response.text
+                # Non-UTF-8 bodies: let requests detect the encoding.
+                try:
+                    data = response.json()
+                except ValueError:
+                    text = response.text
         else:
             text = response.text
         return {"data": data, "text": text}
 
     def _apply_mark_summary(self, parsed: Dict[str, Any]) -> None:
-        summary = self._build_mark_summary(parsed.get("data"))
-        if not summary:
+        MARKS.apply(parsed)
+
+    def query(
+        self,
+        code: str,
+        captcha: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        lane: str = INTERACTIVE,
+    ) -> SpiderResult:
+        self._deadline = deadline or Deadline()
+        self._lane = lane
+        try:
+            return self._query(code, captcha)
+        finally:
+            self._deadline = Deadline()
+            self._lane = INTERACTIVE
+            self._last_used = time.monotonic()
+
+    def _check_quota_reserve(self) -> None:
+        # The last LANE_INTERACTIVE_QUOTA_RESERVE of each proxy's daily quota is kept for interactive queries.
+        allowed = bulk_quota_allowance()
+        if self._lane != BULK or allowed is None or self._proxy_info is None:
             return
-        target = "\u57fa\u4e8e\u5e73\u53f0\u6807\u8bb0\u4e0e\u6b21\u6570\u7efc\u5408\u5224\u65ad"
-        data = parsed.get("data")
-        if isinstance(data, dict):
-            replaced = self._replace_text(data, target, summary)
-            if not replaced:
-                data.setdefault("mark_summary", summary)
-        text = parsed.get("text")
-        if isinstance(text, str) and target in text:
-            parsed["text"] = text.replace(target, summary)
-
-    def _replace_text(self, obj: Any, target: str, replacement: str) -> bool:
-        if isinstance(obj, dict):
-            changed = False
-            for key, value in obj.items():
-                if isinstance(value, str) and target in value:
-                    obj[key] = value.replace(target, replacement)
-                    changed = True
-                else:
-                    changed = self._replace_text(value, target, replacement) or changed
-            return changed
-        if isinstance(obj, list):
-            changed = False
-            for idx, value in enumerate(obj):
-                if isinstance(value, str) and target in value:
-                    obj[idx] = value.replace(target, replacement)
-                    changed = True
-                else:
-                    changed = self._replace_text(value, target, replacement) or changed
-            return changed
-        return False
-
-    def _build_mark_summary(self, payload: Any) -> Optional[str]:
-        if not isinstance(payload, dict):
-            return None
-        mark_list = self._find_mark_list(payload)
-        if not mark_list:
-            return None
-        platform_count, mark_count = self._summarize_mark_list(mark_list)
-        template = "\u88ab{platforms}\u4e2a\u5e73\u53f0\u6807\u8bb0\uff0c\u6807\u8bb0\u6b21\u6570:{count}"
-        return template.format(platforms=platform_count, count=mark_count)
-
-    def _find_mark_list(self, payload: Dict[str, Any]) -> Optional[list[Dict[str, Any]]]:
-        best_list: Optional[list[Dict[str, Any]]] = None
-        best_score = 0
-        best_len = 0
-        for items in self._iter_lists(payload):
-            if not items or not all(isinstance(item, dict) for item in items):
-                continue
-            score = self._score_mark_list(items)
-            if score <= 0:
-                continue
-            if score > best_score or (score == best_score and len(items) > best_len):
-                best_list = items
-                best_score = score
-                best_len = len(items)
-        return best_list
-
-    def _iter_lists(self, node: Any):
-        if isinstance(node, dict):
-            for value in node.values():
-                yield from self._iter_lists(value)
-        elif isinstance(node, list):
-            yield node
-            for value in node:
-                yield from self._iter_lists(value)
-
-    def _score_mark_list(self, items: list[Dict[str, Any]]) -> int:
-        score = 0
-        for item in items:
-            for key in item.keys():
-                if self._is_mark_key(key):
-                    score += 1
-        return score
-
-    def _summarize_mark_list(self, items: list[Dict[str, Any]]) -> tuple[int, int]:
-        platform_count = 0
-        mark_count = 0
-        for item in items:
-            entry_count = self._extract_entry_count(item)
-            if entry_count is None:
-                if not self._entry_is_marked(item):
-                    continue
-                entry_count = 1
-            if entry_count > 0:
-                platform_count += 1
-                mark_count += entry_count
-        return platform_count, mark_count
-
-    def _extract_entry_count(self, entry: Dict[str, Any]) -> Optional[int]:
-        has_context = any(self._is_mark_key(key) for key in entry.keys())
-        for key, value in entry.items():
-            key_lower = key.lower()
-            if not has_context and not self._is_mark_key(key):
-                continue
-            if self._is_mark_key(key) or any(part in key_lower for part in ("count", "num", "times")):
-                count = self._extract_int(value)
-                if count is not None:
-                    return count
-        return None
-
-    def _entry_is_marked(self, entry: Dict[str, Any]) -> bool:
-        has_context = any(self._is_mark_key(key) for key in entry.keys())
-        for key, value in entry.items():
-            key_lower = key.lower()
-            if self._is_mark_key(key) or (has_context and key_lower in {"status", "state", "flag"}):
-                if self._value_is_marked(value):
-                    return True
-        return False
-
-    def _is_mark_key(self, key: str) -> bool:
-        key_lower = key.lower()
-        return "mark" in key_lower or "tag" in key_lower or "\u6807\u8bb0" in key
-
-    def _value_is_marked(self, value: Any) -> bool:
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, (int, float)):
-            return value > 0
-        if isinstance(value, str):
-            text = value.strip()
-            if not text:
-                return False
-            number = self._extract_int(text)
-            if number is not None:
-                return number > 0
-            if "\u672a\u6807\u8bb0" in text:
-                return False
-            if text.lower() in {"1", "true", "yes", "y", "marked"}:
-                return True
-            if "\u5df2\u6807\u8bb0" in text or "\u6807\u8bb0" in text:
-                return True
-        return False
+        key = quota_key(self._proxy_info)
+        used, _ = get_state().quota(key)
+        if used < allowed:
+            return
+        METRICS.inc("lanes.bulk.quota_reserved")
+        if PROXY_MODE != "api":
+            raise QuotaReserved(key, used, allowed)
+        self._logger.info("quota_reserved: proxy=%s used=%s allowed=%s", key, used, allowed)
+        self._proxy_manager.move_off("quota_reserved")
+        self._ensure_session()
 
-    def _extract_int(self, value: Any) -> Optional[int]:
-        if isinstance(value, bool):
-            return int(value)
-        if isinstance(value, (int, float)):
-            return int(value)
-        if isinstance(value, str):
-            match = re.search(r"\d+", value)
-            if match:
-                return int(match.group(0))
-        return None
-
-    def query(self, code: str, captcha: Optional[str] = None) -> SpiderResult:
+    def _query(self, code: str, captcha: Optional[str]) -> SpiderResult:
         last_error: Optional[str] = None
         attempts = 0
-        proxy_failures = 0
-        max_proxy_failures = max(3, CAPTCHA_MAX_TRIES * 2)
+        run = RETRIES.start()
+        action: Optional[str] = None
+        cap: Optional[CaptchaResult] = None
         self._logger.info("query_start: code=%s", code)
+        self._upstream.before()
         refresh_proxy = True
         if PROXY_ROTATE_EACH_REQUEST and self._proxy_manager.enabled():
             self._proxy_manager.rotate("per_request")
             self._warmed = False
-        while attempts < CAPTCHA_MAX_TRIES:
+        while attempts < RETRIES.max_attempts():
+            self._deadline.check("attempt")
             self._ensure_session(refresh_proxy=refresh_proxy)
             refresh_proxy = False
+            self._check_quota_reserve()
             try:
                 self.warm_up()
                 attempt_no = attempts + 1
@@ -420,20 +457,32 @@ class SpiderService:
                         len(text),
                         attempt_no,
                     )
+                elif action == REOCR and cap is not None and cap.alternatives:
+                    # Same captcha, next best reading; nothing is fetched.
+                    text, variant = cap.alternatives.pop(0)
+                    cap.text = text
+                    cap.variant = variant
+                    self._logger.info("captcha_reocr: text=%s variant=%s attempt=%s", text, variant, attempt_no)
                 else:
-                    cap = self.get_captcha()
+                    cap = self._take_prefetched() or self.get_captcha()
                     text = cap.text
             except requests.RequestException as exc:
+                self._deadline.check("captcha")
                 if self._is_proxy_error(exc) and self._proxy_manager.enabled():
-                    proxy_failures += 1
+                    # Counted against this proxy (PROXY_STATS, rotation), not the upstream
+                    # circuit: a few dead proxies must not fail every caller with 503.
                     last_error = "proxy_error"
                     self._logger.warning("proxy_error: %s", exc)
-                    self._reset_session()
-                    self._proxy_manager.rotate("proxy_error")
-                    refresh_proxy = True
-                    if proxy_failures >= max_proxy_failures:
+                    # Still stop early if other queries have opened the upstream circuit meanwhile.
+                    self._upstream.before()
+                    action = self._next_action(run, PROXY_ERROR)
+                    if action == GIVE_UP:
+                        break
+                    refresh_proxy = self._apply_action(action, PROXY_ERROR)
+                    if RETRIES.exhausted(run):
                         break
                     continue
+                self._upstream.failure(type(exc).__name__)
                 raise
             attempts = attempt_no
             if not is_valid(text):
@@ -444,54 +493,104 @@ class SpiderService:
                     len(text),
                     attempt_no,
                 )
+                action = self._next_action(run, CAPTCHA_INVALID, cap)
+                if action == GIVE_UP:
+                    break
+                refresh_proxy = self._apply_action(action, CAPTCHA_INVALID)
                 continue
             payload = self._build_payload(code, text)
+            permit = LIMITS.acquire(
+                quota_key(self._proxy_info) if self._proxy_info is not None else None,
+                self._deadline.remaining(),
+            )
+            if permit is None:
+                self._deadline.check("limiter")
+                raise DeadlineExceeded("limiter")
             try:
                 resp = self._send_query(payload)
             except requests.RequestException as exc:
+                if self._deadline.expired():
+                    permit.release("cancelled")
+                    self._deadline.check("submit")
+                permit.release("error")
                 if self._is_proxy_error(exc) and self._proxy_manager.enabled():
-                    proxy_failures += 1
+                    # Counted against this proxy (PROXY_STATS, rotation), not the upstream
+                    # circuit: a few dead proxies must not fail every caller with 503.
                     last_error = "proxy_error"
                     self._logger.warning("proxy_error: %s", exc)
-                    self._reset_session()
-                    self._proxy_manager.rotate("proxy_error")
-                    refresh_proxy = True
-                    if proxy_failures >= max_proxy_failures:
+                    # Still stop early if other queries have opened the upstream circuit meanwhile.
+                    self._upstream.before()
+                    action = self._next_action(run, PROXY_ERROR)
+                    if action == GIVE_UP:
+                        break
+                    refresh_proxy = self._apply_action(action, PROXY_ERROR)
+                    if RETRIES.exhausted(run):
                         break
                     continue
+                self._upstream.failure(type(exc).__name__)
                 raise
-            self._logger.info(
-                "query_response: status=%s attempt=%s",
-                resp.status_code,
-                attempt_no,
-            )
-            if self._is_captcha_error(resp):
+            except DeadlineExceeded:
+                permit.release("cancelled")
+                raise
+            except BaseException:
+                permit.release("error")
+                raise
+            verdict = None
+            try:
+                self._logger.info(
+                    "query_response: status=%s attempt=%s",
+                    resp.status_code,
+                    attempt_no,
+                )
+                parsed = self._parse_response(resp)
+                if isinstance(parsed.get("data"), dict):
+                    upstream_status = parsed["data"].get("status")
+                    upstream_msg = parsed["data"].get("msg")
+                    if upstream_status is not None or upstream_msg is not None:
+                        self._logger.info(
+                            "query_payload: status=%s msg=%s",
+                            upstream_status,
+                            upstream_msg,
+                        )
+                verdict = CLASSIFIER.classify(resp.status_code, parsed["data"], parsed["text"])
+            finally:
+                # A parse or classify failure must not leave the permit holding a limiter slot.
+                permit.release(verdict.outcome if verdict is not None else "error")
+            self._proxy_errors = 0
+            if self._proxy_info is not None:
+                PROXY_STATS.record(self._proxy_info, verdict.outcome)
+            if verdict.outcome == UNKNOWN and resp.status_code >= 500:
+                self._upstream.failure(f"http_{resp.status_code}")
+            else:
+                self._upstream.success()
+            if cap is not None and verdict.outcome in (SUCCESS, CAPTCHA_REJECTED):
+                label_captcha(cap.image_bytes, cap.text, cap.variant, verdict.outcome == SUCCESS)
+            if verdict.outcome == CAPTCHA_REJECTED:
                 last_error = "captcha_rejected"
-                self._logger.info("captcha_rejected: attempt=%s", attempt_no)
+                self._logger.info("captcha_rejected: match=%s attempt=%s", verdict.matched, attempt_no)
+                action = self._next_action(run, CAPTCHA_REJECTED, cap)
+                if action == GIVE_UP:
+                    break
+                refresh_proxy = self._apply_action(action, CAPTCHA_REJECTED)
                 continue
-            parsed = self._parse_response(resp)
-            if isinstance(parsed.get("data"), dict):
-                upstream_status = parsed["data"].get("status")
-                upstream_msg = parsed["data"].get("msg")
-                if upstream_status is not None or upstream_msg is not None:
-                    self._logger.info(
-                        "query_payload: status=%s msg=%s",
-                        upstream_status,
-                        upstream_msg,
-                    )
-                if self._matches_hint(upstream_msg, CAPTCHA_ERROR_HINTS):
-                    last_error = "captcha_rejected"
-                    self._logger.info("captcha_rejected: msg=%s attempt=%s", upstream_msg, attempt_no)
-                    continue
-                limit_hit = self._matches_hint(upstream_msg, PROXY_LIMIT_HINTS)
-                if not limit_hit and PROXY_LIMIT_STATUSES:
-                    try:
-                        status_int = int(upstream_status)
-                    except (TypeError, ValueError):
-                        status_int = None
-                    if status_int in PROXY_LIMIT_STATUSES:
-                        limit_hit = True
-                if PROXY_ROTATE_ON_LIMIT and limit_hit:
+            if verdict.outcome == BLOCKED:
+                last_error = "blocked"
+                self._logger.warning("query_blocked: match=%s attempt=%s", verdict.matched, attempt_no)
+                action = self._next_action(run, BLOCKED)
+                if action == GIVE_UP:
+                    break
+                refresh_proxy = self._apply_action(action, BLOCKED)
+                if RETRIES.exhausted(run):
+                    break
+                continue
+            # The captcha got through, which is all the retry was for.
+            RETRIES.outcome(run, True)
+            action = None
+            if verdict.outcome == LIMIT_REACHED:
+                METRICS.inc("proxy.limit_hits")
+                if self._proxy_info is not None:
+                    get_state().mark_limited(quota_key(self._proxy_info))
+                if PROXY_ROTATE_ON_LIMIT:
                     last_error = "limit_reached"
                     if PROXY_RELEASE_ON_LIMIT:
                         self._proxy_manager.release_current("limit_hint")
@@ -500,6 +599,8 @@ class SpiderService:
                     refresh_proxy = True
                     continue
             self._apply_mark_summary(parsed)
+            if self._proxy_info is not None:
+                get_state().record_use(quota_key(self._proxy_info))
             return SpiderResult(
                 ok=resp.ok,
                 status_code=resp.status_code,
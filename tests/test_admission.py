@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.core.admission import AdmissionController, AdmissionRejected
+
+
+class _Request:
+    def __init__(self, gone: bool = False) -> None:
+        self.gone = gone
+
+    async def is_disconnected(self) -> bool:
+        return self.gone
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_queue_full_is_429_and_queue_timeout_is_503():
+    async def scenario():
+        admission = AdmissionController(1, max_queue=1, max_wait=0.05, enabled=True)
+        async with admission.slot(_Request()):
+            waiter = asyncio.ensure_future(admission.slot(_Request()).__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(AdmissionRejected) as full:
+                async with admission.slot(_Request()):
+                    pass
+            with pytest.raises(AdmissionRejected) as timeout:
+                await waiter
+        return full.value, timeout.value, admission.snapshot()
+
+    full, timeout, snapshot = _run(scenario())
+    assert (full.reason, full.status_code) == ("queue_full", 429)
+    assert (timeout.reason, timeout.status_code) == ("queue_timeout", 503)
+    assert full.retry_after >= 1
+    assert (snapshot["active"], snapshot["queued"]) == (0, 0)
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    async def scenario():
+        admission = AdmissionController(1, max_queue=4, max_wait=5, enabled=True)
+        order = []
+
+        async def _query(name):
+            async with admission.slot(_Request()):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.ensure_future(_query("first"))
+        await asyncio.sleep(0)
+        rest = [asyncio.ensure_future(_query(name)) for name in ("second", "third")]
+        await asyncio.gather(first, *rest)
+        return order, admission.snapshot()
+
+    order, snapshot = _run(scenario())
+    assert order == ["first", "second", "third"]
+    assert (snapshot["active"], snapshot["queued"]) == (0, 0)
+
+
+def test_disconnected_waiter_is_dropped():
+    async def scenario():
+        admission = AdmissionController(1, max_queue=4, max_wait=5, enabled=True)
+        async with admission.slot(_Request()):
+            with pytest.raises(AdmissionRejected) as gone:
+                async with admission.slot(_Request(gone=True)):
+                    pass
+        return gone.value, admission.snapshot()
+
+    gone, snapshot = _run(scenario())
+    assert (gone.reason, gone.status_code) == ("disconnected", 499)
+    assert (snapshot["active"], snapshot["queued"]) == (0, 0)
+
+
+def test_disabled_admits_everything():
+    async def scenario():
+        admission = AdmissionController(1, max_queue=0, enabled=False)
+        async with admission.slot(_Request()):
+            async with admission.slot(_Request()):
+                return True
+
+    assert _run(scenario())
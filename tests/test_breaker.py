@@ -0,0 +1,88 @@
+import pytest
+import requests
+
+from src.core import breaker as breaker_module
+from src.core.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, breaker
+from src.services.spider import SpiderService
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(breaker_module, "time", clock)
+    monkeypatch.setattr(breaker_module.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    circuit = CircuitBreaker("t1", failures=3, backoff=10, backoff_max=40, enabled=True)
+    circuit.failure()
+    circuit.failure()
+    circuit.success()
+    circuit.failure()
+    circuit.failure()
+    assert circuit.state == CLOSED
+    circuit.failure()
+    assert circuit.state == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        circuit.before()
+    assert raised.value.retry_after == 10
+
+
+def test_half_open_lets_one_probe_through(clock):
+    circuit = CircuitBreaker("t2", failures=1, backoff=10, backoff_max=40, enabled=True)
+    circuit.failure()
+    clock.now += 10
+    circuit.before()
+    assert circuit.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit.before()
+    circuit.success()
+    assert circuit.state == CLOSED
+    circuit.before()
+
+
+def test_failed_probe_doubles_backoff_up_to_max(clock):
+    circuit = CircuitBreaker("t3", failures=1, backoff=10, backoff_max=15, enabled=True)
+    circuit.failure()
+    for expected in (15, 15):
+        clock.now += 100
+        circuit.before()
+        circuit.failure()
+        assert circuit.state == OPEN
+        assert circuit.snapshot()["retry_in_s"] == expected
+
+
+def test_stale_probe_is_replaced(clock):
+    circuit = CircuitBreaker("t4", failures=1, backoff=10, backoff_max=40, enabled=True)
+    circuit.failure()
+    clock.now += 10
+    circuit.before()
+    clock.now += 11
+    circuit.before()
+
+
+def test_proxy_errors_do_not_trip_the_upstream_circuit(monkeypatch):
+    spider = SpiderService("t")
+    monkeypatch.setattr(spider._proxy_manager, "enabled", lambda: True)
+    monkeypatch.setattr(spider._proxy_manager, "rotate", lambda reason: None)
+    monkeypatch.setattr(spider, "_ensure_session", lambda refresh_proxy=True: None)
+
+    def dead_proxy() -> None:
+        raise requests.exceptions.ProxyError("dead proxy")
+
+    monkeypatch.setattr(spider, "warm_up", dead_proxy)
+    upstream = breaker("query")
+    before = upstream.snapshot()["failures"]
+    result = spider.query("13800000000")
+    assert result.error == "proxy_error"
+    assert upstream.state == CLOSED
+    assert upstream.snapshot()["failures"] == before
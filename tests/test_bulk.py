@@ -0,0 +1,101 @@
+import io
+import json
+import sys
+import threading
+
+from src.services.bulk import BulkRunner, Checkpoint, iter_phone_records
+from src.services.spider import SpiderResult
+
+
+def _result(ok: bool = True, error=None) -> SpiderResult:
+    return SpiderResult(ok=ok, status_code=200, captcha=None, attempts=1, data=None, text=None, error=error)
+
+
+class _Pool:
+    def __init__(self, fail=()) -> None:
+        self.fail = set(fail)
+        self.queried = []
+        self._lock = threading.Lock()
+
+    def query(self, phone, lane=None):
+        with self._lock:
+            self.queried.append(phone)
+        return _result(False, "blocked") if phone in self.fail else _result()
+
+
+def test_records_fold_blank_lines_and_resume_mid_file():
+    data = b"\xef\xbb\xbf111\n\n222\r\n333"
+    records = list(iter_phone_records(io.BytesIO(data)))
+    assert [phone for _, phone, _ in records] == ["111", "222", "333"]
+    # Consecutive spans touch, so a checkpoint offset is always a record start.
+    assert all(records[i][2] == records[i + 1][0] for i in range(len(records) - 1))
+    assert [phone for _, phone, _ in iter_phone_records(io.BytesIO(data), records[1][0])] == ["222", "333"]
+
+
+def test_advance_only_moves_over_contiguous_finished_records(tmp_path):
+    runner = BulkRunner("-", tmp_path / "out.jsonl")
+    checkpoint = Checkpoint()
+    runner._finished[10] = (20, 100, None)
+    runner._advance(checkpoint, 200)
+    # Record 0..10 is still in flight: nothing moves, output_size stays before record 10's line.
+    assert (checkpoint.offset, checkpoint.done, checkpoint.output_size) == (0, 0, 100)
+    runner._finished[0] = (10, 150, "blocked")
+    runner._advance(checkpoint, 250)
+    assert (checkpoint.offset, checkpoint.done, checkpoint.ok) == (20, 2, 1)
+    assert checkpoint.errors == {"blocked": 1}
+    assert checkpoint.output_size == 250
+
+
+def test_run_checkpoints_and_resumes_without_requerying(tmp_path):
+    source = tmp_path / "phones.txt"
+    source.write_bytes(b"".join(f"1380000{i:04d}\n".encode() for i in range(20)))
+    output = tmp_path / "out.jsonl"
+    pool = _Pool(fail={"13800000003"})
+    checkpoint = BulkRunner(str(source), output, concurrency=3, progress_every=0).run(pool)
+    assert (checkpoint.done, checkpoint.ok, checkpoint.errors) == (20, 19, {"blocked": 1})
+    assert checkpoint.offset == source.stat().st_size
+    assert checkpoint.output_size == output.stat().st_size
+
+    # Simulate a crash: the checkpoint is at record 5, but records 5 and 7 were already written.
+    lines = output.read_bytes().splitlines(keepends=True)
+    by_offset = {json.loads(line)["offset"]: line for line in lines}
+    offsets = sorted(by_offset)
+    kept = b"".join(by_offset[offset] for offset in offsets[:5])
+    output.write_bytes(kept + by_offset[offsets[7]] + by_offset[offsets[5]])
+    Checkpoint(offset=offsets[5], output_size=len(kept), done=5, ok=5).save(output.with_name(output.name + ".ckpt"))
+
+    pool = _Pool()
+    checkpoint = BulkRunner(str(source), output, concurrency=3, progress_every=0).run(pool)
+    assert sorted(pool.queried) == [f"1380000{i:04d}" for i in range(20) if i not in (5, 7) and i >= 5]
+    assert (checkpoint.done, checkpoint.ok) == (20, 20)
+    phones = [json.loads(line)["phone"] for line in output.read_bytes().splitlines()]
+    assert sorted(phones) == [f"1380000{i:04d}" for i in range(20)]
+
+
+def test_resume_drops_a_partial_last_line(tmp_path):
+    source = tmp_path / "phones.txt"
+    source.write_bytes(b"".join(f"1380000{i:04d}\n".encode() for i in range(6)))
+    output = tmp_path / "out.jsonl"
+    BulkRunner(str(source), output, progress_every=0).run(_Pool())
+    lines = output.read_bytes().splitlines(keepends=True)
+    by_offset = {json.loads(line)["offset"]: line for line in lines}
+    offsets = sorted(by_offset)
+    kept = b"".join(by_offset[offset] for offset in offsets[:3])
+    # Crash mid-write: record 3 made it out whole, record 4 only halfway.
+    output.write_bytes(kept + by_offset[offsets[3]] + by_offset[offsets[4]][:10])
+    Checkpoint(offset=offsets[3], output_size=len(kept), done=3, ok=3).save(output.with_name(output.name + ".ckpt"))
+
+    pool = _Pool()
+    checkpoint = BulkRunner(str(source), output, progress_every=0).run(pool)
+    assert sorted(pool.queried) == ["13800000004", "13800000005"]
+    assert (checkpoint.done, checkpoint.ok) == (6, 6)
+    phones = [json.loads(line)["phone"] for line in output.read_bytes().splitlines()]
+    assert sorted(phones) == [f"1380000{i:04d}" for i in range(6)]
+
+
+def test_stdin_input_is_left_open(tmp_path, monkeypatch):
+    stdin = io.TextIOWrapper(io.BytesIO(b"13800000000\n"))
+    monkeypatch.setattr(sys, "stdin", stdin)
+    checkpoint = BulkRunner("-", tmp_path / "out.jsonl", progress_every=0).run(_Pool())
+    assert checkpoint.done == 1
+    assert not stdin.buffer.closed
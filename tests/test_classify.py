@@ -0,0 +1,34 @@
+from src.core.classify import BLOCKED, CAPTCHA_REJECTED, LIMIT_REACHED, SUCCESS, UNKNOWN, ResponseClassifier
+
+
+def _classifier():
+    return ResponseClassifier(
+        hints={CAPTCHA_REJECTED: ["验证码错误"], LIMIT_REACHED: ["已达上限"], BLOCKED: ["forbidden"]},
+        statuses={CAPTCHA_REJECTED: [2], LIMIT_REACHED: [9]},
+        http_statuses={BLOCKED: [403]},
+        fields=("msg", "message"),
+    )
+
+
+def test_success_and_unknown_without_rules():
+    classifier = _classifier()
+    assert classifier.classify(200, {"msg": "ok", "data": []}, None).outcome == SUCCESS
+    assert classifier.classify(502, None, "bad gateway").outcome == UNKNOWN
+
+
+def test_hints_only_read_configured_fields():
+    classifier = _classifier()
+    result = classifier.classify(200, {"message": "当天查询次数已达上限"}, None)
+    assert (result.outcome, result.matched) == (LIMIT_REACHED, "已达上限")
+    # Hint text inside result data is not a verdict.
+    assert classifier.classify(200, {"msg": "ok", "data": "已达上限"}, None).outcome == SUCCESS
+    assert classifier.classify(200, None, "Forbidden by WAF").outcome == BLOCKED
+
+
+def test_precedence_between_statuses_and_hints():
+    classifier = _classifier()
+    # Captcha rejection outranks a daily limit or a block, whatever signalled it.
+    assert classifier.classify(403, {"status": 2}, None).outcome == CAPTCHA_REJECTED
+    assert classifier.classify(200, {"status": 9, "msg": "验证码错误"}, None).outcome == CAPTCHA_REJECTED
+    assert classifier.classify(403, {"status": "9"}, None).outcome == LIMIT_REACHED
+    assert classifier.classify(403, {"status": "x"}, None).matched == "http_status=403"
@@ -0,0 +1,96 @@
+import sqlite3
+import time
+
+import pytest
+
+from src.services.jobs import JobStore
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "jobs.db"
+
+
+def _store(db, node_id, lease=30.0):
+    store = JobStore(db, node_id=node_id, lease=lease)
+    store.heartbeat()
+    return store
+
+
+def _age(db, **columns):
+    # Moves lease/heartbeat timestamps into the past instead of sleeping.
+    conn = sqlite3.connect(str(db))
+    past = time.time() - 3600
+    if "lease" in columns:
+        conn.execute("UPDATE job_items SET lease_until = ? WHERE owner = ?", (past, columns["lease"]))
+    if "node" in columns:
+        conn.execute("UPDATE job_nodes SET last_seen = ? WHERE id = ?", (past, columns["node"]))
+    conn.commit()
+    conn.close()
+
+
+def test_claim_finish_records_once(db):
+    store = _store(db, "a")
+    job = store.create(["1", "2"])
+    first = store.claim()
+    second = store.claim()
+    assert {first.seq, second.seq} == {0, 1}
+    assert store.claim() is None
+    assert store.finish(first, True, {"ok": True})
+    assert not store.finish(first, True, {"ok": True})
+    assert store.finish(second, False, {"ok": False})
+    info = store.get(job.id)
+    assert (info.status, info.done, info.failed) == ("completed", 1, 1)
+
+
+def test_expired_lease_is_redelivered_and_late_result_dropped(db):
+    a = _store(db, "a")
+    b = _store(db, "b")
+    job = a.create(["1"])
+    item = a.claim()
+    assert b.claim() is None
+    _age(db, lease="a")
+    taken = b.claim()
+    assert (taken.job_id, taken.seq) == (item.job_id, item.seq)
+    assert not a.finish(item, True, {"ok": True})
+    assert b.finish(taken, True, {"ok": True})
+    assert a.get(job.id).done == 1
+
+
+def test_recover_leaves_live_nodes_alone(db):
+    a = _store(db, "host:1:aaaaaa")
+    a.create(["1"])
+    item = a.claim()
+    # A sibling starting on the same host must not take over A's in-flight item.
+    b = _store(db, "host:2:bbbbbb")
+    assert b.recover() == 0
+    assert b.claim() is None
+    assert a.finish(item, True, {"ok": True})
+
+
+def test_recover_requeues_items_of_dead_nodes(db):
+    a = _store(db, "a")
+    a.create(["1"])
+    a.claim()
+    _age(db, node="a")
+    b = _store(db, "b")
+    assert b.recover() == 1
+    assert b.claim() is not None
+
+
+def test_release_only_by_owner_and_max_attempts(db, monkeypatch):
+    monkeypatch.setattr("src.services.jobs.JOB_MAX_ATTEMPTS", 2)
+    a = _store(db, "a")
+    b = _store(db, "b")
+    job = a.create(["1"])
+    item = a.claim()
+    b.release(item)
+    assert b.claim() is None
+    _age(db, lease="a")
+    assert b.claim() is not None
+    _age(db, lease="b")
+    # Two claims used up: the third claimer fails it instead of passing it on.
+    assert a.claim() is None
+    info = a.get(job.id)
+    assert (info.status, info.failed) == ("completed", 1)
+    assert a.results(job.id)[0].result == {"ok": False, "error": "max_attempts"}
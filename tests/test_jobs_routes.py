@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.routes.jobs import router
+from src.services.jobs import JobRunner, JobStore
+
+
+class _Runner:
+    def notify(self) -> None:
+        pass
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+    app.include_router(router)
+    app.state.job_store = JobStore(tmp_path / "jobs.db", node_id="test")
+    app.state.job_runner = _Runner()
+    return TestClient(app)
+
+
+def test_json_and_csv_bodies(client):
+    response = client.post("/jobs", json={"phones": ["13800000000", " "]})
+    assert response.status_code == 202 and response.json()["total"] == 1
+    response = client.post("/jobs", content=b"phone\n13800000000\n13800000001\n", headers={"content-type": "text/csv"})
+    assert response.status_code == 202 and response.json()["total"] == 2
+
+
+def test_multipart_upload_reads_the_file(client):
+    files = {"file": ("phones.csv", b"phone,name\n13800000000,a\n13800000001,b\n", "text/csv")}
+    response = client.post("/jobs", files=files, data={"note": "batch 2024"})
+    assert response.status_code == 202
+    assert response.json()["total"] == 2
+
+
+def test_multipart_without_file_and_unknown_types(client):
+    response = client.post("/jobs", files={"other": ("x.txt", b"1", "text/plain")})
+    assert response.status_code == 400
+    response = client.post("/jobs", content=b"13800000000", headers={"content-type": "application/octet-stream"})
+    assert response.status_code == 415
+
+
+class _FlakyStore:
+    node_id = "flaky"
+    lease = 30.0
+
+    def __init__(self) -> None:
+        self.claims = 0
+
+    def heartbeat(self, done: int = 0) -> int:
+        return 0
+
+    def recover(self) -> int:
+        return 0
+
+    def claim(self):
+        self.claims += 1
+        if self.claims <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        return None
+
+
+def test_runner_survives_claim_errors():
+    store = _FlakyStore()
+    runner = JobRunner(store, pool=None, workers=1, idle_wait=0.01)
+    runner.start()
+    deadline = time.monotonic() + 5
+    while store.claims < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    runner.stop(timeout=1)
+    assert store.claims >= 4
+    assert not any(thread.is_alive() for thread in threading.enumerate() if thread.name.startswith("job-worker"))
@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+from src.core.lanes import BULK, INTERACTIVE, LaneScheduler, lane_scheduler
+
+
+def test_stride_splits_grants_by_weight():
+    scheduler = LaneScheduler(["s"], {INTERACTIVE: 3.0, BULK: 1.0}, {INTERACTIVE: 1, BULK: 1})
+    held = scheduler.acquire(INTERACTIVE)
+    order = []
+    lock = threading.Lock()
+
+    def worker(lane):
+        item = scheduler.acquire(lane, timeout=5)
+        with lock:
+            order.append(lane)
+        scheduler.release(lane, item)
+
+    threads = [threading.Thread(target=worker, args=(lane,)) for lane in [INTERACTIVE] * 6 + [BULK] * 2]
+    for thread in threads:
+        thread.start()
+    while sum(lane["waiting"] for lane in scheduler.snapshot().values()) < len(threads):
+        pass
+    scheduler.release(INTERACTIVE, held)
+    for thread in threads:
+        thread.join()
+    # 3:1 weights: one bulk grant per three interactive ones while both lanes wait.
+    assert order[:4].count(BULK) == 1
+    assert order[:8].count(BULK) == 2
+
+
+def test_lane_limit_and_timeout():
+    scheduler = LaneScheduler(["a", "b"], {INTERACTIVE: 1.0, BULK: 1.0}, {INTERACTIVE: 2, BULK: 1})
+    assert scheduler.acquire(BULK) is not None
+    assert scheduler.acquire(BULK, timeout=0.05) is None
+    assert scheduler.acquire(INTERACTIVE, timeout=0.05) is not None
+    assert scheduler.snapshot()[BULK]["waiting"] == 0
+
+
+def test_borrow_only_when_nobody_waits():
+    scheduler = LaneScheduler(["a"], {INTERACTIVE: 1.0, BULK: 1.0}, {INTERACTIVE: 1, BULK: 1})
+    item = scheduler.borrow()
+    assert item == "a" and scheduler.borrow() is None
+    scheduler.restore(item)
+    assert scheduler.idle() == 1
+
+
+@pytest.mark.parametrize(
+    "size,interactive,bulk_limit",
+    [(1, True, 1), (2, True, 1), (4, True, 3), (8, True, 6), (1, False, 1), (4, False, 4)],
+)
+def test_bulk_limit_keeps_an_interactive_session(size, interactive, bulk_limit):
+    scheduler = lane_scheduler(list(range(size)), interactive=interactive)
+    assert scheduler.snapshot()[BULK]["limit"] == bulk_limit
+
+
+def test_single_session_pool_runs_bulk_only_when_interactive_is_idle():
+    # Jobs still make progress on a one-session server pool.
+    assert lane_scheduler(["only"]).acquire(BULK, timeout=0.05) == "only"
+    # Weighted so stride alone would pick bulk: only yielding keeps interactive first.
+    scheduler = LaneScheduler(
+        ["only"], {INTERACTIVE: 0.1, BULK: 10.0}, {INTERACTIVE: 1, BULK: 1}, yielding=[BULK]
+    )
+    item = scheduler.acquire(INTERACTIVE)
+    scheduler.release(INTERACTIVE, item)
+    item = scheduler.acquire(BULK)
+    granted = []
+
+    def worker(lane):
+        granted.append((lane, scheduler.acquire(lane, timeout=5)))
+
+    bulk = threading.Thread(target=worker, args=(BULK,))
+    bulk.start()
+    while scheduler.snapshot()[BULK]["waiting"] < 1:
+        pass
+    interactive = threading.Thread(target=worker, args=(INTERACTIVE,))
+    interactive.start()
+    while scheduler.snapshot()[INTERACTIVE]["waiting"] < 1:
+        pass
+    scheduler.release(BULK, item)
+    interactive.join()
+    assert granted == [(INTERACTIVE, "only")]
+    scheduler.release(INTERACTIVE, "only")
+    bulk.join()
+    assert granted[1] == (BULK, "only")
+
+
+def test_bulk_rank_runs_outside_the_scheduler_lock():
+    scores = {"a": 1.0, "b": 3.0, "c": 2.0}
+    held = []
+
+    def rank(item):
+        # Another thread must be able to take the lock while a score is computed (e.g. a SQLite read).
+        probe = []
+
+        def _probe():
+            taken = scheduler._cond.acquire(timeout=1)
+            if taken:
+                scheduler._cond.release()
+            probe.append(taken)
+
+        thread = threading.Thread(target=_probe)
+        thread.start()
+        thread.join()
+        held.append(not probe[0])
+        return scores[item]
+
+    scheduler = LaneScheduler(["a", "b", "c"], {INTERACTIVE: 1.0, BULK: 1.0}, {INTERACTIVE: 3, BULK: 3}, {BULK: rank})
+    assert scheduler.acquire(BULK) == "b"
+    assert scheduler.acquire(BULK) == "c"
+    assert held and not any(held)
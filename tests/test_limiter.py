@@ -0,0 +1,73 @@
+import pytest
+import requests
+
+from src.core.lanes import BULK, INTERACTIVE, lane_scheduler
+from src.core.limiter import AdaptiveLimits, AIMDLimiter
+from src.services import spider as spider_module
+from src.services.spider import SpiderService
+
+
+def test_aimd_grows_on_success_and_halves_once_per_episode():
+    limiter = AIMDLimiter("test", initial=2, floor=1, ceiling=4, gauges=False)
+    for _ in range(6):
+        limiter.release(limiter.enter(), "success")
+    assert limiter.limit == 4
+    first = limiter.enter()
+    second = limiter.enter()
+    limiter.release(first, "error")
+    # Started before the cut: the same congestion episode, counted once.
+    limiter.release(second, "blocked")
+    assert limiter.limit == 2
+    assert limiter.inflight == 0
+
+
+def test_bound_caps_the_global_limit_at_the_pool_size():
+    limits = AdaptiveLimits(enabled=True)
+    limits.bound(3)
+    for _ in range(50):
+        permit = limits.acquire(None)
+        permit.release("success")
+    assert limits.capacity() == 3
+    assert AdaptiveLimits(enabled=False).capacity() is None
+
+
+def test_capacity_gates_borrows_and_keeps_interactive_reserve():
+    cap = {"value": 2}
+    lanes = lane_scheduler(list("abcd"), capacity=lambda: cap["value"])
+    assert lanes.acquire(BULK, 0) is not None
+    # Bulk may hold 3 of 4 sessions; with only 2 admitted it keeps one free for interactive.
+    assert lanes.acquire(BULK, 0) is None
+    taken = lanes.acquire(INTERACTIVE, 0)
+    assert taken is not None
+    assert lanes.acquire(INTERACTIVE, 0) is None
+    # A grown limit is picked up at the next release.
+    cap["value"] = 4
+    lanes.release(INTERACTIVE, taken)
+    assert lanes.acquire(BULK, 0) is not None
+    assert lanes.acquire(BULK, 0) is not None
+    assert lanes.acquire(BULK, 0) is None
+    assert lanes.acquire(INTERACTIVE, 0) is not None
+
+
+def test_bulk_only_pool_follows_the_limit():
+    lanes = lane_scheduler(list("abc"), interactive=False, capacity=lambda: 1)
+    assert lanes.acquire(BULK, 0) is not None
+    assert lanes.acquire(BULK, 0) is None
+
+
+def test_query_releases_its_permit_when_the_response_cannot_be_parsed(monkeypatch):
+    limits = AdaptiveLimits(enabled=True)
+    monkeypatch.setattr(spider_module, "LIMITS", limits)
+    monkeypatch.setattr(spider_module, "is_valid", lambda text: True)
+    spider = SpiderService()
+    spider._warmed = True
+    monkeypatch.setattr(spider, "_ensure_session", lambda refresh_proxy=True: None)
+    monkeypatch.setattr(spider, "_send_query", lambda payload: requests.Response())
+
+    def _broken(response):
+        raise RuntimeError("bad body")
+
+    monkeypatch.setattr(spider, "_parse_response", _broken)
+    with pytest.raises(RuntimeError):
+        spider.query("13800000000", captcha="abcd")
+    assert limits.global_limiter.inflight == 0
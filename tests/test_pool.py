@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+from src.core.deadline import Deadline, DeadlineExceeded
+from src.core.lanes import BULK
+from src.core.metrics import METRICS
+from src.services import pool as pool_module
+from src.services.pool import SpiderPool
+from src.services.spider import CaptchaResult, SpiderResult
+
+
+class _Spider:
+    # Class-level hooks: `gate` holds queries until set, `calls` counts upstream queries.
+    gate = None
+    calls = []
+
+    def __init__(self, slot: str = "") -> None:
+        self.slot = slot
+        self.captcha = None
+
+    def proxy_score(self) -> float:
+        return 0.0
+
+    def get_captcha(self) -> CaptchaResult:
+        self.captcha = f"c{self.slot}"
+        return CaptchaResult(text=self.captcha, image_bytes=b"")
+
+    def query(self, code, captcha=None, deadline=None, lane=None) -> SpiderResult:
+        _Spider.calls.append(lane)
+        if _Spider.gate is not None:
+            while not _Spider.gate.wait(0.005):
+                deadline.check("submit")
+        ok = captcha is None or captcha == self.captcha
+        return SpiderResult(
+            ok=ok, status_code=200, captcha=captcha, attempts=1, data={"slot": self.slot}, text=None, error=None
+        )
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pool_module, "SpiderService", _Spider)
+    monkeypatch.setattr(pool_module, "QUERY_HEDGE", False)
+    monkeypatch.setattr(pool_module, "RESULT_CACHE_TTL", 0)
+    monkeypatch.setattr(pool_module, "SINGLE_FLIGHT", True)
+    monkeypatch.setattr(_Spider, "gate", None)
+    monkeypatch.setattr(_Spider, "calls", [])
+    return SpiderPool(3)
+
+
+def _background(fn):
+    box = {}
+
+    def _run():
+        try:
+            box["result"] = fn()
+        except Exception as exc:
+            box["error"] = exc
+
+    thread = threading.Thread(target=_run)
+    thread.start()
+    return thread, box
+
+
+def _wait_calls(count):
+    deadline = time.monotonic() + 5
+    while len(_Spider.calls) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_manual_captcha_query_uses_the_session_that_fetched_it(pool):
+    text = pool.get_captcha().text
+    for _ in range(4):
+        # Busy OCR traffic rotates the idle order; the manual query still finds its session.
+        pool.query("13800000000")
+        result = pool.query("13800000000", captcha=text)
+        assert result.ok and result.data == {"slot": pool.manual.slot}
+
+
+def test_manual_query_waits_for_its_session_without_blocking_others(pool):
+    text = pool.get_captcha().text
+    results = []
+    with pool.acquire(want=pool.manual):
+        manual = threading.Thread(
+            target=lambda: results.append(pool.query("13800000000", captcha=text, deadline=Deadline.after_ms(5000)))
+        )
+        manual.start()
+        while pool.lanes()["interactive"]["waiting"] < 1:
+            pass
+        # An OCR query queued behind it still gets one of the other sessions.
+        other = pool.query("13800000001", deadline=Deadline.after_ms(1000))
+        assert other.ok and other.data["slot"] != pool.manual.slot
+        assert not results
+    manual.join(5)
+    assert results[0].ok and results[0].data == {"slot": pool.manual.slot}
+
+
+def test_follower_keeps_its_own_deadline(pool):
+    _Spider.gate = threading.Event()
+    leader, box = _background(lambda: pool.query("13800000000", deadline=Deadline.after_ms(5000)))
+    _wait_calls(1)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        pool.query("13800000000", deadline=Deadline.after_ms(50))
+    assert time.monotonic() - started < 1
+    _Spider.gate.set()
+    leader.join(5)
+    assert box["result"].ok and len(_Spider.calls) == 1
+
+
+def test_interactive_query_does_not_follow_a_bulk_call(pool):
+    _Spider.gate = threading.Event()
+    bulk, _ = _background(lambda: pool.query("13800000000", deadline=Deadline.after_ms(5000), lane=BULK))
+    _wait_calls(1)
+    interactive, box = _background(lambda: pool.query("13800000000", deadline=Deadline.after_ms(5000)))
+    _wait_calls(2)
+    assert _Spider.calls == [BULK, "interactive"]
+    _Spider.gate.set()
+    bulk.join(5)
+    interactive.join(5)
+    assert box["result"].ok
+
+
+def test_follower_retries_when_only_the_leader_ran_out_of_time(pool):
+    _Spider.gate = threading.Event()
+    retried = METRICS.counter("query.singleflight.retried")
+    followers = METRICS.counter("query.singleflight.followers")
+    leader, leader_box = _background(lambda: pool.query("13800000000", deadline=Deadline.after_ms(300)))
+    _wait_calls(1)
+    follower, box = _background(lambda: pool.query("13800000000", deadline=Deadline.after_ms(5000)))
+    while METRICS.counter("query.singleflight.followers") == followers:
+        time.sleep(0.001)
+    leader.join(5)
+    assert isinstance(leader_box["error"], DeadlineExceeded)
+    _wait_calls(2)
+    _Spider.gate.set()
+    follower.join(5)
+    assert box["result"].ok
+    assert METRICS.counter("query.singleflight.retried") == retried + 1
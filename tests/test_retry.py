@@ -0,0 +1,104 @@
+import pytest
+
+from src.core import retry as retry_module
+from src.core.retry import (
+    BLOCKED,
+    CAPTCHA_INVALID,
+    CAPTCHA_REJECTED,
+    GIVE_UP,
+    PROXY_ERROR,
+    REFETCH,
+    REOCR,
+    REWARM,
+    ROTATE,
+    RetryPolicy,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(retry_module, "time", clock)
+    return clock
+
+
+def test_fixed_rotates_on_every_proxy_error_until_exhausted(monkeypatch):
+    monkeypatch.setattr(retry_module, "CAPTCHA_MAX_TRIES", 2)
+    monkeypatch.setattr(retry_module, "PROXY_ROTATE_AFTER_ERRORS", 1)
+    policy = RetryPolicy(mode="fixed")
+    run = policy.start()
+    options = (REFETCH, REWARM, ROTATE)
+    for errors in range(1, 4):
+        assert policy.decide(run, PROXY_ERROR, options, proxy_errors=errors) == ROTATE
+        assert not policy.exhausted(run)
+    # max(3, 2 * CAPTCHA_MAX_TRIES) proxy failures: the last one still rotates, then the loop stops.
+    assert policy.decide(run, BLOCKED, options) == ROTATE
+    assert policy.exhausted(run)
+
+
+def test_fixed_rewarms_before_rotate_threshold(monkeypatch):
+    monkeypatch.setattr(retry_module, "PROXY_ROTATE_AFTER_ERRORS", 2)
+    policy = RetryPolicy(mode="fixed")
+    run = policy.start()
+    options = (REFETCH, REWARM, ROTATE)
+    assert policy.decide(run, PROXY_ERROR, options, proxy_errors=1) == REWARM
+    assert policy.decide(run, PROXY_ERROR, options, proxy_errors=2) == ROTATE
+    assert policy.decide(run, BLOCKED, options, proxy_errors=0) == ROTATE
+
+
+def test_fixed_refetches_captcha_and_gives_up_without_rotate():
+    policy = RetryPolicy(mode="fixed")
+    run = policy.start()
+    assert policy.decide(run, CAPTCHA_REJECTED, (REOCR, REFETCH)) == REFETCH
+    assert policy.decide(run, CAPTCHA_INVALID, (REFETCH,)) == REFETCH
+    assert policy.decide(run, PROXY_ERROR, (REFETCH, REWARM)) == GIVE_UP
+    assert not RetryPolicy(mode="learned").exhausted(run)
+
+
+def test_learned_picks_lowest_expected_cost_and_learns(clock):
+    policy = RetryPolicy(mode="learned", max_steps=50, budget=0, explore=0, decay=1.0, rotate_cost=0)
+    run = policy.start()
+    # Priors: reocr 0.2s / 0.3 beats refetch 0.5s / 0.6.
+    assert policy.decide(run, CAPTCHA_REJECTED, (REOCR, REFETCH)) == REOCR
+    for _ in range(10):
+        clock.now += 0.2
+        assert policy.decide(run, CAPTCHA_REJECTED, (REOCR, REFETCH)) in (REOCR, REFETCH)
+    table = policy.snapshot()["policy"][CAPTCHA_REJECTED]
+    assert table[REOCR]["p"] < 0.3
+    # Once reocr keeps failing, refetch becomes the cheaper bet.
+    assert table[REFETCH]["taken"] > 0
+
+
+def test_learned_outcome_updates_rate_and_cost(clock):
+    policy = RetryPolicy(mode="learned", explore=0, decay=1.0, rotate_cost=0)
+    run = policy.start()
+    assert policy.decide(run, BLOCKED, (REFETCH, REWARM, ROTATE)) == ROTATE
+    clock.now += 6.5
+    policy.outcome(run, True)
+    arm = policy.snapshot()["policy"][BLOCKED][ROTATE]
+    assert arm["p"] == pytest.approx((0.8 * 2 + 1) / 3, abs=1e-3)
+    assert arm["cost_s"] == pytest.approx(1.5 + (6.5 - 1.5) * 0.2, abs=1e-3)
+    # Scored once: a second outcome for the same run is ignored.
+    policy.outcome(run, False)
+    assert policy.snapshot()["policy"][BLOCKED][ROTATE]["p"] == arm["p"]
+
+
+def test_learned_gives_up_over_budget_and_steps(clock):
+    policy = RetryPolicy(mode="learned", max_steps=2, budget=10, explore=0, rotate_cost=0)
+    run = policy.start()
+    assert policy.decide(run, PROXY_ERROR, (REWARM, ROTATE), remaining=0.5) == GIVE_UP
+    run = policy.start()
+    clock.now += 9.5
+    assert policy.decide(run, PROXY_ERROR, (REWARM, ROTATE)) == GIVE_UP
+    run = policy.start()
+    assert policy.decide(run, CAPTCHA_INVALID, (REFETCH,)) == REFETCH
+    assert policy.decide(run, CAPTCHA_INVALID, (REFETCH,)) == REFETCH
+    assert policy.decide(run, CAPTCHA_INVALID, (REFETCH,)) == GIVE_UP
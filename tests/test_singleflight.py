@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from src.core.singleflight import FollowerTimeout, SingleFlight
+
+
+def _followers(flight: SingleFlight, key: str, fn, count: int):
+    results = []
+    errors = []
+
+    def _call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=_call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_followers(flight: SingleFlight, key: str, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        call = flight._calls.get(key)
+        if call is not None and call.followers == count:
+            return
+        time.sleep(0.001)
+    raise AssertionError("followers did not join")
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def _fn():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    threads, results, errors = _followers(flight, "k", _fn, 5)
+    _wait_followers(flight, "k", 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1] and not errors
+    assert sorted(results, key=lambda item: item[1]) == [("result", False)] + [("result", True)] * 4
+    # Finished calls are forgotten: the next caller runs again.
+    assert flight.do("k", lambda: "again") == ("again", False)
+
+
+def test_error_reaches_every_follower():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def _fn():
+        release.wait(5)
+        raise ValueError("upstream")
+
+    threads, results, errors = _followers(flight, "k", _fn, 3)
+    _wait_followers(flight, "k", 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert not results and len(errors) == 3
+    with pytest.raises(KeyError):
+        flight.do("k", lambda: {}["missing"])
+
+
+def test_follower_gives_up_after_its_own_timeout():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do("k", lambda: release.wait(5)))
+    leader.start()
+    while "k" not in flight._calls:
+        time.sleep(0.001)
+    started = time.monotonic()
+    with pytest.raises(FollowerTimeout):
+        flight.do("k", lambda: None, timeout=0.05)
+    assert time.monotonic() - started < 1
+    release.set()
+    leader.join(5)